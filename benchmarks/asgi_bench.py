@@ -0,0 +1,174 @@
+"""
+Load test comparing the WSGI endpoints with their async ASGI counterparts.
+
+Drives ``--clients`` concurrent keep-alive connections against a running
+server and reports requests per second and latency percentiles for posting
+transactions and for reading wallets, e.g. with a WSGI and an ASGI server
+started side by side on the same database::
+
+    gunicorn wallet_app_drf.wsgi -w 4 --threads 16 -b :8000
+    WALLET_DB_POOL=1 uvicorn wallet_app_drf.asgi:application --workers 4 --port 8001
+
+    python benchmarks/asgi_bench.py --wsgi http://localhost:8000 \\
+        --asgi http://localhost:8001 --clients 500 --requests 20000
+
+The WSGI run uses ``/transactions/`` and ``/wallets/{id}/``, the ASGI run
+``/async/transactions/`` and ``/async/wallets/{id}/``. Only the standard
+library is used on the client side.
+"""
+
+import argparse
+import asyncio
+import itertools
+import json
+import statistics
+import time
+import uuid
+from urllib.parse import urlsplit
+
+MEDIA_TYPE = "application/vnd.api+json"
+
+PATHS = {
+    "wsgi": {"post": "/transactions/", "get": "/wallets/{id}/"},
+    "asgi": {"post": "/async/transactions/", "get": "/async/wallets/{id}/"},
+}
+
+
+class Connection:
+    """Minimal HTTP/1.1 keep-alive client, enough for Django's responses."""
+
+    def __init__(self, host, port):
+        self.host, self.port = host, port
+        self.reader = self.writer = None
+
+    async def request(self, method, path, body=b""):
+        if self.writer is None:
+            self.reader, self.writer = await asyncio.open_connection(
+                self.host, self.port
+            )
+        head = (
+            f"{method} {path} HTTP/1.1\r\nHost: {self.host}\r\n"
+            f"Accept: {MEDIA_TYPE}\r\nContent-Type: {MEDIA_TYPE}\r\n"
+            f"Content-Length: {len(body)}\r\n\r\n"
+        )
+        self.writer.write(head.encode("ascii") + body)
+        status_line = await self.reader.readline()
+        headers = {}
+        while (line := await self.reader.readline()) not in (b"\r\n", b""):
+            name, _, value = line.decode("latin-1").partition(":")
+            headers[name.strip().lower()] = value.strip()
+        body = await self.reader.readexactly(int(headers.get("content-length", 0)))
+        connection = headers.get("connection", "").lower()
+        if status_line.startswith(b"HTTP/1.1"):
+            keep_alive = connection != "close"
+        else:
+            keep_alive = connection == "keep-alive"
+        if not keep_alive:
+            self.writer.close()
+            self.writer = None
+        return int(status_line.split()[1]), body
+
+    def close(self):
+        if self.writer is not None:
+            self.writer.close()
+
+
+def transaction_document(wallet_id):
+    return json.dumps(
+        {
+            "data": {
+                "type": "Transaction",
+                "attributes": {"amount": "0.01", "txid": str(uuid.uuid4())},
+                "relationships": {
+                    "wallet": {"data": {"type": "Wallet", "id": str(wallet_id)}}
+                },
+            }
+        }
+    ).encode()
+
+
+async def create_wallets(host, port, count):
+    connection = Connection(host, port)
+    wallet_ids = []
+    for i in range(count):
+        body = json.dumps(
+            {
+                "data": {
+                    "type": "Wallet",
+                    "attributes": {"label": f"bench {i}", "balance": "0"},
+                }
+            }
+        ).encode()
+        status, content = await connection.request("POST", "/wallets/", body)
+        if status != 201:
+            raise SystemExit(f"could not create a wallet: {status} {content[:200]}")
+        wallet_ids.append(int(json.loads(content)["data"]["id"]))
+    connection.close()
+    return wallet_ids
+
+
+async def run(base_url, paths, scenario, wallet_ids, clients, requests):
+    url = urlsplit(base_url)
+    wallets = itertools.cycle(wallet_ids)
+    remaining = iter(range(requests))
+    latencies, errors = [], 0
+
+    async def client():
+        nonlocal errors
+        connection = Connection(url.hostname, url.port or 80)
+        try:
+            for _ in remaining:
+                wallet_id = next(wallets)
+                if scenario == "post":
+                    args = ("POST", paths["post"], transaction_document(wallet_id))
+                else:
+                    args = ("GET", paths["get"].format(id=wallet_id))
+                started = time.perf_counter()
+                status, _ = await connection.request(*args)
+                latencies.append(time.perf_counter() - started)
+                errors += status >= 400
+        finally:
+            connection.close()
+
+    started = time.perf_counter()
+    await asyncio.gather(*(client() for _ in range(clients)))
+    elapsed = time.perf_counter() - started
+    quantiles = statistics.quantiles(latencies, n=100)
+    return {
+        "requests": len(latencies),
+        "errors": errors,
+        "rps": len(latencies) / elapsed,
+        "p50_ms": quantiles[49] * 1000,
+        "p99_ms": quantiles[98] * 1000,
+    }
+
+
+async def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[1])
+    parser.add_argument("--wsgi", help="base URL of the WSGI server")
+    parser.add_argument("--asgi", help="base URL of the ASGI server")
+    parser.add_argument("--clients", type=int, default=500)
+    parser.add_argument("--requests", type=int, default=20000)
+    parser.add_argument("--wallets", type=int, default=100)
+    args = parser.parse_args()
+
+    targets = [(name, getattr(args, name)) for name in PATHS if getattr(args, name)]
+    if not targets:
+        parser.error("pass --wsgi and/or --asgi")
+    first = urlsplit(targets[0][1])
+    wallet_ids = await create_wallets(first.hostname, first.port or 80, args.wallets)
+
+    for scenario in ("post", "get"):
+        for name, base_url in targets:
+            result = await run(
+                base_url, PATHS[name], scenario, wallet_ids, args.clients, args.requests
+            )
+            print(
+                f"{name} {scenario:<4} {result['requests']} requests "
+                f"({result['errors']} errors): {result['rps']:8.1f} req/s, "
+                f"p50 {result['p50_ms']:7.1f} ms, p99 {result['p99_ms']:7.1f} ms"
+            )
+
+
+if __name__ == "__main__":
+    asyncio.run(main())
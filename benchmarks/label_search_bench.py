@@ -0,0 +1,102 @@
+"""
+Benchmark for wallet label search with and without the trigram index.
+
+Creates a scratch test database (``test_<NAME>`` from the settings), fills it
+with ``--wallets`` wallets and times the first page of ``label__icontains``,
+``filter[search]`` and ``filter[similar]`` list queries, first with the
+``wallet_label_trgm_idx`` GIN index and then with the index dropped inside a
+rolled back transaction. Needs the PostgreSQL server from ``.env``::
+
+    python benchmarks/label_search_bench.py --wallets 1000000
+"""
+
+import argparse
+import os
+import sys
+import timeit
+from pathlib import Path
+
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent))
+os.environ.setdefault("DJANGO_SETTINGS_MODULE", "wallet_app_drf.settings")
+
+import django  # noqa: E402
+
+django.setup()
+
+from django.db import connection, transaction  # noqa: E402
+from rest_framework.request import Request  # noqa: E402
+from rest_framework.test import APIRequestFactory  # noqa: E402
+
+from wallet_app.models import Wallet  # noqa: E402
+from wallet_app.views import WalletViewSet  # noqa: E402
+
+INDEX_NAME = "wallet_label_trgm_idx"
+QUERIES = [
+    {"label__icontains": "7f3a"},
+    {"filter[search]": "7f3a"},
+    {"filter[similar]": "wallet 4242 7f3a"},
+]
+
+
+def page_query(params, page_size=10):
+    request = Request(APIRequestFactory().get("/", params))
+    view = WalletViewSet(request=request, format_kwarg=None, action="list", kwargs={})
+    return view.filter_queryset(view.get_queryset()).values("id", "label")[:page_size]
+
+
+def seed(wallets):
+    with connection.cursor() as cursor:
+        cursor.execute("TRUNCATE wallet_app_wallet CASCADE")
+        cursor.execute(
+            "INSERT INTO wallet_app_wallet (label, balance, created_at, updated_at) "
+            "SELECT 'wallet ' || i || ' ' || substr(md5(i::text), 1, 8), 0, "
+            "now() - i * interval '1 second', now() "
+            "FROM generate_series(1, %s) i",
+            [wallets],
+        )
+        cursor.execute("ANALYZE wallet_app_wallet")
+
+
+def run(repeat):
+    results = {}
+    for params in QUERIES:
+        queryset = page_query(params)
+        results[next(iter(params))] = min(
+            timeit.repeat(lambda: list(queryset.all()), number=1, repeat=repeat)
+        )
+    return results
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[1])
+    parser.add_argument("--wallets", type=int, default=1_000_000)
+    parser.add_argument("--repeat", type=int, default=5)
+    parser.add_argument(
+        "--keepdb", action="store_true", help="reuse the seeded test database"
+    )
+    args = parser.parse_args()
+
+    old_name = connection.settings_dict["NAME"]
+    connection.creation.create_test_db(verbosity=0, keepdb=args.keepdb)
+    try:
+        if not args.keepdb or not Wallet.objects.exists():
+            seed(args.wallets)
+        indexed = run(args.repeat)
+        with transaction.atomic():
+            with connection.cursor() as cursor:
+                cursor.execute(f"DROP INDEX {INDEX_NAME}")
+            unindexed = run(args.repeat)
+            transaction.set_rollback(True)
+    finally:
+        connection.creation.destroy_test_db(old_name, verbosity=0, keepdb=args.keepdb)
+
+    for param, seconds in indexed.items():
+        print(
+            f"{param:<18} indexed {seconds * 1000:8.1f} ms, "
+            f"no index {unindexed[param] * 1000:8.1f} ms, "
+            f"speedup x{unindexed[param] / seconds:.1f}"
+        )
+
+
+if __name__ == "__main__":
+    main()
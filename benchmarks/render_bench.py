@@ -0,0 +1,112 @@
+"""
+Micro-benchmark for the JSON:API read path.
+
+Renders the same page of transactions and wallets through
+``ModelSerializer`` + ``rest_framework_json_api.renderers.JSONRenderer`` and
+through ``wallet_app.fastread`` + ``wallet_app.renderers.JSONRenderer``,
+checks the two outputs are byte-for-byte identical and prints timings.
+Rows are built in memory, so no database is needed::
+
+    python benchmarks/render_bench.py --rows 1000 --repeat 20
+"""
+
+import argparse
+import os
+import sys
+import timeit
+import uuid
+from datetime import datetime, timedelta, timezone
+from decimal import Decimal
+from pathlib import Path
+
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent))
+os.environ.setdefault("DJANGO_SETTINGS_MODULE", "wallet_app_drf.settings")
+
+import django  # noqa: E402
+
+django.setup()
+
+from rest_framework.request import Request  # noqa: E402
+from rest_framework.test import APIRequestFactory  # noqa: E402
+from rest_framework_json_api import renderers as json_api_renderers  # noqa: E402
+
+from wallet_app.fastread import FastResults, ResourceSchema  # noqa: E402
+from wallet_app.models import Wallet  # noqa: E402
+from wallet_app.renderers import JSONRenderer  # noqa: E402
+from wallet_app.views import TransactionViewSet, WalletViewSet  # noqa: E402
+
+MEDIA_TYPE = "application/vnd.api+json"
+
+
+def make_rows(model, rows):
+    # values come back from numeric(18, 8) columns with all 8 decimal places
+    scale = Decimal("1e-8")
+    now = datetime(2025, 2, 14, 20, 3, tzinfo=timezone.utc)
+    for i in range(1, rows + 1):
+        created_at = now + timedelta(microseconds=i * 1013)
+        if model is Wallet:
+            yield {
+                "id": i,
+                "label": f"Wallet №{i}",
+                "balance": (Decimal(i * 7919) * scale).quantize(scale),
+                "created_at": created_at,
+                "updated_at": created_at,
+            }
+        else:
+            yield {
+                "id": i,
+                "wallet_id": i % 17 + 1,
+                "txid": str(uuid.UUID(int=i)),
+                "amount": (Decimal(-i * 104729) * scale).quantize(scale),
+                "created_at": created_at,
+            }
+
+
+def bench(viewset_class, rows, repeat):
+    view = viewset_class()
+    view.request = Request(APIRequestFactory().get("/"))
+    view.format_kwarg, view.action, view.kwargs = None, "list", {}
+    context = {"view": view, "request": view.request}
+    serializer_class = view.get_serializer_class()
+    model = serializer_class.Meta.model
+
+    values = list(make_rows(model, rows))
+    instances = [model(**row) for row in values]
+    schema = ResourceSchema(serializer_class)
+    links = {"first": "http://testserver/", "next": None, "prev": None}
+
+    def serializer_path():
+        data = serializer_class(instances, many=True, context=context).data
+        return json_api_renderers.JSONRenderer().render(
+            {"results": data, "links": links}, MEDIA_TYPE, context
+        )
+
+    def fast_path():
+        data = FastResults(schema, schema.represent(values))
+        return JSONRenderer().render(
+            {"results": data, "links": links}, MEDIA_TYPE, context
+        )
+
+    assert serializer_path() == fast_path(), "renderers disagree"
+    results = {}
+    for name, func in (("serializer", serializer_path), ("fastread", fast_path)):
+        results[name] = min(timeit.repeat(func, number=1, repeat=repeat))
+    print(
+        f"{model.__name__:<12} {rows} rows: "
+        f"serializer {results['serializer'] * 1000:7.1f} ms, "
+        f"fastread {results['fastread'] * 1000:7.1f} ms, "
+        f"speedup x{results['serializer'] / results['fastread']:.1f}"
+    )
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[1])
+    parser.add_argument("--rows", type=int, default=1000)
+    parser.add_argument("--repeat", type=int, default=20)
+    args = parser.parse_args()
+    for viewset_class in (WalletViewSet, TransactionViewSet):
+        bench(viewset_class, args.rows, args.repeat)
+
+
+if __name__ == "__main__":
+    main()
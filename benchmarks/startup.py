@@ -0,0 +1,138 @@
+"""
+Cold start report for the WSGI entry point.
+
+Starts ``--runs`` fresh interpreters per settings module. Each one times the
+import of ``wallet_app_drf.wsgi`` (settings, apps, URLconf and the OpenAPI
+schema, see ``wallet_app.openapi``) and then the first and second request to
+every ``--path``, called in-process without a server. Medians are printed,
+and written as JSON with ``--output``::
+
+    python benchmarks/startup.py --runs 10
+    WALLET_OPENAPI_SCHEMA=openapi.json python benchmarks/startup.py \\
+        --settings wallet_app_drf.settings_production --path /openapi
+
+The default paths include ``/wallets/``, which needs the database; without
+one its status is 500 and its timings are those of the error. For a per
+module breakdown of the import, run
+``python -X importtime -c "import wallet_app_drf.wsgi"``.
+"""
+
+import argparse
+import json
+import os
+import statistics
+import subprocess
+import sys
+import time
+from pathlib import Path
+
+ROOT = Path(__file__).resolve().parent.parent
+SETTINGS = ["wallet_app_drf.settings", "wallet_app_drf.settings_production"]
+PATHS = ["/openapi", "/wallets/"]
+
+
+def call(application, path):
+    """Return ``(status, seconds)`` of a GET of ``path``."""
+    from wsgiref.util import setup_testing_defaults
+
+    path, _, query = path.partition("?")
+    environ = {
+        "PATH_INFO": path,
+        "QUERY_STRING": query,
+        "HTTP_HOST": "localhost",
+        "HTTP_ACCEPT": "application/vnd.api+json",
+    }
+    setup_testing_defaults(environ)
+    statuses = []
+    started = time.perf_counter()
+    result = application(environ, lambda status, headers, *_: statuses.append(status))
+    b"".join(result)
+    if hasattr(result, "close"):
+        result.close()
+    return int(statuses[0].split()[0]), time.perf_counter() - started
+
+
+def measure(paths):
+    """Run in the child interpreter; prints one JSON report."""
+    sys.path.insert(0, str(ROOT))
+    modules = len(sys.modules)
+    started = time.perf_counter()
+    from wallet_app_drf.wsgi import application
+
+    report = {
+        "import": time.perf_counter() - started,
+        "modules": len(sys.modules) - modules,
+        "paths": {},
+    }
+    for path in paths:
+        status, first = call(application, path)
+        _, second = call(application, path)
+        report["paths"][path] = {"status": status, "first": first, "second": second}
+    report["total_modules"] = len(sys.modules)
+    print(json.dumps(report))
+
+
+def run(settings_module, paths, runs):
+    env = {**os.environ, "DJANGO_SETTINGS_MODULE": settings_module}
+    reports = []
+    for _ in range(runs):
+        child = subprocess.run(
+            [sys.executable, __file__, "--measure", *paths],
+            env=env,
+            cwd=ROOT,
+            capture_output=True,
+            text=True,
+            check=True,
+        )
+        # the report is the last line; requests may log above it
+        reports.append(json.loads(child.stdout.splitlines()[-1]))
+    median = statistics.median
+    return {
+        "import_ms": median(r["import"] for r in reports) * 1000,
+        "modules": median(r["total_modules"] for r in reports),
+        "paths": {
+            path: {
+                "status": reports[-1]["paths"][path]["status"],
+                "first_ms": median(r["paths"][path]["first"] for r in reports) * 1000,
+                "second_ms": median(r["paths"][path]["second"] for r in reports) * 1000,
+            }
+            for path in paths
+        },
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[1])
+    parser.add_argument("--runs", type=int, default=5)
+    parser.add_argument(
+        "--settings", action="append", help="Settings module (repeatable)."
+    )
+    parser.add_argument("--path", action="append", help="Path to GET (repeatable).")
+    parser.add_argument("--output", help="JSON file to write the results to.")
+    parser.add_argument("--measure", nargs="*", help=argparse.SUPPRESS)
+    args = parser.parse_args()
+    if args.measure is not None:
+        measure(args.measure)
+        return
+
+    results = {}
+    for settings_module in args.settings or SETTINGS:
+        result = results[settings_module] = run(
+            settings_module, args.path or PATHS, args.runs
+        )
+        print(
+            f"{settings_module}: import {result['import_ms']:.0f} ms, "
+            f"{result['modules']:.0f} modules"
+        )
+        for path, timings in result["paths"].items():
+            print(
+                f"  GET {path} [{timings['status']}]: "
+                f"first {timings['first_ms']:.1f} ms, "
+                f"second {timings['second_ms']:.1f} ms"
+            )
+    if args.output:
+        Path(args.output).write_text(json.dumps(results, indent=2))
+
+
+if __name__ == "__main__":
+    main()
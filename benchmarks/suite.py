@@ -0,0 +1,441 @@
+"""
+Load and benchmark suite for the wallet API.
+
+Creates a scratch test database (``test_<NAME>``), seeds it with
+``generate_series`` and drives the API in-process from ``--concurrency``
+threads, each with its own test client and database connection. Every
+scenario reports throughput and latency percentiles; the results are
+written to a JSON file and can be checked against an earlier run::
+
+    make bench
+    python benchmarks/suite.py --wallets 100000 --transactions 1000000 \\
+        --requests 2000 --concurrency 16 --baseline benchmarks/results/old.json
+
+With ``--baseline`` the run exits with status 1 if a scenario lost more than
+``--tolerance`` of its throughput or of its p99 latency.
+"""
+
+import argparse
+import itertools
+import json
+import os
+import platform
+import random
+import statistics
+import subprocess
+import sys
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+from datetime import datetime, timezone
+from pathlib import Path
+
+ROOT = Path(__file__).resolve().parent.parent
+sys.path.insert(0, str(ROOT))
+os.environ.setdefault("DJANGO_SETTINGS_MODULE", "wallet_app_drf.settings")
+
+import django  # noqa: E402
+
+django.setup()
+
+from django.conf import settings  # noqa: E402
+from django.db import connection  # noqa: E402
+from django.test.utils import setup_test_environment  # noqa: E402
+from rest_framework.test import APIClient  # noqa: E402
+
+from wallet_app.caching import wallet_cache  # noqa: E402
+from wallet_app.idempotency import recent_transactions  # noqa: E402
+from wallet_app.models import Wallet  # noqa: E402
+
+HOT_WALLET_BALANCE = 10**9
+
+
+def seed(wallets, transactions):
+    """Fill the tables with ``wallets`` wallets and ``transactions`` postings."""
+    # amounts below are in whole units; BIGINT storage counts 1e-8 units
+    scale = 10**8 if settings.WALLET_FIXED_POINT else 1
+    with connection.cursor() as cursor:
+        cursor.execute("TRUNCATE wallet_app_wallet, wallet_app_transactiontxid CASCADE")
+        cursor.execute(
+            "INSERT INTO wallet_app_wallet (label, balance, created_at, updated_at) "
+            "SELECT 'wallet ' || i || ' ' || substr(md5(i::text), 1, 8), "
+            "((i %% 1000) * 10.5 + 1000) * %s, now() - i * interval '1 second', now() "
+            "FROM generate_series(1, %s) i",
+            [scale, wallets],
+        )
+        cursor.execute(
+            "INSERT INTO wallet_app_transaction (wallet_id, txid, amount, created_at) "
+            "SELECT w.first + i %% %s, 'seed-' || i, (i %% 200 - 100) * %s, "
+            "now() - i * interval '1 second' "
+            "FROM generate_series(1, %s) i, "
+            "(SELECT min(id) AS first FROM wallet_app_wallet) w",
+            [wallets, scale, transactions],
+        )
+        cursor.execute(
+            "UPDATE wallet_app_wallet w SET transaction_count = t.count "
+            "FROM (SELECT wallet_id, count(*) AS count FROM wallet_app_transaction "
+            "GROUP BY wallet_id) t WHERE t.wallet_id = w.id"
+        )
+        cursor.execute("ANALYZE wallet_app_wallet")
+        cursor.execute("ANALYZE wallet_app_transaction")
+
+
+def table_sizes():
+    """Table and index bytes of the wallet and transaction tables, partitions included."""
+    with connection.cursor() as cursor:
+        cursor.execute(
+            "SELECT t.name, sum(pg_table_size(p.relid)), sum(pg_indexes_size(p.relid)) "
+            "FROM unnest(%s::text[]) t(name), pg_partition_tree(t.name::regclass) p "
+            "GROUP BY t.name ORDER BY t.name",
+            [["wallet_app_transaction", "wallet_app_wallet"]],
+        )
+        return {
+            name: {"table_bytes": int(table), "index_bytes": int(indexes)}
+            for name, table, indexes in cursor.fetchall()
+        }
+
+
+def transaction_payload(wallet_id, amount):
+    return {
+        "data": {
+            "type": "Transaction",
+            "attributes": {"amount": amount, "wallet": wallet_id},
+        }
+    }
+
+
+class Scenario:
+    """A named stream of requests and the status codes that count as success."""
+
+    expected_status = (200, 201)
+
+    def __init__(self, args, wallet_ids):
+        self.args = args
+        self.wallet_ids = wallet_ids
+
+    def requests(self):
+        """Yield ``(method, path, payload)`` tuples, one per measured request."""
+        raise NotImplementedError
+
+
+class HotWalletPosting(Scenario):
+    """Every client posts to the same wallet: row lock contention."""
+
+    name = "hot_wallet_posting"
+
+    def requests(self):
+        wallet = Wallet.objects.create(label="hot", balance=HOT_WALLET_BALANCE)
+        for _ in range(self.args.requests):
+            yield "post", "/transactions/", transaction_payload(wallet.id, "1.25")
+
+
+class UniformPosting(Scenario):
+    """Postings spread uniformly over all wallets: little contention."""
+
+    name = "uniform_posting"
+
+    def requests(self):
+        rng = random.Random(self.args.seed)
+        for _ in range(self.args.requests):
+            wallet_id = rng.choice(self.wallet_ids)
+            yield "post", "/transactions/", transaction_payload(wallet_id, "0.5")
+
+
+class DeepPagination(Scenario):
+    """Page-number requests spread up to ``--max-page`` deep into /transactions/."""
+
+    name = "deep_pagination"
+    expected_status = (200,)
+
+    def requests(self):
+        rng = random.Random(self.args.seed)
+        for _ in range(self.args.requests):
+            page = rng.randint(1, self.args.max_page)
+            yield "get", f"/transactions/?page[number]={page}", None
+
+
+class CursorPagination(Scenario):
+    """The same depth reached by following ``next`` cursor links."""
+
+    name = "cursor_pagination"
+    expected_status = (200,)
+
+    def requests(self):
+        # cursors are opaque, so the walk is recorded once before timing it
+        client = APIClient()
+        paths, path = [], "/transactions/"
+        while path and len(paths) < self.args.max_page:
+            paths.append(path)
+            next_link = client.get(path).json()["links"]["next"]
+            path = next_link and next_link.split("testserver", 1)[1]
+        for path in itertools.islice(itertools.cycle(paths), self.args.requests):
+            yield "get", path, None
+
+
+class FilteredWalletList(Scenario):
+    """Wallet lists with the filters and orderings clients use the most."""
+
+    name = "filtered_wallet_list"
+    expected_status = (200,)
+    queries = [
+        "balance__gt={n}&ordering=-balance",
+        "balance__lt={n}&ordering=balance",
+        "label__icontains={n}",
+        "filter[search]={n}&ordering=-created_at",
+        "ordering=label",
+    ]
+
+    def requests(self):
+        rng = random.Random(self.args.seed)
+        for _ in range(self.args.requests):
+            query = rng.choice(self.queries).format(n=rng.randint(1, 9999))
+            yield "get", f"/wallets/?{query}", None
+
+
+class InsufficientBalance(Scenario):
+    """Postings rejected by the non-negative balance check."""
+
+    name = "insufficient_balance"
+    expected_status = (400,)
+
+    def requests(self):
+        rng = random.Random(self.args.seed)
+        for _ in range(self.args.requests):
+            wallet_id = rng.choice(self.wallet_ids)
+            yield "post", "/transactions/", transaction_payload(
+                wallet_id, "-1000000000"
+            )
+
+
+def transfer_payload(source_id, destination_id, amount):
+    return {
+        "data": {
+            "type": "Transfer",
+            "attributes": {
+                "source": source_id,
+                "destination": destination_id,
+                "amount": amount,
+            },
+        }
+    }
+
+
+class TransferStorm(Scenario):
+    """
+    Transfers between a few wallet pairs in both directions at once: the
+    pattern that deadlocks unless both wallets are locked in id order.
+    """
+
+    name = "transfer_storm"
+    pairs = 4
+
+    def wallet_pairs(self):
+        wallets = Wallet.objects.bulk_create(
+            Wallet(label=f"transfer {i}", balance=HOT_WALLET_BALANCE)
+            for i in range(self.pairs * 2)
+        )
+        return list(zip(wallets[::2], wallets[1::2]))
+
+    def requests(self):
+        pairs = self.wallet_pairs()
+        for i in range(self.args.requests):
+            a, b = pairs[i % self.pairs]
+            source, destination = (a, b) if i // self.pairs % 2 else (b, a)
+            yield "post", "/transfers/", transfer_payload(
+                source.id, destination.id, "1.25"
+            )
+
+
+class TwoPostTransfers(TransferStorm):
+    """
+    The same storm as two separate postings per transfer, the way clients
+    moved money before /transfers/. Each transfer counts as two requests.
+    """
+
+    name = "two_post_transfers"
+
+    def requests(self):
+        pairs = self.wallet_pairs()
+        for i in range(self.args.requests // 2):
+            a, b = pairs[i % self.pairs]
+            source, destination = (a, b) if i // self.pairs % 2 else (b, a)
+            yield "post", "/transactions/", transaction_payload(source.id, "-1.25")
+            yield "post", "/transactions/", transaction_payload(destination.id, "1.25")
+
+
+SCENARIOS = {
+    scenario.name: scenario
+    for scenario in (
+        HotWalletPosting,
+        UniformPosting,
+        DeepPagination,
+        CursorPagination,
+        FilteredWalletList,
+        InsufficientBalance,
+        TransferStorm,
+        TwoPostTransfers,
+    )
+}
+
+
+def run_scenario(scenario, concurrency):
+    """Replay ``scenario`` from ``concurrency`` threads and summarize latencies."""
+    requests = iter(list(scenario.requests()))
+    lock = threading.Lock()
+    latencies, errors = [], 0
+
+    def worker():
+        nonlocal errors
+        client = APIClient()
+        try:
+            while True:
+                with lock:
+                    request = next(requests, None)
+                if request is None:
+                    return
+                method, path, payload = request
+                started = time.perf_counter()
+                response = getattr(client, method)(path, payload)
+                elapsed = time.perf_counter() - started
+                with lock:
+                    latencies.append(elapsed)
+                    errors += response.status_code not in scenario.expected_status
+        finally:
+            connection.close()
+
+    started = time.perf_counter()
+    with ThreadPoolExecutor(max_workers=concurrency) as executor:
+        for future in [executor.submit(worker) for _ in range(concurrency)]:
+            future.result()
+    elapsed = time.perf_counter() - started
+
+    quantiles = statistics.quantiles(latencies, n=100)
+    return {
+        "requests": len(latencies),
+        "errors": errors,
+        "seconds": round(elapsed, 3),
+        "rps": round(len(latencies) / elapsed, 1),
+        "p50_ms": round(quantiles[49] * 1000, 2),
+        "p90_ms": round(quantiles[89] * 1000, 2),
+        "p99_ms": round(quantiles[98] * 1000, 2),
+        "max_ms": round(max(latencies) * 1000, 2),
+    }
+
+
+def regressions(results, baseline, tolerance):
+    """List scenarios that got slower than ``baseline`` by more than ``tolerance``."""
+    found = []
+    for name, result in results.items():
+        before = baseline.get("scenarios", {}).get(name)
+        if before is None:
+            continue
+        if result["rps"] < before["rps"] * (1 - tolerance):
+            found.append(f"{name}: {before['rps']} -> {result['rps']} req/s")
+        if result["p99_ms"] > before["p99_ms"] * (1 + tolerance):
+            found.append(f"{name}: p99 {before['p99_ms']} -> {result['p99_ms']} ms")
+    return found
+
+
+def git_revision():
+    try:
+        return subprocess.run(
+            ["git", "rev-parse", "--short", "HEAD"],
+            cwd=ROOT,
+            capture_output=True,
+            text=True,
+            check=True,
+        ).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        return None
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[1])
+    parser.add_argument("--wallets", type=int, default=100_000)
+    parser.add_argument("--transactions", type=int, default=1_000_000)
+    parser.add_argument("--requests", type=int, default=2000)
+    parser.add_argument("--concurrency", type=int, default=16)
+    parser.add_argument("--max-page", type=int, default=1000)
+    parser.add_argument("--seed", type=int, default=42)
+    parser.add_argument(
+        "--scenario",
+        action="append",
+        choices=list(SCENARIOS),
+        help="run only this scenario (repeatable)",
+    )
+    parser.add_argument("--output", type=Path)
+    parser.add_argument("--baseline", type=Path)
+    parser.add_argument("--tolerance", type=float, default=0.2)
+    parser.add_argument(
+        "--keepdb", action="store_true", help="reuse the seeded test database"
+    )
+    args = parser.parse_args()
+
+    started_at = datetime.now(timezone.utc)
+    output = args.output or ROOT / "benchmarks" / "results" / (
+        started_at.strftime("%Y%m%dT%H%M%SZ") + ".json"
+    )
+    setup_test_environment(debug=False)
+    old_name = connection.settings_dict["NAME"]
+    connection.creation.create_test_db(verbosity=0, keepdb=args.keepdb)
+    results, sizes = {}, {}
+    try:
+        if not args.keepdb or not Wallet.objects.exists():
+            seed(args.wallets, args.transactions)
+        wallet_ids = list(
+            Wallet.objects.order_by("id").values_list("id", flat=True)[: args.wallets]
+        )
+        for name in args.scenario or SCENARIOS:
+            recent_transactions.clear()
+            wallet_cache.cache.clear()
+            scenario = SCENARIOS[name](args, wallet_ids)
+            results[name] = run_scenario(scenario, args.concurrency)
+            print(
+                f"{name:<22} {results[name]['rps']:8.1f} req/s  "
+                f"p50 {results[name]['p50_ms']:7.2f} ms  "
+                f"p99 {results[name]['p99_ms']:7.2f} ms  "
+                f"errors {results[name]['errors']}"
+            )
+        sizes = table_sizes()
+        for name, size in sizes.items():
+            print(
+                f"{name:<22} table {size['table_bytes'] / 2**20:8.1f} MiB  "
+                f"indexes {size['index_bytes'] / 2**20:8.1f} MiB"
+            )
+    finally:
+        connection.close()
+        connection.creation.destroy_test_db(old_name, verbosity=0, keepdb=args.keepdb)
+
+    report = {
+        "started_at": started_at.isoformat(),
+        "revision": git_revision(),
+        "python": platform.python_version(),
+        "parameters": {
+            key: value
+            for key, value in vars(args).items()
+            if key not in ("output", "baseline", "keepdb")
+        },
+        "settings": {
+            "WALLET_POSTING_MODE": settings.WALLET_POSTING_MODE,
+            "WALLET_FAST_READ": settings.WALLET_FAST_READ,
+            "WALLET_FIXED_POINT": settings.WALLET_FIXED_POINT,
+        },
+        "scenarios": results,
+        "sizes": sizes,
+    }
+    output.parent.mkdir(parents=True, exist_ok=True)
+    output.write_text(json.dumps(report, indent=2) + "\n")
+    print(f"results written to {output}")
+
+    if args.baseline:
+        found = regressions(
+            results, json.loads(args.baseline.read_text()), args.tolerance
+        )
+        for line in found:
+            print(f"REGRESSION {line}")
+        if found:
+            sys.exit(1)
+
+
+if __name__ == "__main__":
+    main()
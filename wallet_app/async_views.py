@@ -0,0 +1,309 @@
+"""
+Async counterparts of the two hottest endpoints, for ASGI deployments, and
+the ``GET /wallets/{id}/events/`` push feed.
+
+``GET /async/wallets/{id}/`` and ``POST /async/transactions/`` answer with the
+same documents, status codes and headers as ``WalletViewSet.retrieve`` and
+``TransactionViewSet.create``, but run on the event loop: reads use the async
+ORM and only the posting itself, which needs a database transaction, is
+handed to a worker thread by ``Model.asave()``. Request validation never
+touches the database, so the serializers can be used as they are.
+"""
+
+import asyncio
+import json
+
+from asgiref.sync import sync_to_async
+from django.conf import settings
+from django.core.handlers.asgi import ASGIRequest
+from django.db import DEFAULT_DB_ALIAS, IntegrityError
+from django.db.models import ExpressionWrapper, F, RowRange, Sum, Value, Window
+from django.db.models.functions import Coalesce
+from django.http import HttpResponse, StreamingHttpResponse
+from django.urls import reverse
+from django.views.decorators.csrf import csrf_exempt
+from django.views.decorators.http import require_GET, require_POST
+from rest_framework import exceptions, status
+from rest_framework.renderers import JSONRenderer
+from rest_framework_json_api.exceptions import Conflict
+from rest_framework_json_api.parsers import JSONParser
+from rest_framework_json_api.utils import format_error_object
+
+from wallet_app import events, metrics, outbox
+from wallet_app.caching import make_etag, not_modified, set_validators, wallet_cache
+from wallet_app.fastread import ResourceSchema
+from wallet_app.idempotency import recent_transactions
+from wallet_app.models import (
+    BALANCE_CONSTRAINT_NAME,
+    TXID_REGISTRY_CONSTRAINT_NAME,
+    Transaction,
+    Wallet,
+    WalletNotFoundError,
+)
+from wallet_app.routers import reads_from_replica
+from wallet_app.serializers import (
+    BulkTransactionSerializer,
+    QueuedPostingSerializer,
+    TransactionSerializer,
+    WalletSerializer,
+    wallet_not_found,
+)
+
+MEDIA_TYPE = "application/vnd.api+json"
+# comment lines sent on idle event streams so that proxies keep them open
+KEEPALIVE_SECONDS = 15
+
+wallet_schema = ResourceSchema(WalletSerializer)
+transaction_schema = ResourceSchema(TransactionSerializer)
+posting_schema = ResourceSchema(QueuedPostingSerializer)
+
+
+def document_response(document, status_code=status.HTTP_200_OK):
+    return HttpResponse(
+        JSONRenderer().render(document), status=status_code, content_type=MEDIA_TYPE
+    )
+
+
+def error_response(exc):
+    """Render an ``APIException`` the way the JSON:API exception handler does."""
+    response = HttpResponse(status=exc.status_code, content_type=MEDIA_TYPE)
+    if isinstance(exc.detail, dict):
+        errors = []
+        for field, detail in exc.detail.items():
+            section = "relationships" if field == "wallet" else "attributes"
+            errors.extend(
+                format_error_object(detail, f"/data/{section}/{field}", response)
+            )
+    else:
+        errors = format_error_object(exc.detail, "/data", response)
+    response.content = JSONRenderer().render({"errors": errors})
+    return response
+
+
+def resource_document(schema, instance):
+    row = {column: getattr(instance, column) for column in schema.columns}
+    return {"data": schema.resource_object(next(schema.represent([row])))}
+
+
+def parse_transaction(request):
+    """Flatten a JSON:API ``Transaction`` resource object into serializer input."""
+    try:
+        data = json.loads(request.body)["data"]
+    except (ValueError, TypeError, KeyError):
+        raise exceptions.ParseError("Received document does not contain primary data")
+    if not isinstance(data, dict):
+        raise exceptions.ParseError("Received data is not a valid JSON:API Resource")
+    if data.get("type") != transaction_schema.type:
+        raise Conflict(
+            f"The resource object's type ({data.get('type')}) is not the type "
+            f"that constitute the collection represented by the endpoint "
+            f"({transaction_schema.type})."
+        )
+    parsed = JSONParser.parse_attributes(data)
+    for name, related in JSONParser.parse_relationships(data).items():
+        parsed[name] = related.get("id") if isinstance(related, dict) else related
+    return parsed
+
+
+@require_GET
+async def wallet_detail(request, pk):
+    entry = await wallet_cache.aget(pk)
+    if entry is None:
+        row = (
+            await Wallet.objects.filter(pk=pk, deleted_at=None)
+            .values(*wallet_schema.columns)
+            .afirst()
+        )
+        if row is None:
+            return error_response(
+                exceptions.NotFound("No Wallet matches the given query.")
+            )
+        entry = {
+            "data": next(wallet_schema.represent([row])),
+            "updated_at": row["updated_at"],
+        }
+        if not reads_from_replica():
+            await wallet_cache.aset(pk, entry)
+    etag = make_etag(pk, entry["updated_at"].isoformat())
+    response = not_modified(request, etag, entry["updated_at"])
+    if response is None:
+        response = document_response(
+            {"data": wallet_schema.resource_object(entry["data"])}
+        )
+    return set_validators(response, etag, entry["updated_at"])
+
+
+async def find_original(txid, use_cache=True):
+    if txid is None:
+        return None
+    txid = str(txid)
+    original = recent_transactions.get(txid) if use_cache else None
+    if original is None:
+        original = await Transaction.objects.filter(txid=txid).afirst()
+        if original is not None:
+            recent_transactions.add(original)
+    return original
+
+
+def replay(original, validated_data):
+    if (
+        validated_data["amount"] != original.amount
+        or validated_data["wallet_id"] != original.wallet_id
+    ):
+        raise Conflict(
+            f"Transaction {original.txid} was already posted "
+            "with a different wallet or amount"
+        )
+    return document_response(resource_document(transaction_schema, original))
+
+
+async def enqueue(request, validated_data):
+    posting, created = await outbox.aenqueue(validated_data)
+    if not created and (posting.wallet_id, posting.amount) != (
+        validated_data["wallet_id"],
+        validated_data["amount"],
+    ):
+        raise Conflict(
+            f"Transaction {posting.txid} was already queued "
+            "with a different wallet or amount"
+        )
+    response = document_response(
+        resource_document(posting_schema, posting), status.HTTP_202_ACCEPTED
+    )
+    response["Location"] = request.build_absolute_uri(
+        reverse("posting-detail", args=[posting.id])
+    )
+    return response
+
+
+@csrf_exempt
+@require_POST
+async def transaction_create(request):
+    try:
+        data = parse_transaction(request)
+        serializer = BulkTransactionSerializer(data=data)
+        serializer.is_valid(raise_exception=True)
+        validated_data = serializer.validated_data
+
+        original = await find_original(data.get("txid"))
+        if original is not None:
+            return replay(original, validated_data)
+
+        wallet_id = validated_data["wallet_id"]
+        if not await Wallet.objects.filter(pk=wallet_id, deleted_at=None).aexists():
+            raise wallet_not_found(wallet_id)
+        if settings.WALLET_POSTING_QUEUE:
+            return await enqueue(request, validated_data)
+        instance = Transaction(**validated_data)
+        try:
+            await instance.asave()
+        except WalletNotFoundError:
+            raise wallet_not_found(wallet_id)
+        except IntegrityError as e:
+            if BALANCE_CONSTRAINT_NAME in str(e):
+                metrics.count_insufficient_balance()
+                raise exceptions.ValidationError("Insufficient balance")
+            original = await find_original(data.get("txid"), use_cache=False)
+            if original is None:
+                if TXID_REGISTRY_CONSTRAINT_NAME in str(e):
+                    raise Conflict(
+                        f"Transaction {validated_data['txid']} was already posted "
+                        "and has been archived"
+                    )
+                raise
+            return replay(original, validated_data)
+    except exceptions.APIException as exc:
+        return error_response(exc)
+    recent_transactions.add(instance)
+    return document_response(
+        resource_document(transaction_schema, instance), status.HTTP_201_CREATED
+    )
+
+
+def replay_rows(wallet_id, since):
+    """
+    ``(id, txid, amount, balance after it)`` of the wallet's transactions
+    after id ``since``, oldest first. The balances are derived from the
+    current one, read in the same statement.
+    """
+    balance = Wallet._meta.get_field("balance")
+    later = Window(Sum("amount"), order_by=F("id").desc(), frame=RowRange(end=-1))
+    return (
+        # never from the replica, which may lag behind the notifications
+        Transaction.objects.using(DEFAULT_DB_ALIAS)
+        .filter(wallet_id=wallet_id, id__gt=since)
+        .annotate(
+            balance_after=ExpressionWrapper(
+                F("wallet__balance") - Coalesce(later, Value(0), output_field=balance),
+                output_field=balance,
+            )
+        )
+        .order_by("id")
+        .values_list("id", "txid", "amount", "balance_after")
+    )
+
+
+def event_frame(event_id, data):
+    return f"id: {event_id}\nevent: transaction\ndata: {data}\n\n"
+
+
+async def event_stream(wallet_id, since, queue):
+    # events queued while the replay ran may have been replayed already
+    replayed = set()
+    try:
+        if since is not None:
+            # one round trip in a worker thread; the query can't run on the loop
+            rows = await sync_to_async(list)(replay_rows(wallet_id, since))
+            for event_id, *posting in rows:
+                replayed.add(event_id)
+                data = events.encode_event(event_id, wallet_id, *posting)
+                yield event_frame(event_id, data)
+        while True:
+            try:
+                item = await asyncio.wait_for(queue.get(), KEEPALIVE_SECONDS)
+            except asyncio.TimeoutError:
+                yield ": keepalive\n\n"
+                continue
+            if item is None:
+                return
+            event_id, data = item
+            if event_id not in replayed:
+                yield event_frame(event_id, data)
+    finally:
+        events.hub.unsubscribe(wallet_id, queue)
+
+
+@require_GET
+async def wallet_events(request, pk):
+    """
+    Stream the wallet's postings as Server-Sent Events, see
+    ``wallet_app.events``. With ``Last-Event-ID`` (or ``?since=``) the
+    transactions after that id are replayed first.
+    """
+    if not isinstance(request, ASGIRequest):
+        exc = exceptions.APIException("Event streams are only served over ASGI.")
+        exc.status_code = status.HTTP_501_NOT_IMPLEMENTED
+        return error_response(exc)
+    since = request.headers.get("Last-Event-ID", request.GET.get("since"))
+    if since is not None:
+        try:
+            since = int(since)
+        except ValueError:
+            return error_response(
+                exceptions.ParseError("Last-Event-ID must be a transaction id")
+            )
+    if not await Wallet.objects.filter(pk=pk, deleted_at=None).aexists():
+        return error_response(exceptions.NotFound("No Wallet matches the given query."))
+    try:
+        queue = await events.hub.subscribe(pk)
+    except events.Unavailable as e:
+        exc = exceptions.APIException(str(e))
+        exc.status_code = status.HTTP_503_SERVICE_UNAVAILABLE
+        return error_response(exc)
+    response = StreamingHttpResponse(
+        event_stream(pk, since, queue), content_type="text/event-stream"
+    )
+    response["Cache-Control"] = "no-cache"
+    # nginx would otherwise buffer the stream
+    response["X-Accel-Buffering"] = "no"
+    return response
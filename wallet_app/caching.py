@@ -0,0 +1,88 @@
+import threading
+
+from django.conf import settings
+from django.core.cache import caches
+from django.db import transaction
+from django.utils.cache import get_conditional_response
+from django.utils.http import http_date
+
+
+class WalletCache:
+    """
+    Cache of wallet detail payloads on top of a Django cache alias.
+
+    Entries are dropped whenever the wallet row changes; the timeout only
+    bounds how long a reader that raced a writer can keep serving the
+    pre-write payload. Writers invalidate entries in the cache backend, so
+    the alias must name one that every process shares (see ``CACHES`` in
+    the settings); by default it is a ``DummyCache`` and nothing is cached.
+    Hit and miss counters are kept per process.
+    """
+
+    def __init__(self, alias, timeout):
+        self.alias = alias
+        self.timeout = timeout
+        self.hits = self.misses = 0
+        self._lock = threading.Lock()
+
+    @property
+    def cache(self):
+        return caches[self.alias]
+
+    @staticmethod
+    def key(wallet_id):
+        return f"wallet:{wallet_id}"
+
+    def get(self, wallet_id):
+        entry = self.cache.get(self.key(wallet_id))
+        self._count(entry)
+        return entry
+
+    def set(self, wallet_id, entry):
+        self.cache.set(self.key(wallet_id), entry, self.timeout)
+
+    async def aget(self, wallet_id):
+        entry = await self.cache.aget(self.key(wallet_id))
+        self._count(entry)
+        return entry
+
+    async def aset(self, wallet_id, entry):
+        await self.cache.aset(self.key(wallet_id), entry, self.timeout)
+
+    def _count(self, entry):
+        with self._lock:
+            if entry is None:
+                self.misses += 1
+            else:
+                self.hits += 1
+
+    def invalidate(self, wallet_id):
+        key = self.key(wallet_id)
+        # now for reads later in this transaction, and again after commit in
+        # case a concurrent reader cached the old row in between
+        self.cache.delete(key)
+        transaction.on_commit(lambda: self.cache.delete(key))
+
+    def stats(self):
+        with self._lock:
+            return {"hits": self.hits, "misses": self.misses}
+
+
+wallet_cache = WalletCache(settings.WALLET_CACHE_ALIAS, settings.WALLET_CACHE_TIMEOUT)
+
+
+def make_etag(*parts):
+    return '"{}"'.format("-".join(map(str, parts)))
+
+
+def not_modified(request, etag, updated_at):
+    """Return a 304 response if the request's validators still match."""
+    last_modified = int(updated_at.timestamp()) if updated_at is not None else None
+    return get_conditional_response(request, etag=etag, last_modified=last_modified)
+
+
+def set_validators(response, etag, updated_at):
+    response["ETag"] = etag
+    if updated_at is not None:
+        response["Last-Modified"] = http_date(updated_at.timestamp())
+    return response
@@ -0,0 +1,177 @@
+"""
+Push feed of postings through Postgres ``LISTEN``/``NOTIFY``.
+
+With ``settings.WALLET_EVENTS`` every posting path (``Transaction.save``,
+``ledger.post_batch``, hence the outbox worker, and ``ledger.post_transfers``)
+sends a ``NOTIFY wallet_events`` with the transaction's id, wallet, txid and
+amount and the wallet's balance after it. Notifications are delivered on
+commit, so rolled back postings never show up. The feed is opt-in because
+committing a transaction that notified takes a database-wide lock.
+
+``GET /wallets/{id}/events/`` streams the feed as Server-Sent Events (ASGI
+and psycopg 3 only), see ``async_views.wallet_events``. Each process keeps
+a single ``LISTEN`` connection, the ``Hub``, and fans notifications out to
+its subscribers' queues. A subscriber that falls ``QUEUE_SIZE`` events behind, and every
+subscriber of a hub that lost its connection, has its stream ended; the
+client reconnects with ``Last-Event-ID`` and resumes from the database.
+"""
+
+import asyncio
+import json
+import logging
+from collections import defaultdict
+from decimal import Decimal
+
+from django.conf import settings
+from django.db import DEFAULT_DB_ALIAS, connection, connections
+
+logger = logging.getLogger(__name__)
+
+CHANNEL = "wallet_events"
+QUANTUM = Decimal("1e-8")
+QUEUE_SIZE = 1000
+
+
+class Unavailable(Exception):
+    """The hub could not start listening."""
+
+
+def encode_amount(value):
+    return f"{Decimal(value).quantize(QUANTUM):f}"
+
+
+def encode_event(transaction_id, wallet_id, txid, amount, balance):
+    return json.dumps(
+        {
+            "id": transaction_id,
+            "wallet": wallet_id,
+            "txid": str(txid),
+            "amount": encode_amount(amount),
+            "balance": encode_amount(balance),
+        },
+        separators=(",", ":"),
+    )
+
+
+def publish(postings):
+    """
+    Notify the ``(transaction, balance after it)`` pairs of ``postings`` when
+    the current database transaction commits.
+    """
+    if not settings.WALLET_EVENTS or not postings:
+        return
+    payloads = [
+        encode_event(tx.id, tx.wallet_id, tx.txid, tx.amount, balance)
+        for tx, balance in postings
+    ]
+    with connection.cursor() as cursor:
+        cursor.execute(
+            "SELECT pg_notify(%s, payload) FROM unnest(%s::text[]) AS payload",
+            [CHANNEL, payloads],
+        )
+
+
+def conninfo(alias=DEFAULT_DB_ALIAS):
+    from psycopg.conninfo import make_conninfo
+
+    db = connections[alias].settings_dict
+    params = {
+        "dbname": db["NAME"],
+        "user": db["USER"],
+        "password": db["PASSWORD"],
+        "host": db["HOST"],
+        "port": db["PORT"],
+    }
+    return make_conninfo(**{key: value for key, value in params.items() if value})
+
+
+def _end(queue):
+    """Make the stream reading ``queue`` stop; what it did not read is replayed."""
+    while not queue.empty():
+        queue.get_nowait()
+    queue.put_nowait(None)
+
+
+class Hub:
+    """One ``LISTEN`` connection per process, fanned out by wallet id."""
+
+    def __init__(self):
+        self.subscribers = defaultdict(set)
+        self.task = None
+        self.ready = None
+
+    async def subscribe(self, wallet_id):
+        """
+        Return a queue of the wallet's ``(transaction id, payload)`` events,
+        ``None`` marking the end of the stream. Returns once ``LISTEN`` is
+        active, so every posting committed afterwards is delivered.
+        """
+        loop = asyncio.get_running_loop()
+        if self.task is None or self.task.done() or self.task.get_loop() is not loop:
+            self.ready = loop.create_future()
+            self.task = loop.create_task(self.listen(self.ready))
+        try:
+            await asyncio.shield(self.ready)
+        except asyncio.CancelledError:
+            if not self.ready.cancelled():
+                raise  # the subscriber itself was cancelled
+            raise Unavailable(f"Stopped listening to {CHANNEL}")
+        except Exception as e:
+            raise Unavailable(f"Can't listen to {CHANNEL}: {e}") from e
+        queue = asyncio.Queue(QUEUE_SIZE)
+        self.subscribers[wallet_id].add(queue)
+        return queue
+
+    def unsubscribe(self, wallet_id, queue):
+        queues = self.subscribers.get(wallet_id)
+        if queues is not None:
+            queues.discard(queue)
+            if not queues:
+                del self.subscribers[wallet_id]
+
+    async def listen(self, ready):
+        try:
+            # psycopg 3 only, like the connection pool: psycopg2 has no
+            # asynchronous connections
+            import psycopg
+
+            async with await psycopg.AsyncConnection.connect(
+                conninfo(), autocommit=True
+            ) as conn:
+                await conn.execute(f"LISTEN {CHANNEL}")
+                ready.set_result(None)
+                async for notify in conn.notifies():
+                    self.dispatch(notify.payload)
+        except Exception as e:
+            if not ready.done():
+                ready.set_exception(e)
+            else:
+                logger.warning("Lost the %s LISTEN connection: %s", CHANNEL, e)
+        finally:
+            if not ready.done():
+                ready.cancel()
+            for queues in self.subscribers.values():
+                for queue in queues:
+                    _end(queue)
+            self.subscribers.clear()
+
+    def dispatch(self, payload):
+        event = json.loads(payload)
+        for queue in list(self.subscribers.get(event["wallet"], ())):
+            try:
+                queue.put_nowait((event["id"], payload))
+            except asyncio.QueueFull:
+                self.unsubscribe(event["wallet"], queue)
+                _end(queue)
+
+    async def stop(self):
+        if self.task is not None:
+            self.task.cancel()
+            try:
+                await self.task
+            except asyncio.CancelledError:
+                pass
+            self.task = None
+
+
+hub = Hub()
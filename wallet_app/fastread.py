@@ -0,0 +1,194 @@
+from functools import partial
+
+from django.conf import settings
+from django.core.exceptions import ImproperlyConfigured
+from django.shortcuts import get_object_or_404
+from django.utils import timezone
+from rest_framework import fields, relations
+from rest_framework.response import Response
+from rest_framework.settings import api_settings
+from rest_framework_json_api.utils import (
+    get_related_resource_type,
+    get_resource_type_from_serializer,
+)
+
+
+def encode_decimal(value):
+    return None if value is None else f"{value:f}"
+
+
+def encode_datetime(value, tz=None):
+    if value is None:
+        return None
+    value = value.astimezone(tz or timezone.get_current_timezone()).isoformat()
+    return value[:-6] + "Z" if value.endswith("+00:00") else value
+
+
+def _identity(value):
+    return value
+
+
+class ResourceSchema:
+    """
+    Flattened description of a ``ModelSerializer`` used to render rows from
+    ``QuerySet.values()`` exactly as the serializer and the JSON:API renderer
+    would, without their per-object and per-field overhead.
+    """
+
+    def __init__(self, serializer_class):
+        serializer = serializer_class()
+        self.type = get_resource_type_from_serializer(serializer_class)
+        self.fields = []  # (name, column, encoder)
+        self.attributes = []
+        self.relationships = []  # (name, related resource type)
+        for name, field in serializer.fields.items():
+            if field.write_only:
+                continue
+            if isinstance(field, relations.PrimaryKeyRelatedField):
+                if field.pk_field is not None:
+                    raise ImproperlyConfigured(f"{name}: pk_field is not supported")
+                self.fields.append((name, f"{field.source}_id", _identity))
+                self.relationships.append((name, get_related_resource_type(field)))
+                continue
+            if isinstance(field, relations.RelatedField) or "." in field.source:
+                raise ImproperlyConfigured(f"{name}: unsupported field {field!r}")
+            self.fields.append((name, field.source, self._encoder(field)))
+            if name != "id":
+                self.attributes.append(name)
+        self.columns = [column for _, column, _ in self.fields]
+
+    @staticmethod
+    def _encoder(field):
+        if isinstance(field, fields.DecimalField):
+            plain = (
+                getattr(
+                    field, "coerce_to_string", api_settings.COERCE_DECIMAL_TO_STRING
+                )
+                and not field.localize
+                and not getattr(field, "normalize_output", False)
+            )
+            return encode_decimal if plain else field.to_representation
+        if isinstance(field, fields.DateTimeField):
+            output_format = getattr(field, "format", api_settings.DATETIME_FORMAT)
+            plain = output_format == api_settings.DATETIME_FORMAT == "iso-8601"
+            return encode_datetime if plain else field.to_representation
+        if type(field) in (fields.CharField, fields.IntegerField):
+            return _identity
+        # BigIntegerField only exists as of DRF 3.16
+        if type(field) is getattr(fields, "BigIntegerField", None) and not getattr(
+            field, "coerce_to_string", api_settings.COERCE_BIGINT_TO_STRING
+        ):
+            return _identity
+        return field.to_representation
+
+    def represent(self, rows):
+        """Yield the dicts ``serializer.data`` would give for ``.values()`` rows."""
+        # resolving the active time zone is surprisingly costly, do it once
+        tz = timezone.get_current_timezone()
+        fields = [
+            (
+                name,
+                column,
+                partial(encode, tz=tz) if encode is encode_datetime else encode,
+            )
+            for name, column, encode in self.fields
+        ]
+        for row in rows:
+            yield {name: encode(row[column]) for name, column, encode in fields}
+
+    def resource_object(self, representation):
+        resource = {"type": self.type, "id": str(representation["id"])}
+        if self.attributes:
+            resource["attributes"] = {
+                name: representation[name] for name in self.attributes
+            }
+        if self.relationships:
+            resource["relationships"] = {
+                name: {
+                    "data": (
+                        {"type": related_type, "id": str(representation[name])}
+                        if representation[name]
+                        else None
+                    )
+                }
+                for name, related_type in self.relationships
+            }
+        return resource
+
+
+class FastResults(list):
+    """Representations of a page of rows, rendered by ``renderers.JSONRenderer``."""
+
+    def __init__(self, schema, representations):
+        super().__init__(representations)
+        self.schema = schema
+
+
+class FastResource(dict):
+    """Representation of a single row, rendered by ``renderers.JSONRenderer``."""
+
+    def __init__(self, schema, representation):
+        super().__init__(representation)
+        self.schema = schema
+
+
+class FastReadMixin:
+    """
+    Serve ``list`` and ``retrieve`` from ``QuerySet.values()`` rows.
+
+    The response data has the same shape as with the serializer, and
+    ``renderers.JSONRenderer`` turns it into the same bytes the JSON:API
+    renderer would. Requests the fast path can't answer identically
+    (``include``, sparse fieldsets, other renderers) take the regular path,
+    see ``wallet_app.preload`` for the first two.
+    """
+
+    _schemas = {}
+
+    def get_resource_schema(self):
+        serializer_class = self.get_serializer_class()
+        if serializer_class not in self._schemas:
+            self._schemas[serializer_class] = ResourceSchema(serializer_class)
+        return self._schemas[serializer_class]
+
+    def use_fast_read(self):
+        from wallet_app.renderers import JSONRenderer
+
+        if not settings.WALLET_FAST_READ:
+            return False
+        if not isinstance(self.request.accepted_renderer, JSONRenderer):
+            return False
+        return not any(
+            param == "include" or param.startswith("fields[")
+            for param in self.request.query_params
+        )
+
+    def list(self, request, *args, **kwargs):
+        if not self.use_fast_read():
+            return super().list(request, *args, **kwargs)
+        schema = self.get_resource_schema()
+        rows = self.filter_queryset(self.get_queryset()).values(*schema.columns)
+        page = self.paginate_queryset(rows)
+        representations = FastResults(
+            schema, schema.represent(rows if page is None else page)
+        )
+        if page is not None:
+            return self.get_paginated_response(representations)
+        return Response(representations)
+
+    def retrieve(self, request, *args, **kwargs):
+        if not self.use_fast_read():
+            return super().retrieve(request, *args, **kwargs)
+        schema = self.get_resource_schema()
+        row = self.get_row(schema)
+        return Response(FastResource(schema, next(schema.represent([row]))))
+
+    def get_row(self, schema):
+        """``get_object()`` counterpart returning a ``.values()`` row."""
+        rows = self.filter_queryset(self.get_queryset()).values(*schema.columns)
+        lookup_url_kwarg = self.lookup_url_kwarg or self.lookup_field
+        row = get_object_or_404(
+            rows, **{self.lookup_field: self.kwargs[lookup_url_kwarg]}
+        )
+        self.check_object_permissions(self.request, row)
+        return row
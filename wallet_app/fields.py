@@ -0,0 +1,173 @@
+"""
+Fixed-point storage for amounts and balances.
+
+``FixedPointField`` is a ``DecimalField`` to the rest of the code: model
+instances, ``values()`` rows, lookups and serializers all deal in
+``Decimal``. With ``settings.WALLET_FIXED_POINT`` its column holds a
+``BIGINT`` of ``10 ** -decimal_places`` units instead of a ``NUMERIC``, so
+posting arithmetic, the ``non_negative_balance`` check, comparisons and the
+indexes work on native 8-byte integers. 18 digits always fit in 63 bits.
+
+Migration 0010 converts the columns to the configured storage;
+``manage.py convert_amount_storage`` does it again after the setting
+changed. Raw SQL reading these columns as amounts goes through
+``numeric_sql()`` and raw SQL writing them through ``units_sql()``; ORM
+expressions mixing them with ``NUMERIC`` values go through ``numeric()``.
+"""
+
+from decimal import ROUND_HALF_UP, Decimal
+
+from django.apps import apps
+from django.conf import settings
+from django.core import checks
+from django.db import connections, models
+from django.db.migrations.recorder import MigrationRecorder
+from django.db.models import ExpressionWrapper, Value
+
+ONE = Decimal(1)
+# the migration that puts the columns under the configured storage
+MIGRATION = ("wallet_app", "0010_fixed_point_amounts")
+
+
+def to_units(value, decimal_places):
+    """``value`` as an integer number of ``10 ** -decimal_places`` units."""
+    # NUMERIC columns round half away from zero too
+    return int(value.scaleb(decimal_places).quantize(ONE, rounding=ROUND_HALF_UP))
+
+
+class FixedPointField(models.DecimalField):
+    def db_type(self, connection):
+        if settings.WALLET_FIXED_POINT:
+            return "bigint"
+        return super().db_type(connection)
+
+    def from_db_value(self, value, expression, connection):
+        if value is None or not settings.WALLET_FIXED_POINT:
+            return value
+        return Decimal(value).scaleb(-self.decimal_places)
+
+    def get_db_prep_value(self, value, connection, prepared=False):
+        if not settings.WALLET_FIXED_POINT:
+            return super().get_db_prep_value(value, connection, prepared)
+        if not prepared:
+            value = self.get_prep_value(value)
+        if value is None or hasattr(value, "as_sql"):
+            return value
+        return to_units(value, self.decimal_places)
+
+
+def numeric_sql(sql, decimal_places=8):
+    """
+    SQL for ``sql``, a ``FixedPointField`` column or an aggregate of one, as
+    a ``NUMERIC`` amount in either storage mode.
+    """
+    if settings.WALLET_FIXED_POINT:
+        return f"(({sql})::numeric / {10**decimal_places})"
+    return sql
+
+
+def units_sql(sql, decimal_places=8):
+    """
+    SQL storing ``sql``, a ``NUMERIC`` amount, in a ``FixedPointField``
+    column in either storage mode; the inverse of ``numeric_sql()``.
+    """
+    if settings.WALLET_FIXED_POINT:
+        return f"(({sql}) * {10**decimal_places})::bigint"
+    return sql
+
+
+def numeric(expression, output_field, decimal_places=8):
+    """ORM counterpart of ``numeric_sql()``."""
+    if settings.WALLET_FIXED_POINT:
+        scale = Value(Decimal(10**decimal_places))
+        return ExpressionWrapper(expression / scale, output_field=output_field)
+    return expression
+
+
+def fixed_point_fields():
+    """Yield ``(model, field)`` for every ``FixedPointField`` of the app."""
+    for model in apps.get_app_config("wallet_app").get_models():
+        for field in model._meta.local_fields:
+            if isinstance(field, FixedPointField):
+                yield model, field
+
+
+def column_types(connection):
+    """Return ``{(table, column): data_type}`` of the fixed point columns."""
+    columns = {
+        (model._meta.db_table, field.column) for model, field in fixed_point_fields()
+    }
+    with connection.cursor() as cursor:
+        cursor.execute(
+            "SELECT table_name, column_name, data_type "
+            "FROM information_schema.columns "
+            "WHERE table_schema = current_schema() AND table_name = ANY(%s)",
+            [sorted({table for table, _ in columns})],
+        )
+        return {
+            (table, column): data_type
+            for table, column, data_type in cursor
+            if (table, column) in columns
+        }
+
+
+def convert(schema_editor, fixed):
+    """
+    Rewrite the fixed point columns as ``BIGINT`` units (``fixed``) or as
+    ``NUMERIC``; columns already stored that way are left alone. Returns the
+    converted ``(model, field)`` pairs.
+
+    Each conversion rewrites its table under an ``ACCESS EXCLUSIVE`` lock.
+    The check constraints of a converted column are added back afterwards so
+    that they compare in the column's own type.
+    """
+    target = "bigint" if fixed else "numeric"
+    types = column_types(schema_editor.connection)
+    converted = []
+    for model, field in fixed_point_fields():
+        table, column = model._meta.db_table, field.column
+        if types.get((table, column), target) == target:
+            continue
+        constraints = [
+            constraint
+            for constraint in model._meta.constraints
+            if isinstance(constraint, models.CheckConstraint)
+        ]
+        for constraint in constraints:
+            schema_editor.remove_constraint(model, constraint)
+        quoted, scale = schema_editor.quote_name(column), 10**field.decimal_places
+        if fixed:
+            db_type, using = "bigint", f"({quoted} * {scale})::bigint"
+        else:
+            db_type = f"numeric({field.max_digits}, {field.decimal_places})"
+            using = f"{quoted}::numeric / {scale}"
+        schema_editor.execute(
+            f"ALTER TABLE {schema_editor.quote_name(table)} "
+            f"ALTER COLUMN {quoted} TYPE {db_type} USING {using}"
+        )
+        for constraint in constraints:
+            schema_editor.add_constraint(model, constraint)
+        converted.append((model, field))
+    return converted
+
+
+@checks.register(checks.Tags.database)
+def check_storage(databases=None, **kwargs):
+    """Fail ``migrate`` and ``check --database`` on a storage/setting mismatch."""
+    errors = []
+    target = "bigint" if settings.WALLET_FIXED_POINT else "numeric"
+    for alias in databases or ():
+        connection = connections[alias]
+        if MIGRATION not in MigrationRecorder(connection).applied_migrations():
+            continue
+        for (table, column), data_type in sorted(column_types(connection).items()):
+            if data_type != target:
+                errors.append(
+                    checks.Error(
+                        f"{table}.{column} is stored as {data_type} but "
+                        f"WALLET_FIXED_POINT expects {target}.",
+                        hint="Run `manage.py convert_amount_storage`.",
+                        id="wallet_app.E001",
+                    )
+                )
+    return errors
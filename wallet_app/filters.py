@@ -0,0 +1,65 @@
+from django.contrib.postgres.search import TrigramSimilarity
+from django.db.models.functions import Upper
+from django_filters import rest_framework
+from rest_framework.filters import BaseFilterBackend
+
+
+class DjangoFilterBackend(rest_framework.DjangoFilterBackend):
+    """
+    django-filter's backend, with the OpenAPI parameters it no longer
+    describes since django-filter 25.
+    """
+
+    def get_schema_operation_parameters(self, view):
+        filterset_class = self.get_filterset_class(view, view.queryset)
+        if filterset_class is None:
+            return []
+        return [
+            {
+                "name": name,
+                "required": filter_.extra["required"],
+                "in": "query",
+                "description": str(filter_.label or name),
+                "schema": {"type": "string"},
+            }
+            for name, filter_ in filterset_class.base_filters.items()
+        ]
+
+
+class TrigramSimilarityFilter(BaseFilterBackend):
+    """
+    Fuzzy search ranked by trigram similarity, e.g. ``?filter[similar]=walet``.
+
+    Rows are matched with ``UPPER(field) % UPPER(term)`` so the match can
+    use the same ``gin_trgm_ops`` index on ``UPPER(field)`` that serves
+    ``icontains``. The results are ordered best match first, and this
+    ordering takes precedence over ``?ordering``.
+    """
+
+    similarity_param = "filter[similar]"
+
+    def filter_queryset(self, request, queryset, view):
+        term = request.query_params.get(self.similarity_param, "").strip()
+        field = getattr(view, "similarity_field", None)
+        if not term or field is None:
+            return queryset
+        term = term.upper()
+        return (
+            queryset.alias(similarity_key=Upper(field))
+            .filter(similarity_key__trigram_similar=term)
+            .annotate(similarity=TrigramSimilarity(Upper(field), term))
+            .order_by("-similarity", "pk")
+        )
+
+    def get_schema_operation_parameters(self, view):
+        if getattr(view, "similarity_field", None) is None:
+            return []
+        return [
+            {
+                "name": self.similarity_param,
+                "required": False,
+                "in": "query",
+                "description": f"Fuzzy match on {view.similarity_field}, best first",
+                "schema": {"type": "string"},
+            }
+        ]
@@ -0,0 +1,51 @@
+import threading
+from collections import OrderedDict
+
+from django.conf import settings
+
+
+class RecentTransactions:
+    """
+    Bounded, thread-safe LRU map of ``txid`` -> ``Transaction``.
+
+    Lets client retries of a recent POST be answered without a database
+    round trip. The cache is per process; entries are dropped when the
+    transaction is updated or deleted through the API, or purged with its
+    wallet (``wallet_app.purge``), by the same process. Other processes keep
+    such entries until they are evicted, ``WALLET_TXID_CACHE_SIZE`` postings
+    later at most, and until then replay the transaction to retries. The
+    same holds for transactions whose partition was archived: their txids
+    stay registered, so retries conflict once the entry is gone.
+    """
+
+    def __init__(self, maxsize):
+        self.maxsize = maxsize
+        self._items = OrderedDict()
+        self._lock = threading.Lock()
+
+    def get(self, txid):
+        with self._lock:
+            tx = self._items.get(txid)
+            if tx is not None:
+                self._items.move_to_end(txid)
+            return tx
+
+    def add(self, tx):
+        if self.maxsize <= 0:
+            return
+        with self._lock:
+            self._items[tx.txid] = tx
+            self._items.move_to_end(tx.txid)
+            while len(self._items) > self.maxsize:
+                self._items.popitem(last=False)
+
+    def discard(self, txid):
+        with self._lock:
+            self._items.pop(txid, None)
+
+    def clear(self):
+        with self._lock:
+            self._items.clear()
+
+
+recent_transactions = RecentTransactions(settings.WALLET_TXID_CACHE_SIZE)
@@ -0,0 +1,174 @@
+from collections import Counter, defaultdict
+
+from django.db import transaction
+
+from wallet_app import events, metrics, rollups
+from wallet_app.models import Transaction, TransactionTxid, Transfer, Wallet
+
+INSUFFICIENT_BALANCE = "Insufficient balance"
+WALLET_NOT_FOUND = "Wallet not found"
+DUPLICATE_TXID = "Duplicate txid"
+
+
+def post_batch(items):
+    """
+    Post many transactions at once.
+
+    ``items`` is a list of dicts with ``wallet_id``, ``amount`` and ``txid``.
+    Rows are grouped by wallet and each wallet is locked exactly once, in
+    ascending id order, so that concurrent batches can't deadlock each other.
+    Rows are applied in input order per wallet; a row that would push the
+    balance below zero is rejected and the rest of the batch still goes through.
+
+    Returns a list aligned with ``items`` of ``(transaction, error)`` pairs
+    where exactly one of the two is ``None``.
+    """
+    results = [(None, None)] * len(items)
+    by_wallet = defaultdict(list)
+    for index, item in enumerate(items):
+        by_wallet[item["wallet_id"]].append(index)
+
+    with transaction.atomic():
+        with metrics.lock_wait():
+            wallets = list(
+                Wallet.objects.select_for_update()
+                .filter(id__in=by_wallet, deleted_at=None)
+                .order_by("id")
+            )
+        # the registry also knows the txids of archived partitions
+        seen_txids = set(
+            TransactionTxid.objects.filter(
+                txid__in=[item["txid"] for item in items]
+            ).values_list("txid", flat=True)
+        )
+
+        for wallet_id in by_wallet.keys() - {wallet.id for wallet in wallets}:
+            for index in by_wallet[wallet_id]:
+                results[index] = (None, WALLET_NOT_FOUND)
+
+        rows, postings = [], []
+        for wallet in wallets:
+            balance, added = wallet.balance, 0
+            for index in by_wallet[wallet.id]:
+                item = items[index]
+                if item["txid"] in seen_txids:
+                    results[index] = (None, DUPLICATE_TXID)
+                    continue
+                if balance + item["amount"] < 0:
+                    results[index] = (None, INSUFFICIENT_BALANCE)
+                    continue
+                seen_txids.add(item["txid"])
+                balance += item["amount"]
+                tx = Transaction(
+                    wallet=wallet, txid=item["txid"], amount=item["amount"]
+                )
+                rows.append(tx)
+                postings.append((tx, balance))
+                added += 1
+                results[index] = (tx, None)
+            if added:
+                wallet.balance = balance
+                wallet.transaction_count += added
+                wallet.save(
+                    update_fields=["balance", "transaction_count", "updated_at"]
+                )
+
+        # bulk_create fills in the ids and created_at of the very instances
+        # held in `results`
+        Transaction.objects.bulk_create(rows)
+        rollups.record(rows)
+        events.publish(postings)
+
+    metrics.count_insufficient_balance(
+        sum(error == INSUFFICIENT_BALANCE for _, error in results)
+    )
+    return results
+
+
+def post_transfers(items):
+    """
+    Post many wallet-to-wallet transfers at once.
+
+    ``items`` is a list of dicts with ``source_id``, ``destination_id``,
+    ``amount`` (positive) and ``txid``. Every wallet involved is locked once,
+    in ascending id order, so transfers crossing in opposite directions
+    can't deadlock. Transfers are applied in input order; one that would
+    overdraw its source is rejected and the rest still go through. Both legs
+    of an accepted transfer commit together, with the ``Transfer`` that links
+    them.
+
+    Returns a list aligned with ``items`` of ``(transfer, error)`` pairs
+    where exactly one of the two is ``None``.
+    """
+    results = [(None, None)] * len(items)
+    wallet_ids = {item["source_id"] for item in items}
+    wallet_ids.update(item["destination_id"] for item in items)
+
+    with transaction.atomic():
+        with metrics.lock_wait():
+            wallets = {
+                wallet.id: wallet
+                for wallet in Wallet.objects.select_for_update()
+                .filter(id__in=wallet_ids, deleted_at=None)
+                .order_by("id")
+            }
+        transfers = [Transfer(**item) for item in items]
+        seen_txids = set(
+            Transfer.objects.filter(
+                txid__in=[transfer.txid for transfer in transfers]
+            ).values_list("txid", flat=True)
+        )
+        seen_txids.update(
+            TransactionTxid.objects.filter(
+                txid__in=[txid for t in transfers for txid in t.leg_txids()]
+            ).values_list("txid", flat=True)
+        )
+        balances = {wallet_id: wallet.balance for wallet_id, wallet in wallets.items()}
+
+        legs, postings = [], []
+        for index, transfer in enumerate(transfers):
+            if not {transfer.source_id, transfer.destination_id} <= balances.keys():
+                results[index] = (None, WALLET_NOT_FOUND)
+                continue
+            debit_txid, credit_txid = transfer.leg_txids()
+            if seen_txids & {transfer.txid, debit_txid, credit_txid}:
+                results[index] = (None, DUPLICATE_TXID)
+                continue
+            if balances[transfer.source_id] < transfer.amount:
+                results[index] = (None, INSUFFICIENT_BALANCE)
+                continue
+            seen_txids.update((transfer.txid, debit_txid, credit_txid))
+            balances[transfer.source_id] -= transfer.amount
+            balances[transfer.destination_id] += transfer.amount
+            debit = Transaction(
+                wallet_id=transfer.source_id, txid=debit_txid, amount=-transfer.amount
+            )
+            credit = Transaction(
+                wallet_id=transfer.destination_id,
+                txid=credit_txid,
+                amount=transfer.amount,
+            )
+            legs.extend((debit, credit))
+            postings.append((debit, balances[transfer.source_id]))
+            postings.append((credit, balances[transfer.destination_id]))
+            results[index] = (transfer, None)
+
+        added = Counter(leg.wallet_id for leg in legs)
+        for wallet_id in sorted(added):
+            wallet = wallets[wallet_id]
+            wallet.balance = balances[wallet_id]
+            wallet.transaction_count += added[wallet_id]
+            wallet.save(update_fields=["balance", "transaction_count", "updated_at"])
+
+        Transaction.objects.bulk_create(legs)
+        rollups.record(legs)
+        events.publish(postings)
+        accepted = [transfer for transfer, error in results if transfer is not None]
+        for transfer, debit, credit in zip(accepted, legs[::2], legs[1::2]):
+            transfer.debit_id, transfer.credit_id = debit.id, credit.id
+        Transfer.objects.bulk_create(accepted)
+
+    metrics.count_insufficient_balance(
+        sum(error == INSUFFICIENT_BALANCE for _, error in results)
+    )
+    return results
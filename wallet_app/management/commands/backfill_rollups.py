@@ -0,0 +1,64 @@
+import time
+
+from django.core.management.base import BaseCommand, CommandError
+from django.db import transaction
+from django.db.models import Max, Min
+from django.utils.dateparse import parse_date
+
+from wallet_app import rollups
+from wallet_app.models import Transaction, Wallet
+
+
+class Command(BaseCommand):
+    help = "Rebuild the per-wallet daily rollups from the transaction table."
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            "--since",
+            help="First UTC day (YYYY-MM-DD) to rebuild. Defaults to the day of "
+            "the oldest transaction, so the rollups of archived partitions are "
+            "kept.",
+        )
+        parser.add_argument(
+            "--range-size",
+            type=int,
+            default=1000,
+            help="Number of wallet ids rebuilt per database transaction.",
+        )
+
+    def handle(self, *args, since, range_size, **options):
+        if since is not None:
+            since = parse_date(since)
+            if since is None:
+                raise CommandError("--since must be a date in YYYY-MM-DD format")
+        else:
+            oldest = Transaction.objects.aggregate(oldest=Min("created_at"))["oldest"]
+            if oldest is None:
+                self.stderr.write("No transactions to roll up")
+                return
+            since = rollups.day_of(oldest)
+        bounds = Wallet.objects.aggregate(lo=Min("id"), hi=Max("id"))
+        if bounds["lo"] is None:
+            self.stderr.write("No wallets to roll up")
+            return
+
+        started = time.perf_counter()
+        days = 0
+        for start in range(bounds["lo"], bounds["hi"] + 1, range_size):
+            days += self.rebuild(start, start + range_size, since)
+        self.stderr.write(
+            f"Rebuilt {days} wallet days since {since} "
+            f"in {time.perf_counter() - started:.1f}s"
+        )
+
+    @transaction.atomic
+    def rebuild(self, start, stop, since):
+        # postings lock their wallet first, so none can slip in between the
+        # rebuild's read of the ledger and its write of the rollups
+        list(
+            Wallet.objects.select_for_update()
+            .filter(id__gte=start, id__lt=stop)
+            .order_by("id")
+            .values_list("id", flat=True)
+        )
+        return rollups.rebuild(start, stop, since)
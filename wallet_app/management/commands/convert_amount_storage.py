@@ -0,0 +1,28 @@
+import time
+
+from django.conf import settings
+from django.core.management.base import BaseCommand
+from django.db import connection
+
+from wallet_app import fields
+
+
+class Command(BaseCommand):
+    help = (
+        "Convert the amount and balance columns to the storage selected by "
+        "WALLET_FIXED_POINT: BIGINT units of 1e-8 or NUMERIC(18, 8). Every "
+        "converted table is rewritten under an exclusive lock."
+    )
+
+    def handle(self, *args, **options):
+        fixed = settings.WALLET_FIXED_POINT
+        started = time.perf_counter()
+        with connection.schema_editor() as schema_editor:
+            converted = fields.convert(schema_editor, fixed=fixed)
+        for model, field in converted:
+            self.stdout.write(f"{model._meta.db_table}.{field.column}")
+        self.stderr.write(
+            f"Converted {len(converted)} columns to "
+            f"{'bigint' if fixed else 'numeric'} "
+            f"in {time.perf_counter() - started:.1f}s"
+        )
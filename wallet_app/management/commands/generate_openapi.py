@@ -0,0 +1,30 @@
+from django.conf import settings
+from django.core.management.base import BaseCommand, CommandError
+
+from wallet_app import openapi
+
+
+class Command(BaseCommand):
+    help = (
+        "Write the OpenAPI schema to a file that /openapi serves instead of "
+        "generating it, see WALLET_OPENAPI_SCHEMA. Run it at build time, "
+        "after every change of the API."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            "--output",
+            default=settings.WALLET_OPENAPI_SCHEMA,
+            help="File to write, `-` for stdout. Defaults to WALLET_OPENAPI_SCHEMA.",
+        )
+
+    def handle(self, *args, output, **options):
+        if not output:
+            raise CommandError("Pass --output or set WALLET_OPENAPI_SCHEMA")
+        content = openapi.generate()
+        if output == "-":
+            self.stdout.write(content.decode())
+            return
+        with open(output, "wb") as file:
+            file.write(content)
+        self.stderr.write(f"Wrote {len(content)} bytes to {output}")
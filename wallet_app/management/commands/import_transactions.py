@@ -0,0 +1,254 @@
+import csv
+import json
+import sys
+import time
+from decimal import Decimal
+
+from django.core.management.base import BaseCommand, CommandError
+from django.db import DatabaseError, connection, transaction
+
+from wallet_app import fields, partitions, rollups
+from wallet_app.caching import wallet_cache
+from wallet_app.models import TransactionTxid, Wallet
+
+STAGING = "import_staging"
+COLUMNS = {"wallet": "wallet_id", "wallet_id": "wallet_id"} | {
+    column: column for column in ("txid", "amount", "created_at")
+}
+BLOCK_SIZE = 1 << 20
+WALLETS = Wallet._meta.db_table
+TXIDS = TransactionTxid._meta.db_table
+
+# (error, condition on the staging row `s`), checked in this order; each row
+# keeps the first error it fails
+CHECKS = [
+    ("Missing wallet", "s.wallet_id IS NULL"),
+    ("Missing amount", "s.amount IS NULL"),
+    ("txid is longer than 255 characters", "length(s.txid) > 255"),
+    (
+        "amount must have at most 10 integer digits and 8 decimal places",
+        "s.amount <> round(s.amount, 8) OR abs(s.amount) >= 1e10",
+    ),
+    (
+        "Wallet not found",
+        f"NOT EXISTS (SELECT FROM {WALLETS} w "
+        "WHERE w.id = s.wallet_id AND w.deleted_at IS NULL)",
+    ),
+    (
+        "txid already exists",
+        f"EXISTS (SELECT FROM {TXIDS} t WHERE t.txid = s.txid)",
+    ),
+]
+
+
+class Command(BaseCommand):
+    help = (
+        "Bulk load transactions from a CSV file (header row naming wallet, "
+        "amount and optionally txid and created_at) or an NDJSON file of "
+        "objects with those keys. Rows are COPYed into a staging table, "
+        "validated with set-based SQL and inserted in one database "
+        "transaction; each wallet's balance, transaction count and rollups "
+        "are then updated with one aggregate statement apiece. Every row of "
+        "a wallet whose final balance would be negative is rejected. "
+        "Rejected rows are written to stdout as NDJSON, numbered from 1 in "
+        "input order. Rows dated outside the existing partitions land in the "
+        "default partition; create them first with `transaction_partitions`."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument("path", help="File to import, `-` for stdin.")
+        parser.add_argument(
+            "--format",
+            choices=["csv", "ndjson"],
+            help="Input format. Defaults to the file's extension, csv for stdin.",
+        )
+        parser.add_argument(
+            "--chunk-size",
+            type=int,
+            default=100_000,
+            help="Number of rows per INSERT into the transaction table.",
+        )
+        parser.add_argument(
+            "--dry-run",
+            action="store_true",
+            help="Validate and report the rejected rows, then roll back.",
+        )
+
+    def handle(self, *args, path, chunk_size, dry_run, **options):
+        input_format = options["format"]
+        if input_format is None:
+            input_format = "ndjson" if path.endswith((".ndjson", ".jsonl")) else "csv"
+        started = time.perf_counter()
+        with transaction.atomic():
+            with self.open(path) as file, connection.cursor() as cursor:
+                cursor.execute(
+                    f"CREATE TEMPORARY TABLE {STAGING} (line bigserial PRIMARY KEY, "
+                    "wallet_id bigint, txid text, amount numeric, "
+                    "created_at timestamptz, error text) ON COMMIT DROP"
+                )
+                try:
+                    if input_format == "csv":
+                        self.copy_csv(cursor, file)
+                    else:
+                        self.copy_ndjson(cursor, file)
+                # cursor.copy() is psycopg's own, its errors are not wrapped
+                except (DatabaseError, connection.Database.Error) as e:
+                    raise CommandError(f"Can't load {path}: {e}") from e
+            total = self.validate()
+            imported, wallet_ids = self.insert(chunk_size)
+            self.report_rejected()
+            if dry_run:
+                transaction.set_rollback(True)
+        if not dry_run:
+            for wallet_id in wallet_ids:
+                wallet_cache.invalidate(wallet_id)
+
+        elapsed = time.perf_counter() - started
+        self.stderr.write(
+            f"{'Validated' if dry_run else 'Imported'} {imported} rows "
+            f"({total - imported} rejected) in {elapsed:.1f}s "
+            f"({total / elapsed if elapsed else 0:.0f} rows/s)"
+        )
+
+    def open(self, path):
+        if path == "-":
+            return open(sys.stdin.fileno(), encoding="utf-8", closefd=False)
+        try:
+            return open(path, encoding="utf-8", newline="")
+        except OSError as e:
+            raise CommandError(f"Can't open {path}: {e}") from e
+
+    def copy_csv(self, cursor, file):
+        header = next(csv.reader([file.readline()]), None)
+        if not header:
+            raise CommandError("The CSV file has no header row")
+        unknown = sorted(set(header) - COLUMNS.keys())
+        if unknown:
+            raise CommandError(f"Unknown CSV columns: {', '.join(unknown)}")
+        columns = ", ".join(COLUMNS[name] for name in header)
+        # the rest of the file goes to the server as is, unquoted empty
+        # fields being NULLs
+        with cursor.copy(
+            f"COPY {STAGING} ({columns}) FROM STDIN WITH (FORMAT csv)"
+        ) as copy:
+            while block := file.read(BLOCK_SIZE):
+                copy.write(block)
+
+    def copy_ndjson(self, cursor, file):
+        columns = ["wallet_id", "txid", "amount", "created_at"]
+        with cursor.copy(f"COPY {STAGING} ({', '.join(columns)}) FROM STDIN") as copy:
+            for number, line in enumerate(file, 1):
+                if not line.strip():
+                    continue
+                try:
+                    row = json.loads(line, parse_float=Decimal)
+                except ValueError as e:
+                    raise CommandError(f"Line {number}: {e}") from e
+                if not isinstance(row, dict):
+                    raise CommandError(f"Line {number}: expected an object")
+                unknown = sorted(row.keys() - COLUMNS.keys())
+                if unknown:
+                    raise CommandError(f"Line {number}: unknown keys {unknown}")
+                values = {COLUMNS[key]: value for key, value in row.items()}
+                copy.write_row(
+                    [
+                        None if values.get(column) is None else str(values[column])
+                        for column in columns
+                    ]
+                )
+
+    def validate(self):
+        """Set the ``error`` of every rejected staging row; return the row count."""
+        with connection.cursor() as cursor:
+            cursor.execute(f"SELECT count(*) FROM {STAGING}")
+            (total,) = cursor.fetchone()
+            cursor.execute(
+                f"UPDATE {STAGING} SET txid = gen_random_uuid()::text "
+                "WHERE txid IS NULL OR txid = ''"
+            )
+            cursor.execute(
+                f"UPDATE {STAGING} SET created_at = now() WHERE created_at IS NULL"
+            )
+            # postings lock their wallet first, and so does schedule(), so the
+            # balances and deletions read below stay valid until commit
+            cursor.execute(
+                f"SELECT id FROM {WALLETS} WHERE id IN "
+                f"(SELECT wallet_id FROM {STAGING}) ORDER BY id FOR UPDATE"
+            )
+            for error, condition in CHECKS:
+                cursor.execute(
+                    f"UPDATE {STAGING} s SET error = %s "
+                    f"WHERE s.error IS NULL AND ({condition})",
+                    [error],
+                )
+            cursor.execute(
+                f"UPDATE {STAGING} s SET error = 'Duplicate txid in file' "
+                "FROM (SELECT line, row_number() OVER "
+                f"(PARTITION BY txid ORDER BY line) AS n FROM {STAGING} "
+                "WHERE error IS NULL) d WHERE s.line = d.line AND d.n > 1"
+            )
+            # only the final balance is checked: the rows of a wallet are
+            # applied at once, not in file order
+            cursor.execute(
+                f"UPDATE {STAGING} s SET error = 'Insufficient balance' "
+                f"FROM (SELECT s.wallet_id FROM {STAGING} s "
+                f"JOIN {WALLETS} w ON w.id = s.wallet_id WHERE s.error IS NULL "
+                "GROUP BY s.wallet_id, w.balance "
+                f"HAVING {fields.numeric_sql('w.balance')} + sum(s.amount) < 0) r "
+                "WHERE s.wallet_id = r.wallet_id AND s.error IS NULL"
+            )
+        return total
+
+    def insert(self, chunk_size):
+        """
+        Insert the valid staging rows and apply them to the wallets and the
+        rollups. Returns the number of rows and the ids of the wallets.
+        """
+        with connection.cursor() as cursor:
+            cursor.execute(
+                f"SELECT min(line), max(line), count(*) FROM {STAGING} "
+                "WHERE error IS NULL"
+            )
+            first, last, imported = cursor.fetchone()
+            if not imported:
+                return 0, []
+            for start in range(first, last + 1, chunk_size):
+                cursor.execute(
+                    f"INSERT INTO {partitions.TABLE} "
+                    "(wallet_id, txid, amount, created_at) "
+                    f"SELECT wallet_id, txid, {fields.units_sql('amount')}, "
+                    f"created_at FROM {STAGING} WHERE error IS NULL "
+                    "AND line >= %s AND line < %s ORDER BY line",
+                    [start, start + chunk_size],
+                )
+            cursor.execute(
+                f"UPDATE {WALLETS} w SET "
+                f"balance = w.balance + {fields.units_sql('t.amount')}, "
+                "transaction_count = w.transaction_count + t.count, "
+                "updated_at = now() "
+                "FROM (SELECT wallet_id, sum(amount) AS amount, count(*) AS count "
+                f"FROM {STAGING} WHERE error IS NULL GROUP BY wallet_id) t "
+                "WHERE w.id = t.wallet_id RETURNING w.id"
+            )
+            wallet_ids = [wallet_id for (wallet_id,) in cursor]
+        rollups.record_table(STAGING, "error IS NULL")
+        return imported, wallet_ids
+
+    def report_rejected(self):
+        with connection.cursor() as cursor:
+            cursor.execute(
+                f"SELECT line, wallet_id, txid, amount, error FROM {STAGING} "
+                "WHERE error IS NOT NULL ORDER BY line"
+            )
+            for line, wallet_id, txid, amount, error in cursor:
+                self.stdout.write(
+                    json.dumps(
+                        {
+                            "row": line,
+                            "wallet": wallet_id,
+                            "txid": txid,
+                            "amount": None if amount is None else str(amount),
+                            "error": error,
+                        }
+                    )
+                )
@@ -0,0 +1,54 @@
+import time
+
+from django.core.management.base import BaseCommand
+
+from wallet_app import purge
+
+
+class Command(BaseCommand):
+    help = (
+        "Delete the rows of wallets deleted through the API, a chunk per "
+        "database transaction, and then the wallets themselves. Run as many "
+        "workers as needed; they never claim the same wallet."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            "--chunk-size",
+            type=int,
+            default=5000,
+            help="Maximum number of rows deleted per database transaction.",
+        )
+        parser.add_argument(
+            "--poll-interval",
+            type=float,
+            default=1.0,
+            help="Seconds to wait when there is nothing to claim.",
+        )
+        parser.add_argument(
+            "--once",
+            action="store_true",
+            help="Exit as soon as there is nothing left to claim.",
+        )
+
+    def handle(self, *args, chunk_size, poll_interval, once, **options):
+        chunks = purged = 0
+        try:
+            while True:
+                deletion = purge.process(chunk_size)
+                if deletion is not None:
+                    chunks += 1
+                    if deletion.finished_at is not None:
+                        purged += 1
+                        if options["verbosity"] > 1:
+                            self.stderr.write(
+                                f"Deleted wallet {deletion.wallet_id} and "
+                                f"{deletion.deleted} transactions"
+                            )
+                    continue
+                if once:
+                    break
+                time.sleep(poll_interval)
+        except KeyboardInterrupt:
+            pass
+        self.stderr.write(f"Deleted {purged} wallets in {chunks} chunks")
@@ -0,0 +1,187 @@
+import json
+import multiprocessing
+import os
+import time
+from concurrent.futures import ProcessPoolExecutor
+
+from django.core.management.base import BaseCommand
+from django.db import IntegrityError, connections, transaction
+from django.db.models import (
+    BigIntegerField,
+    Count,
+    DecimalField,
+    Max,
+    Min,
+    OuterRef,
+    Subquery,
+    Sum,
+    Value,
+)
+from django.db.models.functions import Coalesce
+
+from wallet_app import fields
+from wallet_app.models import ArchivedTotal, Wallet
+
+AMOUNT_FIELD = DecimalField(max_digits=28, decimal_places=8)
+
+
+def archived(column, output_field):
+    """Per-wallet total of ``column`` over the archived partitions."""
+    totals = (
+        ArchivedTotal.objects.filter(wallet=OuterRef("pk"))
+        .values("wallet")
+        .annotate(total=Sum(column))
+        .values("total")
+    )
+    return Coalesce(Subquery(totals), Value(0), output_field=output_field)
+
+
+def ledger_sum():
+    """Sum of the live transactions plus the archived totals."""
+    live = fields.numeric(Sum("transactions__amount"), AMOUNT_FIELD)
+    return Coalesce(live, Value(0), output_field=AMOUNT_FIELD) + archived(
+        "amount", AMOUNT_FIELD
+    )
+
+
+def fix_wallet(wallet_id):
+    """
+    Recompute one wallet's balance and transaction count from its ledger
+    under the wallet lock. Returns ``False`` if the wallet was deleted in
+    the meantime.
+    """
+    with transaction.atomic():
+        wallet = (
+            Wallet.objects.select_for_update()
+            .filter(id=wallet_id, deleted_at=None)
+            .first()
+        )
+        if wallet is None:
+            return False
+        wallet.balance, wallet.transaction_count = (
+            Wallet.objects.filter(id=wallet_id)
+            .values("id")
+            .annotate(ledger=ledger_sum(), live=Count("transactions"))
+            .values_list("ledger", "live")
+            .get()
+        )
+        wallet.save(update_fields=["balance", "transaction_count", "updated_at"])
+    return True
+
+
+def check_range(start, stop, fix=False, chunk_size=2000):
+    """
+    Compare ``balance`` with ``SUM(amount)`` for wallets with ids in
+    ``[start, stop)``, counting the totals of archived partitions in, and
+    ``transaction_count`` with the number of live transactions.
+
+    Sums are computed by the database and streamed back through a
+    server-side cursor. Wallets scheduled for deletion are skipped: the
+    purge removes their ledger chunk by chunk, leaving partial sums. Returns
+    ``(mismatches, wallets, transactions)``.
+    """
+    rows = (
+        Wallet.objects.filter(id__gte=start, id__lt=stop, deleted_at=None)
+        .annotate(
+            ledger=ledger_sum(),
+            live=Count("transactions"),
+            archived_count=archived("count", BigIntegerField()),
+        )
+        .order_by("id")
+        .values_list(
+            "id", "balance", "ledger", "transaction_count", "live", "archived_count"
+        )
+    )
+    mismatches = []
+    wallets = transactions = 0
+    for wallet_id, balance, ledger, count, live, archived_count in rows.iterator(
+        chunk_size=chunk_size
+    ):
+        wallets += 1
+        transactions += live + archived_count
+        if balance == ledger and count == live:
+            continue
+        mismatch = {
+            "wallet": wallet_id,
+            "balance": str(balance),
+            "ledger": str(ledger),
+            "difference": str(balance - ledger),
+        }
+        if count != live:
+            mismatch["transaction_count"] = count
+            mismatch["transactions"] = live
+        if fix:
+            try:
+                mismatch["fixed"] = fix_wallet(wallet_id)
+            except IntegrityError:
+                # the ledger itself sums to a negative balance
+                mismatch["fixed"] = False
+        mismatches.append(mismatch)
+    return mismatches, wallets, transactions
+
+
+def _check_range_star(args):
+    return check_range(*args)
+
+
+class Command(BaseCommand):
+    help = (
+        "Check every wallet balance and transaction count against its "
+        "transactions and print mismatches as NDJSON."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            "--fix",
+            action="store_true",
+            help="Reset mismatched balances to the sum of their transactions.",
+        )
+        parser.add_argument(
+            "--workers",
+            type=int,
+            default=os.cpu_count(),
+            help="Number of worker processes (1 runs in-process).",
+        )
+        parser.add_argument(
+            "--range-size",
+            type=int,
+            default=10000,
+            help="Width of the wallet id range handed to a worker at a time.",
+        )
+
+    def handle(self, *args, fix, workers, range_size, **options):
+        bounds = Wallet.objects.aggregate(lo=Min("id"), hi=Max("id"))
+        if bounds["lo"] is None:
+            self.stderr.write("No wallets to reconcile")
+            return
+        ranges = [
+            (start, start + range_size, fix)
+            for start in range(bounds["lo"], bounds["hi"] + 1, range_size)
+        ]
+
+        started = time.perf_counter()
+        mismatched = wallets = transactions = 0
+        for mismatches, range_wallets, range_transactions in self.run(ranges, workers):
+            for mismatch in mismatches:
+                self.stdout.write(json.dumps(mismatch))
+            mismatched += len(mismatches)
+            wallets += range_wallets
+            transactions += range_transactions
+        elapsed = max(time.perf_counter() - started, 1e-6)
+
+        self.stderr.write(
+            f"Checked {wallets} wallets and {transactions} transactions in "
+            f"{elapsed:.1f}s ({transactions / elapsed:.0f} rows/s), "
+            f"{mismatched} mismatches"
+        )
+
+    def run(self, ranges, workers):
+        if workers <= 1:
+            yield from map(_check_range_star, ranges)
+            return
+        # forked workers must open their own connections
+        connections.close_all()
+        with ProcessPoolExecutor(
+            max_workers=workers, mp_context=multiprocessing.get_context("fork")
+        ) as executor:
+            yield from executor.map(_check_range_star, ranges)
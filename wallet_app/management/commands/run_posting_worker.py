@@ -0,0 +1,48 @@
+import time
+
+from django.core.management.base import BaseCommand
+
+from wallet_app import outbox
+
+
+class Command(BaseCommand):
+    help = (
+        "Apply the postings queued in the outbox (WALLET_POSTING_QUEUE=1). "
+        "Run as many workers as needed; they never claim the same posting."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            "--batch-size",
+            type=int,
+            default=500,
+            help="Maximum number of postings applied per database transaction.",
+        )
+        parser.add_argument(
+            "--poll-interval",
+            type=float,
+            default=0.2,
+            help="Seconds to wait when there is nothing to claim.",
+        )
+        parser.add_argument(
+            "--once",
+            action="store_true",
+            help="Exit as soon as there is nothing left to claim.",
+        )
+
+    def handle(self, *args, batch_size, poll_interval, once, **options):
+        processed = 0
+        try:
+            while True:
+                count = outbox.process(batch_size)
+                processed += count
+                if count:
+                    if options["verbosity"] > 1:
+                        self.stderr.write(f"Applied {count} postings")
+                    continue
+                if once:
+                    break
+                time.sleep(poll_interval)
+        except KeyboardInterrupt:
+            pass
+        self.stderr.write(f"Processed {processed} postings")
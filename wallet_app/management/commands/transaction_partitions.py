@@ -0,0 +1,129 @@
+from django.core.management.base import BaseCommand, CommandError
+from django.db import connection, transaction
+from django.utils import timezone
+
+from wallet_app import fields, partitions
+from wallet_app.models import ArchivedTotal, Wallet
+
+
+class Command(BaseCommand):
+    help = (
+        "Create the monthly transaction partitions ahead of time and detach, "
+        "archive or drop the ones older than the retention period."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            "--ahead",
+            type=int,
+            default=3,
+            help="Number of months after the current one to create partitions for.",
+        )
+        parser.add_argument(
+            "--retain-months",
+            type=int,
+            help="Detach partitions of months that ended more than this many "
+            "months ago. Nothing is detached without it.",
+        )
+        parser.add_argument(
+            "--archive-schema",
+            default="archive",
+            help="Schema detached partitions are moved to.",
+        )
+        parser.add_argument(
+            "--drop",
+            action="store_true",
+            help="Drop detached partitions instead of archiving them.",
+        )
+        parser.add_argument(
+            "--dry-run",
+            action="store_true",
+            help="Print the statements without running them.",
+        )
+
+    def handle(
+        self, *args, ahead, retain_months, archive_schema, drop, dry_run, **options
+    ):
+        if ahead < 0 or (retain_months is not None and retain_months < 1):
+            raise CommandError("--ahead must be >= 0 and --retain-months >= 1")
+        self.dry_run = dry_run
+        current = partitions.month_start(timezone.now())
+        with connection.cursor() as cursor:
+            existing = partitions.list_partitions(cursor)
+        attached = set(existing.values())
+
+        for month in partitions.months(current, partitions.add_months(current, ahead)):
+            if month not in attached:
+                self.create_partition(month)
+
+        if retain_months is None:
+            return
+        cutoff = partitions.add_months(current, -retain_months)
+        for name, month in sorted(existing.items(), key=lambda item: item[1]):
+            if month < cutoff:
+                self.archive_partition(name, archive_schema, drop)
+
+    def execute_sql(self, sql, params=None):
+        self.stdout.write(sql if params is None else f"{sql} -- {params}")
+        if not self.dry_run:
+            with connection.cursor() as cursor:
+                cursor.execute(sql, params)
+
+    @transaction.atomic
+    def create_partition(self, month):
+        """
+        Attach the partition for ``month``.
+
+        Postgres refuses to attach a partition while the default partition
+        holds rows in its range, so those are moved over with it.
+        """
+        name = partitions.partition_name(month)
+        lower, upper = partitions.bounds(month)
+        stash = f"{name}_rows"
+        self.execute_sql(
+            f"CREATE TEMPORARY TABLE {stash} (LIKE {partitions.TABLE}) ON COMMIT DROP"
+        )
+        self.execute_sql(
+            f"WITH moved AS (DELETE FROM {partitions.DEFAULT_PARTITION} "
+            "WHERE created_at >= %s AND created_at < %s RETURNING *) "
+            f"INSERT INTO {stash} SELECT * FROM moved",
+            [lower, upper],
+        )
+        self.execute_sql(partitions.create_partition_sql(month))
+        self.execute_sql(f"INSERT INTO {partitions.TABLE} SELECT * FROM {stash}")
+
+    @transaction.atomic
+    def archive_partition(self, name, archive_schema, drop):
+        """
+        Detach partition ``name`` and keep its per-wallet totals in
+        ``ArchivedTotal`` so balances still reconcile without its rows.
+        The wallets' transaction counts drop by the rows detached. A month
+        archived again, e.g. after its partition was recreated to take rows
+        out of the default partition, adds to the totals it already has.
+
+        The detach is a plain one: ``DETACH ... CONCURRENTLY`` is not
+        allowed while the table has a default partition.
+        """
+        # Wallet.transaction_count only counts attached rows
+        self.execute_sql(
+            "WITH detached AS ("
+            f"SELECT wallet_id, {fields.numeric_sql('sum(amount)')} AS amount, "
+            f"count(*) AS count FROM {name} GROUP BY wallet_id"
+            "), archived AS ("
+            f"INSERT INTO {ArchivedTotal._meta.db_table} AS a "
+            "(wallet_id, partition, amount, count) "
+            "SELECT wallet_id, %s, amount, count FROM detached "
+            "ON CONFLICT (wallet_id, partition) DO UPDATE "
+            "SET amount = a.amount + EXCLUDED.amount, count = a.count + EXCLUDED.count"
+            ") "
+            f"UPDATE {Wallet._meta.db_table} w "
+            "SET transaction_count = w.transaction_count - d.count "
+            "FROM detached d WHERE d.wallet_id = w.id",
+            [name],
+        )
+        self.execute_sql(f"ALTER TABLE {partitions.TABLE} DETACH PARTITION {name}")
+        if drop:
+            self.execute_sql(f"DROP TABLE {name}")
+        else:
+            self.execute_sql(f"CREATE SCHEMA IF NOT EXISTS {archive_schema}")
+            self.execute_sql(f"ALTER TABLE {name} SET SCHEMA {archive_schema}")
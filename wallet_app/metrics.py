@@ -0,0 +1,259 @@
+"""
+Per-request performance metrics in the Prometheus text format.
+
+``middleware.metrics_middleware`` opens a ``RequestMetrics`` record for each
+request; the database execute wrapper, ``lock_wait()`` and
+``count_insufficient_balance()`` add to it, and when the response is ready
+it is folded into the per-route histograms and counters below, which
+``metrics_view`` serves at ``/metrics``. Values are kept per process.
+
+With ``WALLET_METRICS`` off the middleware and the execute wrapper are not
+installed and the helpers return after one context variable lookup.
+"""
+
+import threading
+import time
+from bisect import bisect_left
+from contextlib import contextmanager
+from contextvars import ContextVar
+
+from django.conf import settings
+from django.db import connections
+from django.db.backends.signals import connection_created
+from django.http import Http404, HttpResponse
+
+from wallet_app.caching import wallet_cache
+
+CONTENT_TYPE = "text/plain; version=0.0.4; charset=utf-8"
+
+LATENCY_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10)
+QUERY_COUNT_BUCKETS = (0, 1, 2, 3, 5, 8, 13, 21, 34, 55, 100)
+
+
+def _escape(value):
+    return str(value).replace("\\", r"\\").replace("\n", r"\n").replace('"', r"\"")
+
+
+def _labels(names, values, extra=()):
+    pairs = [*zip(names, values), *extra]
+    if not pairs:
+        return ""
+    return "{" + ",".join(f'{name}="{_escape(value)}"' for name, value in pairs) + "}"
+
+
+def _number(value):
+    return repr(float(value)) if isinstance(value, float) else str(value)
+
+
+class Counter:
+    def __init__(self, name, documentation, labelnames=()):
+        self.name = name
+        self.documentation = documentation
+        self.labelnames = labelnames
+        self._values = {}
+        self._lock = threading.Lock()
+
+    def inc(self, labels=(), amount=1):
+        with self._lock:
+            self._values[labels] = self._values.get(labels, 0) + amount
+
+    def clear(self):
+        with self._lock:
+            self._values.clear()
+
+    def samples(self):
+        with self._lock:
+            values = dict(self._values)
+        for labels, value in sorted(values.items()):
+            yield f"{self.name}{_labels(self.labelnames, labels)} {_number(value)}"
+
+    def render(self):
+        return [
+            f"# HELP {self.name} {self.documentation}",
+            f"# TYPE {self.name} counter",
+            *self.samples(),
+        ]
+
+
+class Histogram:
+    def __init__(self, name, documentation, labelnames=(), buckets=LATENCY_BUCKETS):
+        self.name = name
+        self.documentation = documentation
+        self.labelnames = labelnames
+        self.buckets = tuple(buckets)
+        self._values = {}  # labels -> [per-bucket counts..., +Inf count, sum]
+        self._lock = threading.Lock()
+
+    def observe(self, labels, value):
+        index = bisect_left(self.buckets, value)
+        with self._lock:
+            counts = self._values.get(labels)
+            if counts is None:
+                counts = self._values[labels] = [0] * (len(self.buckets) + 2)
+            counts[index] += 1
+            counts[-1] += value
+
+    def clear(self):
+        with self._lock:
+            self._values.clear()
+
+    def render(self):
+        lines = [
+            f"# HELP {self.name} {self.documentation}",
+            f"# TYPE {self.name} histogram",
+        ]
+        with self._lock:
+            values = {labels: list(counts) for labels, counts in self._values.items()}
+        for labels, counts in sorted(values.items()):
+            cumulative = 0
+            for bound, count in zip((*self.buckets, "+Inf"), counts):
+                cumulative += count
+                le = (("le", bound if bound == "+Inf" else _number(float(bound))),)
+                lines.append(
+                    f"{self.name}_bucket{_labels(self.labelnames, labels, le)} "
+                    f"{cumulative}"
+                )
+            label_text = _labels(self.labelnames, labels)
+            lines.append(f"{self.name}_sum{label_text} {_number(counts[-1])}")
+            lines.append(f"{self.name}_count{label_text} {cumulative}")
+        return lines
+
+
+REQUEST_SECONDS = Histogram(
+    "wallet_http_request_duration_seconds",
+    "Request latency by route.",
+    ("route", "method", "status"),
+)
+RENDER_SECONDS = Histogram(
+    "wallet_http_render_duration_seconds",
+    "Time spent rendering the response body by route.",
+    ("route",),
+)
+QUERIES_PER_REQUEST = Histogram(
+    "wallet_db_queries_per_request",
+    "SQL statements executed per request by route.",
+    ("route",),
+    buckets=QUERY_COUNT_BUCKETS,
+)
+QUERY_SECONDS = Counter(
+    "wallet_db_query_seconds_total",
+    "Time spent executing SQL by route.",
+    ("route",),
+)
+LOCK_WAIT_SECONDS = Histogram(
+    "wallet_lock_wait_seconds",
+    "Time spent acquiring wallet row locks by route.",
+    ("route",),
+    buckets=(0.001, *LATENCY_BUCKETS),
+)
+INSUFFICIENT_BALANCE = Counter(
+    "wallet_insufficient_balance_total",
+    "Postings rejected for insufficient balance by route.",
+    ("route",),
+)
+REGISTRY = [
+    REQUEST_SECONDS,
+    RENDER_SECONDS,
+    QUERIES_PER_REQUEST,
+    QUERY_SECONDS,
+    LOCK_WAIT_SECONDS,
+    INSUFFICIENT_BALANCE,
+]
+
+
+class RequestMetrics:
+    __slots__ = ("queries", "query_seconds", "lock_waits", "render_seconds", "rejected")
+
+    def __init__(self):
+        self.queries = 0
+        self.query_seconds = 0.0
+        self.lock_waits = []
+        self.render_seconds = None
+        self.rejected = 0
+
+    def record(self, route, method, status, seconds):
+        labels = (route,)
+        REQUEST_SECONDS.observe((route, method, str(status)), seconds)
+        QUERIES_PER_REQUEST.observe(labels, self.queries)
+        if self.queries:
+            QUERY_SECONDS.inc(labels, self.query_seconds)
+        if self.render_seconds is not None:
+            RENDER_SECONDS.observe(labels, self.render_seconds)
+        for wait in self.lock_waits:
+            LOCK_WAIT_SECONDS.observe(labels, wait)
+        if self.rejected:
+            INSUFFICIENT_BALANCE.inc(labels, self.rejected)
+
+
+current = ContextVar("request_metrics", default=None)
+
+
+@contextmanager
+def lock_wait():
+    """Time a statement that takes wallet row locks."""
+    metrics = current.get()
+    if metrics is None:
+        yield
+        return
+    started = time.perf_counter()
+    try:
+        yield
+    finally:
+        metrics.lock_waits.append(time.perf_counter() - started)
+
+
+def count_insufficient_balance(count=1):
+    metrics = current.get()
+    if metrics is not None:
+        metrics.rejected += count
+
+
+def record_render(seconds):
+    metrics = current.get()
+    if metrics is not None:
+        metrics.render_seconds = (metrics.render_seconds or 0) + seconds
+
+
+def execute_wrapper(execute, sql, params, many, context):
+    metrics = current.get()
+    if metrics is None:
+        return execute(sql, params, many, context)
+    started = time.perf_counter()
+    try:
+        return execute(sql, params, many, context)
+    finally:
+        metrics.queries += 1
+        metrics.query_seconds += time.perf_counter() - started
+
+
+def install_execute_wrapper(connection, **kwargs):
+    if execute_wrapper not in connection.execute_wrappers:
+        connection.execute_wrappers.append(execute_wrapper)
+
+
+def install():
+    """Wrap this thread's connections and every connection opened later."""
+    for connection in connections.all():
+        install_execute_wrapper(connection)
+    connection_created.connect(install_execute_wrapper, dispatch_uid=__name__)
+
+
+def reset():
+    for metric in REGISTRY:
+        metric.clear()
+
+
+def render():
+    lines = []
+    for metric in REGISTRY:
+        lines.extend(metric.render())
+    for name, value in wallet_cache.stats().items():
+        lines.append(f"# TYPE wallet_cache_{name}_total counter")
+        lines.append(f"wallet_cache_{name}_total {value}")
+    return "\n".join(lines) + "\n"
+
+
+def metrics_view(request):
+    if not settings.WALLET_METRICS:
+        raise Http404
+    return HttpResponse(render(), content_type=CONTENT_TYPE)
@@ -0,0 +1,109 @@
+import time
+
+from asgiref.sync import iscoroutinefunction
+from django.conf import settings
+from django.core.exceptions import MiddlewareNotUsed
+from django.utils.decorators import sync_and_async_middleware
+
+from wallet_app import metrics
+from wallet_app.routers import replica_reads
+
+SAFE_METHODS = ("GET", "HEAD", "OPTIONS")
+PIN_COOKIE = "wallet_primary_pin"
+
+
+@sync_and_async_middleware
+def replica_routing_middleware(get_response):
+    """
+    Let safe requests read from the replica, except for clients that wrote
+    recently.
+
+    Any unsafe request sets a short-lived cookie; while it is present the
+    client's reads stay on the primary, so it sees its own writes even when
+    the replica lags behind.
+    """
+
+    def before(request):
+        return replica_reads.set(
+            request.method in SAFE_METHODS and PIN_COOKIE not in request.COOKIES
+        )
+
+    def after(request, response):
+        if request.method not in SAFE_METHODS:
+            response.set_cookie(
+                PIN_COOKIE,
+                "1",
+                max_age=settings.WALLET_REPLICA_PIN_SECONDS,
+                httponly=True,
+                samesite="Lax",
+            )
+        return response
+
+    if iscoroutinefunction(get_response):
+
+        async def middleware(request):
+            token = before(request)
+            try:
+                response = await get_response(request)
+            finally:
+                replica_reads.reset(token)
+            return after(request, response)
+
+    else:
+
+        def middleware(request):
+            token = before(request)
+            try:
+                response = get_response(request)
+            finally:
+                replica_reads.reset(token)
+            return after(request, response)
+
+    return middleware
+
+
+@sync_and_async_middleware
+def metrics_middleware(get_response):
+    """
+    Record latency, SQL, lock wait and rejection metrics per route, see
+    ``wallet_app.metrics``. Not installed unless ``WALLET_METRICS`` is on.
+    """
+    if not settings.WALLET_METRICS:
+        raise MiddlewareNotUsed
+    metrics.install()
+
+    def record(request, response, request_metrics, started):
+        match = request.resolver_match
+        request_metrics.record(
+            (match.url_name or match.view_name) if match else "unmatched",
+            request.method,
+            response.status_code,
+            time.perf_counter() - started,
+        )
+        return response
+
+    if iscoroutinefunction(get_response):
+
+        async def middleware(request):
+            request_metrics = metrics.RequestMetrics()
+            token = metrics.current.set(request_metrics)
+            started = time.perf_counter()
+            try:
+                response = await get_response(request)
+            finally:
+                metrics.current.reset(token)
+            return record(request, response, request_metrics, started)
+
+    else:
+
+        def middleware(request):
+            request_metrics = metrics.RequestMetrics()
+            token = metrics.current.set(request_metrics)
+            started = time.perf_counter()
+            try:
+                response = get_response(request)
+            finally:
+                metrics.current.reset(token)
+            return record(request, response, request_metrics, started)
+
+    return middleware
@@ -0,0 +1,76 @@
+# Generated by Django 5.2.18 on 2026-10-18 15:04
+
+import django.contrib.postgres.indexes
+import django.contrib.postgres.operations
+import django.db.models.deletion
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+    # indexes are built CONCURRENTLY so postings keep flowing on big tables
+    atomic = False
+
+    dependencies = [
+        ("wallet_app", "0002_alter_wallet_balance_transaction"),
+    ]
+
+    operations = [
+        django.contrib.postgres.operations.AddIndexConcurrently(
+            model_name="transaction",
+            index=django.contrib.postgres.indexes.BTreeIndex(
+                fields=["wallet", "-created_at", "-id"], name="tx_wallet_created_id_idx"
+            ),
+        ),
+        django.contrib.postgres.operations.AddIndexConcurrently(
+            model_name="transaction",
+            index=django.contrib.postgres.indexes.BTreeIndex(
+                fields=["created_at", "id"], name="tx_created_id_idx"
+            ),
+        ),
+        django.contrib.postgres.operations.AddIndexConcurrently(
+            model_name="transaction",
+            index=django.contrib.postgres.indexes.BTreeIndex(
+                fields=["amount"], name="tx_amount_idx"
+            ),
+        ),
+        django.contrib.postgres.operations.AddIndexConcurrently(
+            model_name="wallet",
+            index=django.contrib.postgres.indexes.BTreeIndex(
+                fields=["created_at", "id"], name="wallet_created_id_idx"
+            ),
+        ),
+        django.contrib.postgres.operations.AddIndexConcurrently(
+            model_name="wallet",
+            index=django.contrib.postgres.indexes.BTreeIndex(
+                fields=["balance"], name="wallet_balance_idx"
+            ),
+        ),
+        django.contrib.postgres.operations.AddIndexConcurrently(
+            model_name="wallet",
+            index=django.contrib.postgres.indexes.BTreeIndex(
+                fields=["label"], name="wallet_label_idx"
+            ),
+        ),
+        django.contrib.postgres.operations.RemoveIndexConcurrently(
+            model_name="transaction",
+            name="wallet_app__txid_9b4da0_btree",
+        ),
+        django.contrib.postgres.operations.RemoveIndexConcurrently(
+            model_name="transaction",
+            name="wallet_app__wallet__7231fe_btree",
+        ),
+        django.contrib.postgres.operations.RemoveIndexConcurrently(
+            model_name="transaction",
+            name="wallet_app__created_606f1c_btree",
+        ),
+        migrations.AlterField(
+            model_name="transaction",
+            name="wallet",
+            field=models.ForeignKey(
+                db_index=False,
+                on_delete=django.db.models.deletion.CASCADE,
+                related_name="transactions",
+                to="wallet_app.wallet",
+            ),
+        ),
+    ]
@@ -0,0 +1,28 @@
+# Generated by Django 5.2.18 on 2026-10-18 15:06
+
+import django.contrib.postgres.indexes
+import django.contrib.postgres.operations
+import django.db.models.functions.text
+from django.db import migrations
+
+
+class Migration(migrations.Migration):
+    # the index is built CONCURRENTLY so the wallets table stays writable
+    atomic = False
+
+    dependencies = [
+        ("wallet_app", "0003_rework_indexes"),
+    ]
+
+    operations = [
+        django.contrib.postgres.operations.TrigramExtension(),
+        django.contrib.postgres.operations.AddIndexConcurrently(
+            model_name="wallet",
+            index=django.contrib.postgres.indexes.GinIndex(
+                django.contrib.postgres.indexes.OpClass(
+                    django.db.models.functions.text.Upper("label"), name="gin_trgm_ops"
+                ),
+                name="wallet_label_trgm_idx",
+            ),
+        ),
+    ]
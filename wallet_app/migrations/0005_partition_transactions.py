@@ -0,0 +1,212 @@
+# Generated by Django 5.2.18 on 2026-10-18 15:17
+
+import uuid
+
+import django.contrib.postgres.indexes
+import django.db.models.deletion
+from django.db import migrations, models
+from django.utils import timezone
+
+from wallet_app import partitions
+
+TABLE = partitions.TABLE
+STASH = f"{TABLE}_stash"
+PARTITIONS_AHEAD = 3
+
+COLUMNS = "id, wallet_id, txid, amount, created_at"
+INDEXES = [
+    f"CREATE INDEX tx_wallet_created_id_idx ON {TABLE} "
+    "USING btree (wallet_id, created_at DESC, id DESC)",
+    f"CREATE INDEX tx_created_id_idx ON {TABLE} USING btree (created_at, id)",
+    f"CREATE INDEX tx_amount_idx ON {TABLE} USING btree (amount)",
+    f"CREATE INDEX tx_txid_idx ON {TABLE} USING btree (txid)",
+]
+
+SYNC_TXIDS = f"""
+CREATE FUNCTION {TABLE}_sync_txid() RETURNS trigger LANGUAGE plpgsql AS $$
+BEGIN
+    IF TG_OP IN ('UPDATE', 'DELETE') THEN
+        DELETE FROM {partitions.TXID_REGISTRY} WHERE txid = OLD.txid;
+    END IF;
+    IF TG_OP IN ('INSERT', 'UPDATE') THEN
+        INSERT INTO {partitions.TXID_REGISTRY} (txid, transaction_id, created_at)
+        VALUES (NEW.txid, NEW.id, NEW.created_at);
+    END IF;
+    RETURN NULL;
+END
+$$;
+CREATE TRIGGER {TABLE}_sync_txid
+AFTER INSERT OR DELETE OR UPDATE OF txid, id, created_at ON {TABLE}
+FOR EACH ROW EXECUTE FUNCTION {TABLE}_sync_txid();
+"""
+
+
+def foreign_keys(cursor):
+    cursor.execute(
+        "SELECT conname, pg_get_constraintdef(oid) FROM pg_constraint "
+        "WHERE conrelid = %s::regclass AND contype = 'f'",
+        [TABLE],
+    )
+    return cursor.fetchall()
+
+
+def rebuild(schema_editor, create_table, after_copy):
+    """
+    Move the rows into a new ``TABLE`` created by ``create_table`` and
+    recreate the foreign keys and indexes on it.
+    """
+    execute = schema_editor.execute
+    with schema_editor.connection.cursor() as cursor:
+        keys = foreign_keys(cursor)
+    execute(f"ALTER TABLE {TABLE} RENAME TO {STASH}", None)
+    for statement in create_table():
+        execute(statement, None)
+    execute(f"INSERT INTO {TABLE} ({COLUMNS}) SELECT {COLUMNS} FROM {STASH}", None)
+    for statement in after_copy:
+        execute(statement, None)
+    execute(f"DROP TABLE {STASH}", None)
+    for name, definition in keys:
+        execute(f"ALTER TABLE {TABLE} ADD CONSTRAINT {name} {definition}", None)
+    for statement in INDEXES:
+        execute(statement, None)
+
+
+def partition_transactions(apps, schema_editor):
+    with schema_editor.connection.cursor() as cursor:
+        cursor.execute(f"SELECT min(created_at), max(created_at) FROM {TABLE}")
+        oldest, newest = cursor.fetchone()
+    now = timezone.now()
+    first = min(oldest or now, now)
+    last = partitions.add_months(
+        partitions.month_start(max(newest or now, now)), PARTITIONS_AHEAD
+    )
+
+    def create_table():
+        yield (
+            f"CREATE TABLE {TABLE} ("
+            "id bigint NOT NULL, "
+            "txid varchar(255) NOT NULL, "
+            "amount numeric(18, 8) NOT NULL, "
+            "created_at timestamp with time zone NOT NULL "
+            "DEFAULT STATEMENT_TIMESTAMP(), "
+            "wallet_id bigint NOT NULL, "
+            "PRIMARY KEY (id, created_at)"
+            ") PARTITION BY RANGE (created_at)"
+        )
+        for month in partitions.months(first, last):
+            yield partitions.create_partition_sql(month)
+        yield f"CREATE TABLE {partitions.DEFAULT_PARTITION} PARTITION OF {TABLE} DEFAULT"
+
+    rebuild(
+        schema_editor,
+        create_table,
+        after_copy=[
+            f"INSERT INTO {partitions.TXID_REGISTRY} (txid, transaction_id, created_at) "
+            f"SELECT txid, id, created_at FROM {TABLE}",
+        ],
+    )
+    # the identity sequence went with the old table
+    schema_editor.execute(
+        f"CREATE SEQUENCE {TABLE}_id_seq OWNED BY {TABLE}.id; "
+        f"SELECT setval('{TABLE}_id_seq', coalesce(max(id), 0) + 1, false) FROM {TABLE}; "
+        f"ALTER TABLE {TABLE} ALTER COLUMN id SET DEFAULT nextval('{TABLE}_id_seq')",
+        None,
+    )
+    schema_editor.execute(SYNC_TXIDS, None)
+
+
+def unpartition_transactions(apps, schema_editor):
+    schema_editor.execute(f"DROP FUNCTION {TABLE}_sync_txid() CASCADE", None)
+
+    def create_table():
+        yield (
+            f"CREATE TABLE {TABLE} ("
+            "id bigint NOT NULL GENERATED BY DEFAULT AS IDENTITY PRIMARY KEY, "
+            "txid varchar(255) NOT NULL UNIQUE, "
+            "amount numeric(18, 8) NOT NULL, "
+            "created_at timestamp with time zone NOT NULL "
+            "DEFAULT STATEMENT_TIMESTAMP(), "
+            "wallet_id bigint NOT NULL"
+            ")"
+        )
+
+    rebuild(schema_editor, create_table, after_copy=[])
+    schema_editor.execute(
+        f"SELECT setval(pg_get_serial_sequence('{TABLE}', 'id'), coalesce(max(id), 0) + 1, "
+        f"false) FROM {TABLE}",
+        None,
+    )
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ("wallet_app", "0004_label_trigram_index"),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name="ArchivedTotal",
+            fields=[
+                (
+                    "id",
+                    models.BigAutoField(
+                        auto_created=True,
+                        primary_key=True,
+                        serialize=False,
+                        verbose_name="ID",
+                    ),
+                ),
+                ("partition", models.CharField(max_length=63)),
+                ("amount", models.DecimalField(decimal_places=8, max_digits=28)),
+                ("count", models.BigIntegerField()),
+            ],
+        ),
+        migrations.CreateModel(
+            name="TransactionTxid",
+            fields=[
+                (
+                    "txid",
+                    models.CharField(max_length=255, primary_key=True, serialize=False),
+                ),
+                ("transaction_id", models.BigIntegerField()),
+                ("created_at", models.DateTimeField()),
+            ],
+        ),
+        migrations.SeparateDatabaseAndState(
+            # the unique constraint on txid gives way to TransactionTxid and
+            # the table is rebuilt partitioned, with tx_txid_idx among its
+            # indexes
+            database_operations=[
+                migrations.RunPython(partition_transactions, unpartition_transactions),
+            ],
+            state_operations=[
+                migrations.AlterField(
+                    model_name="transaction",
+                    name="txid",
+                    field=models.CharField(default=uuid.uuid4, max_length=255),
+                ),
+                migrations.AddIndex(
+                    model_name="transaction",
+                    index=django.contrib.postgres.indexes.BTreeIndex(
+                        fields=["txid"], name="tx_txid_idx"
+                    ),
+                ),
+            ],
+        ),
+        migrations.AddField(
+            model_name="archivedtotal",
+            name="wallet",
+            field=models.ForeignKey(
+                on_delete=django.db.models.deletion.CASCADE,
+                related_name="archived_totals",
+                to="wallet_app.wallet",
+            ),
+        ),
+        migrations.AddConstraint(
+            model_name="archivedtotal",
+            constraint=models.UniqueConstraint(
+                fields=("wallet", "partition"), name="archived_total_wallet_partition"
+            ),
+        ),
+    ]
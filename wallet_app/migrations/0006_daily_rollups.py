@@ -0,0 +1,54 @@
+# Generated by Django 5.2.18 on 2026-10-18 15:22
+
+import django.db.models.deletion
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ("wallet_app", "0005_partition_transactions"),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name="DailyRollup",
+            fields=[
+                (
+                    "id",
+                    models.BigAutoField(
+                        auto_created=True,
+                        primary_key=True,
+                        serialize=False,
+                        verbose_name="ID",
+                    ),
+                ),
+                ("day", models.DateField()),
+                (
+                    "inflow",
+                    models.DecimalField(decimal_places=8, default=0, max_digits=28),
+                ),
+                (
+                    "outflow",
+                    models.DecimalField(decimal_places=8, default=0, max_digits=28),
+                ),
+                ("count", models.BigIntegerField(default=0)),
+                (
+                    "wallet",
+                    models.ForeignKey(
+                        db_index=False,
+                        on_delete=django.db.models.deletion.CASCADE,
+                        related_name="daily_rollups",
+                        to="wallet_app.wallet",
+                    ),
+                ),
+            ],
+            options={
+                "constraints": [
+                    models.UniqueConstraint(
+                        fields=("wallet", "day"), name="daily_rollup_wallet_day"
+                    )
+                ],
+            },
+        ),
+    ]
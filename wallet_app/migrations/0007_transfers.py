@@ -0,0 +1,60 @@
+# Generated by Django 5.2.18 on 2026-10-18 15:24
+
+import uuid
+
+import django.db.models.deletion
+import django.db.models.functions.datetime
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ("wallet_app", "0006_daily_rollups"),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name="Transfer",
+            fields=[
+                (
+                    "id",
+                    models.BigAutoField(
+                        auto_created=True,
+                        primary_key=True,
+                        serialize=False,
+                        verbose_name="ID",
+                    ),
+                ),
+                (
+                    "txid",
+                    models.CharField(default=uuid.uuid4, max_length=248, unique=True),
+                ),
+                ("amount", models.DecimalField(decimal_places=8, max_digits=18)),
+                ("debit_id", models.BigIntegerField()),
+                ("credit_id", models.BigIntegerField()),
+                (
+                    "created_at",
+                    models.DateTimeField(
+                        db_default=django.db.models.functions.datetime.Now()
+                    ),
+                ),
+                (
+                    "destination",
+                    models.ForeignKey(
+                        on_delete=django.db.models.deletion.CASCADE,
+                        related_name="transfers_in",
+                        to="wallet_app.wallet",
+                    ),
+                ),
+                (
+                    "source",
+                    models.ForeignKey(
+                        on_delete=django.db.models.deletion.CASCADE,
+                        related_name="transfers_out",
+                        to="wallet_app.wallet",
+                    ),
+                ),
+            ],
+        ),
+    ]
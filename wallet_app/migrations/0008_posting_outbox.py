@@ -0,0 +1,62 @@
+# Generated by Django 5.2.18 on 2026-10-18 15:25
+
+import django.contrib.postgres.indexes
+import django.db.models.functions.datetime
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ("wallet_app", "0007_transfers"),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name="QueuedPosting",
+            fields=[
+                (
+                    "id",
+                    models.BigAutoField(
+                        auto_created=True,
+                        primary_key=True,
+                        serialize=False,
+                        verbose_name="ID",
+                    ),
+                ),
+                ("txid", models.CharField(max_length=255, unique=True)),
+                ("wallet_id", models.BigIntegerField()),
+                ("amount", models.DecimalField(decimal_places=8, max_digits=18)),
+                (
+                    "status",
+                    models.CharField(
+                        choices=[
+                            ("pending", "pending"),
+                            ("accepted", "accepted"),
+                            ("rejected", "rejected"),
+                        ],
+                        default="pending",
+                        max_length=8,
+                    ),
+                ),
+                ("detail", models.CharField(blank=True, max_length=255)),
+                ("transaction_id", models.BigIntegerField(null=True)),
+                (
+                    "created_at",
+                    models.DateTimeField(
+                        db_default=django.db.models.functions.datetime.Now()
+                    ),
+                ),
+                ("processed_at", models.DateTimeField(null=True)),
+            ],
+            options={
+                "indexes": [
+                    django.contrib.postgres.indexes.BTreeIndex(
+                        condition=models.Q(("status", "pending")),
+                        fields=["id"],
+                        name="queued_posting_pending_idx",
+                    )
+                ],
+            },
+        ),
+    ]
@@ -0,0 +1,24 @@
+# Generated by Django 5.2.18 on 2026-10-18 15:29
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ("wallet_app", "0008_posting_outbox"),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name="wallet",
+            name="transaction_count",
+            field=models.BigIntegerField(db_default=0, default=0),
+        ),
+        migrations.RunSQL(
+            "UPDATE wallet_app_wallet w SET transaction_count = t.count "
+            "FROM (SELECT wallet_id, count(*) AS count FROM wallet_app_transaction "
+            "GROUP BY wallet_id) t WHERE t.wallet_id = w.id",
+            migrations.RunSQL.noop,
+        ),
+    ]
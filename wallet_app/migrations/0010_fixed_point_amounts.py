@@ -0,0 +1,62 @@
+# Generated by Django 5.2.18 on 2026-10-18 15:34
+
+from django.conf import settings
+from django.db import migrations
+
+import wallet_app.fields
+
+
+def to_configured_storage(apps, schema_editor):
+    # the field's column type follows settings.WALLET_FIXED_POINT, so a plain
+    # AlterField would cast NUMERIC values to BIGINT without scaling them
+    if settings.WALLET_FIXED_POINT:
+        wallet_app.fields.convert(schema_editor, fixed=True)
+
+
+def to_numeric(apps, schema_editor):
+    wallet_app.fields.convert(schema_editor, fixed=False)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ("wallet_app", "0009_wallet_transaction_count"),
+    ]
+
+    operations = [
+        migrations.SeparateDatabaseAndState(
+            state_operations=[
+                migrations.AlterField(
+                    model_name="queuedposting",
+                    name="amount",
+                    field=wallet_app.fields.FixedPointField(
+                        decimal_places=8, max_digits=18
+                    ),
+                ),
+                migrations.AlterField(
+                    model_name="transaction",
+                    name="amount",
+                    field=wallet_app.fields.FixedPointField(
+                        decimal_places=8, max_digits=18
+                    ),
+                ),
+                migrations.AlterField(
+                    model_name="transfer",
+                    name="amount",
+                    field=wallet_app.fields.FixedPointField(
+                        decimal_places=8, max_digits=18
+                    ),
+                ),
+                migrations.AlterField(
+                    model_name="wallet",
+                    name="balance",
+                    field=wallet_app.fields.FixedPointField(
+                        decimal_places=8, default=0, max_digits=18
+                    ),
+                ),
+            ],
+            database_operations=[
+                migrations.RunPython(to_configured_storage, to_numeric),
+            ],
+        ),
+    ]
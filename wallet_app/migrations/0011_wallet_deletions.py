@@ -0,0 +1,61 @@
+# Generated by Django 5.2.18 on 2026-10-18 15:37
+
+import django.contrib.postgres.indexes
+import django.db.models.functions.datetime
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ("wallet_app", "0010_fixed_point_amounts"),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name="wallet",
+            name="deleted_at",
+            field=models.DateTimeField(null=True),
+        ),
+        migrations.CreateModel(
+            name="WalletDeletion",
+            fields=[
+                (
+                    "id",
+                    models.BigAutoField(
+                        auto_created=True,
+                        primary_key=True,
+                        serialize=False,
+                        verbose_name="ID",
+                    ),
+                ),
+                ("wallet_id", models.BigIntegerField(unique=True)),
+                (
+                    "status",
+                    models.CharField(
+                        choices=[("pending", "pending"), ("done", "done")],
+                        default="pending",
+                        max_length=7,
+                    ),
+                ),
+                ("transactions", models.BigIntegerField()),
+                ("deleted", models.BigIntegerField(default=0)),
+                (
+                    "created_at",
+                    models.DateTimeField(
+                        db_default=django.db.models.functions.datetime.Now()
+                    ),
+                ),
+                ("finished_at", models.DateTimeField(null=True)),
+            ],
+            options={
+                "indexes": [
+                    django.contrib.postgres.indexes.BTreeIndex(
+                        condition=models.Q(("status", "pending")),
+                        fields=["id"],
+                        name="wallet_deletion_pending_idx",
+                    )
+                ],
+            },
+        ),
+    ]
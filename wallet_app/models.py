@@ -1,17 +1,57 @@
 import uuid
 
-from django.contrib.postgres.indexes import BTreeIndex
-from django.db import models, transaction
-from django.db.models.functions import Now
+from django.conf import settings
+from django.contrib.postgres.indexes import BTreeIndex, GinIndex, OpClass
+from django.core.exceptions import ObjectDoesNotExist
+from django.db import IntegrityError, connection, models, transaction
+from django.db.models import F
+from django.db.models.functions import Now, Upper
+from django.utils import timezone
+
+from wallet_app import events, metrics, rollups
+from wallet_app.caching import wallet_cache
+from wallet_app.fields import FixedPointField
 
 BALANCE_CONSTRAINT_NAME = "non_negative_balance"
+# violated by a txid that is only left in an archived partition
+TXID_REGISTRY_CONSTRAINT_NAME = "wallet_app_transactiontxid_pkey"
+
+# Transaction.save strategies, selected with settings.WALLET_POSTING_MODE
+POSTING_MODE_SELECT_FOR_UPDATE = "select_for_update"
+POSTING_MODE_ATOMIC_UPDATE = "atomic_update"
+
+
+class InsufficientBalanceError(IntegrityError):
+    """Raised when a posting would violate the non-negative balance constraint."""
+
+    def __init__(self, wallet_id):
+        super().__init__(
+            f"Posting to wallet {wallet_id} violates {BALANCE_CONSTRAINT_NAME}"
+        )
+
+
+class WalletNotFoundError(ObjectDoesNotExist):
+    """
+    Raised when a posting's wallet is gone or scheduled for deletion by the
+    time its row is locked.
+    """
+
+    def __init__(self, wallet_id):
+        super().__init__(f"Wallet {wallet_id} does not exist")
+        self.wallet_id = wallet_id
 
 
 class Wallet(models.Model):
     label = models.CharField(max_length=255)
-    balance = models.DecimalField(max_digits=18, decimal_places=8, default=0)
+    balance = FixedPointField(max_digits=18, decimal_places=8, default=0)
+    # number of the wallet's transactions in attached partitions, kept by
+    # every posting path; read by pagination.CountingPageNumberPagination
+    transaction_count = models.BigIntegerField(default=0, db_default=0)
     created_at = models.DateTimeField(db_default=Now())
     updated_at = models.DateTimeField(db_default=Now(), auto_now=True)
+    # set when a WalletDeletion is scheduled; the API no longer shows the
+    # wallet and postings to it are rejected
+    deleted_at = models.DateTimeField(null=True)
 
     class Meta:
         constraints = [
@@ -20,26 +60,257 @@ class Wallet(models.Model):
                 name=BALANCE_CONSTRAINT_NAME,
             )
         ]
+        # one per WalletViewSet ordering; `id` is served by the primary key
+        indexes = [
+            BTreeIndex(fields=["created_at", "id"], name="wallet_created_id_idx"),
+            BTreeIndex(fields=["balance"], name="wallet_balance_idx"),
+            BTreeIndex(fields=["label"], name="wallet_label_idx"),
+            # icontains compiles to UPPER(label) LIKE UPPER('%...%')
+            GinIndex(
+                OpClass(Upper("label"), name="gin_trgm_ops"),
+                name="wallet_label_trgm_idx",
+            ),
+        ]
+
+    def save(self, *args, **kwargs):
+        super().save(*args, **kwargs)
+        wallet_cache.invalidate(self.pk)
+
+    def delete(self, *args, **kwargs):
+        wallet_cache.invalidate(self.pk)
+        return super().delete(*args, **kwargs)
 
 
 class Transaction(models.Model):
     wallet = models.ForeignKey(
-        Wallet, on_delete=models.CASCADE, related_name="transactions"
+        Wallet, on_delete=models.CASCADE, related_name="transactions", db_index=False
     )
-    txid = models.CharField(max_length=255, unique=True, default=uuid.uuid4)
-    amount = models.DecimalField(max_digits=18, decimal_places=8)
+    # globally unique through TransactionTxid, see below
+    txid = models.CharField(max_length=255, default=uuid.uuid4)
+    amount = FixedPointField(max_digits=18, decimal_places=8)
     created_at = models.DateTimeField(db_default=Now())
 
     class Meta:
+        # The table is range partitioned by month on created_at (migration
+        # 0005, wallet_app.partitions) and its primary key is (id, created_at);
+        # the indexes below are partitioned along with it. The wallet index
+        # leads with wallet_id so it also backs the foreign key (hence no
+        # db_index on it), and matches the hottest list query: ?wallet=X
+        # ordered by -created_at.
         indexes = [
-            BTreeIndex(fields=["txid"]),
-            BTreeIndex(fields=["wallet"]),
-            BTreeIndex(fields=["created_at"]),
+            BTreeIndex(
+                fields=["wallet", "-created_at", "-id"], name="tx_wallet_created_id_idx"
+            ),
+            BTreeIndex(fields=["created_at", "id"], name="tx_created_id_idx"),
+            BTreeIndex(fields=["amount"], name="tx_amount_idx"),
+            BTreeIndex(fields=["txid"], name="tx_txid_idx"),
         ]
 
     def save(self, *args, **kwargs):
+        added = int(self._state.adding)
         with transaction.atomic():
-            wallet = Wallet.objects.select_for_update().get(id=self.wallet_id)
-            wallet.balance += self.amount
-            wallet.save()
+            if settings.WALLET_POSTING_MODE == POSTING_MODE_ATOMIC_UPDATE:
+                balance = self._apply_atomic_update(added)
+            else:
+                with metrics.lock_wait():
+                    # validated before the lock; a deletion may have come since
+                    wallet = (
+                        Wallet.objects.select_for_update()
+                        .filter(id=self.wallet_id, deleted_at=None)
+                        .first()
+                    )
+                if wallet is None:
+                    raise WalletNotFoundError(self.wallet_id)
+                wallet.balance += self.amount
+                wallet.transaction_count += added
+                wallet.save()
+                balance = wallet.balance
             super().save(*args, **kwargs)
+            rollups.record([self])
+            events.publish([(self, balance)])
+
+    def delete(self, *args, **kwargs):
+        with transaction.atomic():
+            result = super().delete(*args, **kwargs)
+            Wallet.objects.filter(id=self.wallet_id).update(
+                transaction_count=F("transaction_count") - 1
+            )
+        return result
+
+    def _apply_atomic_update(self, added):
+        """
+        Add ``amount`` to the wallet balance with a single conditional UPDATE
+        and return the new balance.
+
+        There is no locking SELECT and no Python round trip before the write,
+        so the row lock is taken later. The UPDATE still holds it until the
+        posting's transaction commits, like any row lock.
+        """
+        table = connection.ops.quote_name(Wallet._meta.db_table)
+        balance = Wallet._meta.get_field("balance")
+        amount = balance.get_db_prep_save(self.amount, connection)
+        with connection.cursor() as cursor, metrics.lock_wait():
+            cursor.execute(
+                f"UPDATE {table} SET balance = balance + %s, "
+                "transaction_count = transaction_count + %s, updated_at = %s "
+                "WHERE id = %s AND deleted_at IS NULL AND balance + %s >= 0 "
+                "RETURNING balance",
+                [amount, added, timezone.now(), self.wallet_id, amount],
+            )
+            row = cursor.fetchone()
+        if row is None:
+            if not Wallet.objects.filter(id=self.wallet_id, deleted_at=None).exists():
+                raise WalletNotFoundError(self.wallet_id)
+            raise InsufficientBalanceError(self.wallet_id)
+        wallet_cache.invalidate(self.wallet_id)
+        new_balance = balance.from_db_value(row[0], None, connection)
+        if Transaction.wallet.is_cached(self):
+            self.wallet.balance = new_balance
+        return new_balance
+
+
+class TransactionTxid(models.Model):
+    """
+    Every txid ever posted, under a global primary key.
+
+    Postgres only enforces unique indexes of a partitioned table per
+    partition, so a trigger on the transaction table (migration 0005) keeps
+    this registry in step and a reused txid fails with an IntegrityError just
+    like it did with a plain unique constraint. Rows of archived partitions
+    stay registered.
+    """
+
+    txid = models.CharField(max_length=255, primary_key=True)
+    transaction_id = models.BigIntegerField()
+    created_at = models.DateTimeField()
+
+
+class ArchivedTotal(models.Model):
+    """Sum of a wallet's postings in a detached transaction partition."""
+
+    wallet = models.ForeignKey(
+        Wallet, on_delete=models.CASCADE, related_name="archived_totals"
+    )
+    partition = models.CharField(max_length=63)
+    # sums may outgrow a BIGINT of units, so this stays NUMERIC in either
+    # storage mode (see wallet_app.fields)
+    amount = models.DecimalField(max_digits=28, decimal_places=8)
+    count = models.BigIntegerField()
+
+    class Meta:
+        constraints = [
+            models.UniqueConstraint(
+                fields=["wallet", "partition"], name="archived_total_wallet_partition"
+            )
+        ]
+
+
+class DailyRollup(models.Model):
+    """
+    A wallet's postings of one UTC day, summed up; see ``wallet_app.rollups``.
+    """
+
+    # the unique constraint's index leads with wallet_id and backs the FK
+    wallet = models.ForeignKey(
+        Wallet, on_delete=models.CASCADE, related_name="daily_rollups", db_index=False
+    )
+    day = models.DateField()
+    # NUMERIC in either storage mode, like ArchivedTotal.amount
+    inflow = models.DecimalField(max_digits=28, decimal_places=8, default=0)
+    outflow = models.DecimalField(max_digits=28, decimal_places=8, default=0)
+    count = models.BigIntegerField(default=0)
+
+    class Meta:
+        constraints = [
+            models.UniqueConstraint(
+                fields=["wallet", "day"], name="daily_rollup_wallet_day"
+            )
+        ]
+
+
+class Transfer(models.Model):
+    """
+    A move of ``amount`` from ``source`` to ``destination``, posted as a
+    debit and a credit transaction in one database transaction; see
+    ``ledger.post_transfers``.
+    """
+
+    # leaves room for the ".debit"/".credit" suffix of the legs' txids
+    txid = models.CharField(max_length=248, unique=True, default=uuid.uuid4)
+    source = models.ForeignKey(
+        Wallet, on_delete=models.CASCADE, related_name="transfers_out"
+    )
+    destination = models.ForeignKey(
+        Wallet, on_delete=models.CASCADE, related_name="transfers_in"
+    )
+    amount = FixedPointField(max_digits=18, decimal_places=8)
+    # ids of the two legs; the partitioned transaction table has no
+    # single-column key a foreign key could reference
+    debit_id = models.BigIntegerField()
+    credit_id = models.BigIntegerField()
+    created_at = models.DateTimeField(db_default=Now())
+
+    def leg_txids(self):
+        return f"{self.txid}.debit", f"{self.txid}.credit"
+
+
+class QueuedPosting(models.Model):
+    """
+    A posting accepted with ``202`` and waiting in the outbox for
+    ``manage.py run_posting_worker``; see ``wallet_app.outbox``.
+    """
+
+    PENDING = "pending"
+    ACCEPTED = "accepted"
+    REJECTED = "rejected"
+    STATUS_CHOICES = [(PENDING, PENDING), (ACCEPTED, ACCEPTED), (REJECTED, REJECTED)]
+
+    txid = models.CharField(max_length=255, unique=True)
+    # not a foreign key: postings to unknown wallets are queued and rejected
+    # by the worker like any other
+    wallet_id = models.BigIntegerField()
+    amount = FixedPointField(max_digits=18, decimal_places=8)
+    status = models.CharField(max_length=8, choices=STATUS_CHOICES, default=PENDING)
+    detail = models.CharField(max_length=255, blank=True)
+    transaction_id = models.BigIntegerField(null=True)
+    created_at = models.DateTimeField(db_default=Now())
+    processed_at = models.DateTimeField(null=True)
+
+    class Meta:
+        # the workers' claim query: pending postings in queue order
+        indexes = [
+            BTreeIndex(
+                fields=["id"],
+                name="queued_posting_pending_idx",
+                condition=models.Q(status="pending"),
+            ),
+        ]
+
+
+class WalletDeletion(models.Model):
+    """
+    A wallet whose ledger ``manage.py purge_wallets`` deletes in chunks
+    before deleting the wallet itself; see ``wallet_app.purge``.
+    """
+
+    PENDING = "pending"
+    DONE = "done"
+    STATUS_CHOICES = [(PENDING, PENDING), (DONE, DONE)]
+
+    # not a foreign key: the wallet row goes away once the purge is done
+    wallet_id = models.BigIntegerField(unique=True)
+    status = models.CharField(max_length=7, choices=STATUS_CHOICES, default=PENDING)
+    # live transactions when the deletion was scheduled, and deleted so far
+    transactions = models.BigIntegerField()
+    deleted = models.BigIntegerField(default=0)
+    created_at = models.DateTimeField(db_default=Now())
+    finished_at = models.DateTimeField(null=True)
+
+    class Meta:
+        indexes = [
+            BTreeIndex(
+                fields=["id"],
+                name="wallet_deletion_pending_idx",
+                condition=models.Q(status="pending"),
+            ),
+        ]
@@ -0,0 +1,56 @@
+"""
+The OpenAPI document, built once per process instead of once per request.
+
+DRF's schema view walks every route, viewset and serializer on each request.
+``schema_view`` serves the document as bytes computed on first use, or read
+from ``settings.WALLET_OPENAPI_SCHEMA`` when that file exists (see
+``manage.py generate_openapi``), with an ``ETag`` of its digest so that
+clients revalidate with a 304. The WSGI and ASGI entry points load it, along
+with the URLconf, at startup.
+"""
+
+import functools
+import hashlib
+import os
+
+from django.conf import settings
+from django.http import HttpResponse
+from django.views.decorators.http import require_safe
+from rest_framework.renderers import JSONOpenAPIRenderer
+from rest_framework.schemas.openapi import SchemaGenerator
+
+from wallet_app.caching import make_etag, not_modified
+
+TITLE = "Example API"
+DESCRIPTION = "API for all things …"
+VERSION = "1.0.0"
+
+
+def generate():
+    """Render the schema of every route as JSON bytes."""
+    generator = SchemaGenerator(title=TITLE, description=DESCRIPTION, version=VERSION)
+    return JSONOpenAPIRenderer().render(generator.get_schema(public=True))
+
+
+@functools.cache
+def document():
+    """Return ``(content, etag)`` of the schema served by this process."""
+    path = settings.WALLET_OPENAPI_SCHEMA
+    if path and os.path.exists(path):
+        with open(path, "rb") as file:
+            content = file.read()
+    else:
+        content = generate()
+    return content, make_etag(hashlib.sha256(content).hexdigest()[:32])
+
+
+@require_safe
+def schema_view(request):
+    content, etag = document()
+    response = not_modified(request, etag, None)
+    if response is None:
+        response = HttpResponse(content, content_type=JSONOpenAPIRenderer.media_type)
+    response["ETag"] = etag
+    # cacheable, but revalidated on every use
+    response["Cache-Control"] = "no-cache"
+    return response
@@ -0,0 +1,107 @@
+"""
+Queued posting through a durable outbox.
+
+With ``WALLET_POSTING_QUEUE`` on, ``POST /transactions/`` only inserts a
+``QueuedPosting`` and answers ``202`` with the posting's status URL, so the
+request never waits on a wallet row lock. ``manage.py run_posting_worker``
+processes drain the outbox: each round claims the oldest pending postings no
+other worker holds, applies them with ``ledger.post_batch`` (one lock and one
+balance update per wallet) and records every outcome, all in one database
+transaction.
+
+Claims take the oldest outbox rows no other worker holds with ``SELECT ...
+FOR UPDATE SKIP LOCKED`` and then lock their wallets, so concurrent workers
+split the queue between them. Workers only wait on each other for a wallet
+both have postings of, and the postings of a wallet are applied in queue
+order.
+"""
+
+from django.db import IntegrityError, transaction
+from django.utils import timezone
+
+from wallet_app import ledger
+from wallet_app.models import QueuedPosting, Wallet
+
+
+def enqueue(validated_data):
+    """
+    Queue a posting; returns ``(posting, created)``. A txid already in the
+    outbox returns the posting queued with it.
+    """
+    try:
+        with transaction.atomic():
+            return QueuedPosting.objects.create(**validated_data), True
+    except IntegrityError:
+        return QueuedPosting.objects.get(txid=validated_data["txid"]), False
+
+
+async def aenqueue(validated_data):
+    try:
+        return await QueuedPosting.objects.acreate(**validated_data), True
+    except IntegrityError:
+        return await QueuedPosting.objects.aget(txid=validated_data["txid"]), False
+
+
+def claim(batch_size):
+    """
+    Lock up to ``batch_size`` pending postings for this worker, and their
+    wallets. Run it in the atomic block that applies them.
+    """
+    pending = QueuedPosting.objects.filter(status=QueuedPosting.PENDING)
+    postings = list(
+        pending.select_for_update(skip_locked=True).order_by("id")[:batch_size]
+    )
+    if not postings:
+        return []
+    first = {}
+    for posting in postings:
+        first.setdefault(posting.wallet_id, posting.id)
+    # in id order, like ledger.post_batch, so workers sharing a wallet wait
+    # for each other instead of deadlocking; postings to unknown wallets
+    # have no row to lock and are rejected by post_batch
+    list(
+        Wallet.objects.select_for_update()
+        .filter(id__in=first)
+        .order_by("id")
+        .values_list("id", flat=True)
+    )
+    # earlier postings of a wallet still pending now are held by a worker
+    # that has not reached its wallet lock yet: leave the wallet's postings
+    # to a later round so that they are applied in queue order
+    behind = {
+        wallet_id
+        for wallet_id, posting_id in pending.filter(
+            wallet_id__in=first, id__lt=max(first.values())
+        )
+        .exclude(id__in=[posting.id for posting in postings])
+        .values_list("wallet_id", "id")
+        if posting_id < first[wallet_id]
+    }
+    return [posting for posting in postings if posting.wallet_id not in behind]
+
+
+def process(batch_size=500):
+    """Apply one batch of queued postings; returns how many were processed."""
+    with transaction.atomic():
+        postings = claim(batch_size)
+        if not postings:
+            return 0
+        results = ledger.post_batch(
+            [
+                {"wallet_id": p.wallet_id, "amount": p.amount, "txid": p.txid}
+                for p in postings
+            ]
+        )
+        now = timezone.now()
+        for posting, (tx, error) in zip(postings, results):
+            if tx is not None:
+                posting.status = QueuedPosting.ACCEPTED
+                posting.transaction_id = tx.id
+            else:
+                posting.status = QueuedPosting.REJECTED
+                posting.detail = error
+            posting.processed_at = now
+        QueuedPosting.objects.bulk_update(
+            postings, ["status", "detail", "transaction_id", "processed_at"]
+        )
+    return len(postings)
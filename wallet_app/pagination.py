@@ -0,0 +1,252 @@
+import base64
+import json
+from datetime import datetime
+from functools import partial
+
+from django.core.paginator import Paginator
+from django.db import connections
+from django.db.models import Q
+from django.db.models.expressions import Col
+from django.db.models.lookups import Exact
+from django.db.models.sql.where import AND
+from rest_framework.exceptions import NotFound
+from rest_framework.pagination import BasePagination, _positive_int
+from rest_framework.response import Response
+from rest_framework.settings import api_settings
+from rest_framework.utils.urls import remove_query_param, replace_query_param
+from rest_framework_json_api.pagination import JsonApiPageNumberPagination
+
+
+class CountedPaginator(Paginator):
+    """A ``Paginator`` that takes its ``count`` instead of querying it."""
+
+    def __init__(self, *args, count=None, **kwargs):
+        super().__init__(*args, **kwargs)
+        if count is not None:
+            self.count = count
+
+
+class CountingPageNumberPagination(JsonApiPageNumberPagination):
+    """
+    Page-number pagination that avoids ``SELECT COUNT(*)`` where it can.
+
+    A list filtered on nothing but one related row whose model keeps a
+    counter (``counters``) takes its count from that row; an unfiltered list
+    takes the planner's row estimate from ``pg_class.reltuples``, summed
+    over partitions, unless the estimate is below ``exact_count_below``.
+    Anything else is counted. ``meta.pagination.exact`` tells clients
+    whether ``count`` is exact.
+    """
+
+    # foreign key on the paginated model -> counter on the related model
+    counters = {"wallet": "transaction_count"}
+    exact_count_below = 10_000
+
+    def paginate_queryset(self, queryset, request, view=None):
+        count, self.count_exact = self.get_count(queryset)
+        self.django_paginator_class = partial(CountedPaginator, count=count)
+        return super().paginate_queryset(queryset, request, view)
+
+    def get_count(self, queryset):
+        """Return ``(count or None, exact)``; ``None`` leaves it to COUNT(*)."""
+        where = queryset.query.where
+        if not where.children:
+            estimate = self.estimate(queryset)
+            if estimate is not None and estimate >= self.exact_count_below:
+                return estimate, False
+            return None, True
+        if where.connector != AND or where.negated or len(where.children) != 1:
+            return None, True
+        lookup = where.children[0]
+        if not (isinstance(lookup, Exact) and isinstance(lookup.lhs, Col)):
+            return None, True
+        field = lookup.lhs.target
+        counter = self.counters.get(field.name)
+        if counter is None or not field.is_relation:
+            return None, True
+        pk = getattr(lookup.rhs, "pk", lookup.rhs)
+        count = (
+            field.related_model._default_manager.using(queryset.db)
+            .filter(pk=pk)
+            .values_list(counter, flat=True)
+            .first()
+        )
+        return count or 0, True
+
+    def estimate(self, queryset):
+        table = queryset.model._meta.db_table
+        with connections[queryset.db].cursor() as cursor:
+            # -1 means never analyzed; a partitioned table's own estimate
+            # is that of its partitions
+            cursor.execute(
+                "SELECT CASE WHEN c.relkind = 'p' THEN ("
+                "SELECT sum(p.reltuples) FILTER (WHERE p.reltuples >= 0) "
+                "FROM pg_inherits JOIN pg_class p ON p.oid = pg_inherits.inhrelid "
+                "WHERE pg_inherits.inhparent = c.oid"
+                ") WHEN c.reltuples >= 0 THEN c.reltuples END "
+                "FROM pg_class c WHERE c.oid = %s::regclass",
+                [table],
+            )
+            (estimate,) = cursor.fetchone()
+        return None if estimate is None else int(estimate)
+
+    def get_paginated_response(self, data):
+        response = super().get_paginated_response(data)
+        response.data["meta"]["pagination"]["exact"] = self.count_exact
+        return response
+
+
+class JsonApiCursorPagination(BasePagination):
+    """
+    JSON:API keyset pagination on ``(created_at, id)``.
+
+    Pages are fetched with ``WHERE (created_at, id) < (last seen)`` instead of
+    ``OFFSET``, and no ``COUNT(*)`` is issued, so the cost of a page does not
+    depend on how deep it is. Only ``created_at`` / ``-created_at`` orderings
+    can be paginated this way; any other ordering, or an explicit
+    ``page[number]`` parameter, falls back to page-number pagination.
+    """
+
+    cursor_query_param = "page[cursor]"
+    page_size_query_param = "page[size]"
+    page_size = api_settings.PAGE_SIZE
+    max_page_size = 100
+    keyset_field = "created_at"
+    fallback_class = CountingPageNumberPagination
+    invalid_cursor_message = "Invalid cursor"
+
+    def paginate_queryset(self, queryset, request, view=None):
+        self.request = request
+        self.fallback = None
+        ordering = tuple(queryset.query.order_by)
+        keyset_orderings = ((self.keyset_field,), ("-" + self.keyset_field,))
+        if (
+            self.fallback_class.page_query_param in request.query_params
+            or ordering not in keyset_orderings
+        ):
+            self.fallback = self.fallback_class()
+            return self.fallback.paginate_queryset(queryset, request, view)
+
+        self.descending = ordering[0].startswith("-")
+        self.page_size = self.get_page_size(request)
+        position, forward = self.decode_cursor(request)
+
+        # walking backwards is walking forwards in the opposite direction
+        descending = self.descending == forward
+        if position is not None:
+            queryset = queryset.filter(self.keyset_filter(position, descending))
+        queryset = queryset.order_by(
+            *(("-" + field) if descending else field for field in self.key_fields)
+        )
+        results = list(queryset[: self.page_size + 1])
+        has_more = len(results) > self.page_size
+        results = results[: self.page_size]
+        if not forward:
+            results.reverse()
+
+        self.next_position = self.previous_position = None
+        if results:
+            if has_more or not forward:
+                self.next_position = self.get_position(results[-1])
+            if position is not None and (has_more or forward):
+                self.previous_position = self.get_position(results[0])
+        return results
+
+    @property
+    def key_fields(self):
+        return (self.keyset_field, "id")
+
+    def keyset_filter(self, position, descending):
+        # (key, id) < (k, i) spelled so that the planner gets a range on `key`
+        value, pk = position
+        op = "lt" if descending else "gt"
+        key_range = {f"{self.keyset_field}__{op}e": value}
+        return Q(**key_range) & (
+            Q(**{f"{self.keyset_field}__{op}": value}) | Q(**{f"id__{op}": pk})
+        )
+
+    def get_position(self, instance):
+        if isinstance(instance, dict):  # a .values() row
+            return instance[self.keyset_field], instance["id"]
+        return getattr(instance, self.keyset_field), instance.pk
+
+    def get_page_size(self, request):
+        try:
+            return _positive_int(
+                request.query_params[self.page_size_query_param],
+                strict=True,
+                cutoff=self.max_page_size,
+            )
+        except (KeyError, ValueError):
+            return self.page_size
+
+    def decode_cursor(self, request):
+        """Return ``((key, id) or None, forward)`` for the requested cursor."""
+        encoded = request.query_params.get(self.cursor_query_param)
+        if encoded is None:
+            return None, True
+        try:
+            cursor = json.loads(base64.urlsafe_b64decode(encoded.encode("ascii")))
+            position = (datetime.fromisoformat(cursor["k"]), int(cursor["i"]))
+            forward = not cursor.get("r", False)
+        except (TypeError, ValueError, KeyError, UnicodeError):
+            raise NotFound(self.invalid_cursor_message)
+        return position, forward
+
+    def encode_cursor(self, position, forward):
+        value, pk = position
+        cursor = {"k": value.isoformat(), "i": pk}
+        if not forward:
+            cursor["r"] = True
+        encoded = base64.urlsafe_b64encode(json.dumps(cursor).encode("ascii"))
+        url = self.request.build_absolute_uri()
+        return replace_query_param(
+            url, self.cursor_query_param, encoded.decode("ascii")
+        )
+
+    def get_first_link(self):
+        url = self.request.build_absolute_uri()
+        return remove_query_param(url, self.cursor_query_param)
+
+    def get_next_link(self):
+        if self.next_position is None:
+            return None
+        return self.encode_cursor(self.next_position, forward=True)
+
+    def get_previous_link(self):
+        if self.previous_position is None:
+            return None
+        return self.encode_cursor(self.previous_position, forward=False)
+
+    def get_paginated_response(self, data):
+        if self.fallback is not None:
+            return self.fallback.get_paginated_response(data)
+        return Response(
+            {
+                "results": data,
+                "links": {
+                    "first": self.get_first_link(),
+                    "next": self.get_next_link(),
+                    "prev": self.get_previous_link(),
+                },
+            }
+        )
+
+    def get_schema_operation_parameters(self, view):
+        return [
+            {
+                "name": self.cursor_query_param,
+                "required": False,
+                "in": "query",
+                "description": "Opaque cursor taken from the `next`/`prev` links",
+                "schema": {"type": "string"},
+            },
+            {
+                "name": self.page_size_query_param,
+                "required": False,
+                "in": "query",
+                "description": "Number of results to return per page",
+                "schema": {"type": "integer"},
+            },
+            *self.fallback_class().get_schema_operation_parameters(view)[:1],
+        ]
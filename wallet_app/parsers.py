@@ -0,0 +1,21 @@
+from rest_framework_json_api.parsers import JSONParser
+
+
+class BulkJSONParser(JSONParser):
+    """
+    JSON:API parser that also accepts a list of resource objects as primary
+    data, e.g. ``{"data": [{"type": "Transaction", "attributes": {...}}, ...]}``.
+
+    Every resource object goes through the regular JSON:API parsing, so a
+    list payload yields a list of the same dicts a single resource would.
+    """
+
+    def parse_data(self, result, parser_context):
+        if isinstance(result, dict) and isinstance(result.get("data"), list):
+            return [
+                super(BulkJSONParser, self).parse_data(
+                    {**result, "data": resource}, parser_context
+                )
+                for resource in result["data"]
+            ]
+        return super().parse_data(result, parser_context)
@@ -0,0 +1,76 @@
+"""
+Monthly range partitions of the transaction table, see migration 0005.
+
+Partitions are named ``wallet_app_transaction_yYYYYmMM`` and cover one UTC
+calendar month of ``created_at``. ``wallet_app_transaction_default`` catches
+rows outside every partition; it stays empty as long as partitions are
+created ahead of time with ``manage.py transaction_partitions``.
+"""
+
+import re
+from datetime import datetime, timezone
+
+TABLE = "wallet_app_transaction"
+DEFAULT_PARTITION = f"{TABLE}_default"
+TXID_REGISTRY = "wallet_app_transactiontxid"
+
+_NAME = re.compile(rf"^{TABLE}_y(\d{{4}})m(\d{{2}})$")
+
+
+def month_start(value):
+    value = value.astimezone(timezone.utc)
+    return value.replace(day=1, hour=0, minute=0, second=0, microsecond=0)
+
+
+def add_months(month, count):
+    index = month.year * 12 + month.month - 1 + count
+    return month.replace(year=index // 12, month=index % 12 + 1)
+
+
+def months(first, last):
+    """Month starts from ``first``'s month through ``last``'s month."""
+    month, last = month_start(first), month_start(last)
+    while month <= last:
+        yield month
+        month = add_months(month, 1)
+
+
+def partition_name(month):
+    return f"{TABLE}_y{month:%Y}m{month:%m}"
+
+
+def partition_month(name):
+    """The month a partition covers, ``None`` for names not made here."""
+    match = _NAME.match(name)
+    if match is None:
+        return None
+    return datetime(int(match[1]), int(match[2]), 1, tzinfo=timezone.utc)
+
+
+def bounds(month):
+    return month.isoformat(), add_months(month, 1).isoformat()
+
+
+def create_partition_sql(month):
+    lower, upper = bounds(month)
+    return (
+        f"CREATE TABLE IF NOT EXISTS {partition_name(month)} PARTITION OF {TABLE} "
+        f"FOR VALUES FROM ('{lower}') TO ('{upper}')"
+    )
+
+
+def list_partitions(cursor):
+    """Return ``{name: month}`` for the attached monthly partitions."""
+    cursor.execute(
+        "SELECT child.relname FROM pg_inherits "
+        "JOIN pg_class parent ON parent.oid = pg_inherits.inhparent "
+        "JOIN pg_class child ON child.oid = pg_inherits.inhrelid "
+        "WHERE parent.relname = %s",
+        [TABLE],
+    )
+    found = {}
+    for (name,) in cursor.fetchall():
+        month = partition_month(name)
+        if month is not None:
+            found[name] = month
+    return found
@@ -0,0 +1,98 @@
+"""
+JSON:API sparse fieldsets and compound documents, pushed down to SQL.
+
+The JSON:API renderer leaves out the attributes a ``fields[Type]`` parameter
+does not ask for and adds the resources named by ``include``, but on its own
+the queryset still loads every column, and every included resource with a
+query of its own. ``PreloadMixin`` narrows the querysets of ``list`` and
+``retrieve`` with ``.only()`` to the requested fields and loads includes
+with the view's ``select_for_includes`` and ``get_prefetch_related()`` (see
+DJA's ``PreloadIncludesMixin``), so a page costs the same number of queries
+whatever its size. The serializers must skip the fields left out, i.e. use
+DJA's ``SparseFieldsetsMixin``.
+"""
+
+import functools
+
+from django.core.exceptions import FieldDoesNotExist
+from rest_framework_json_api.utils import (
+    get_included_resources,
+    get_resource_type_from_serializer,
+    undo_format_field_name,
+)
+from rest_framework_json_api.views import PreloadIncludesMixin
+
+READ_ACTIONS = ("list", "retrieve")
+
+
+@functools.cache
+def _sources(serializer_class):
+    """``{field name: model field name}`` of the fields a serializer renders."""
+    return {
+        name: field.source
+        for name, field in serializer_class().fields.items()
+        if not field.write_only and field.source != "*" and "." not in field.source
+    }
+
+
+def sparse_fields(request, serializer_class):
+    """
+    Model fields asked for by the ``fields[Type]`` parameter of the
+    serializer's resource type, ``None`` when there is none.
+    """
+    resource_type = get_resource_type_from_serializer(serializer_class)
+    value = request.query_params.get(f"fields[{resource_type}]")
+    if value is None:
+        return None
+    sources = _sources(serializer_class)
+    return [
+        sources[name]
+        for name in map(undo_format_field_name, value.split(","))
+        if name in sources
+    ]
+
+
+def only_requested(queryset, request, serializer_class, *required):
+    """``queryset`` loading the primary key, the requested and ``required`` fields."""
+    fields = sparse_fields(request, serializer_class)
+    if fields is None:
+        return queryset
+    return queryset.only("pk", *fields, *required)
+
+
+class PreloadMixin(PreloadIncludesMixin):
+    def filter_queryset(self, queryset):
+        queryset = super().filter_queryset(queryset)
+        if self.action not in READ_ACTIONS:
+            return queryset
+        return self.narrow(queryset)
+
+    def narrow(self, queryset):
+        """Defer the columns the document leaves out, see ``sparse_fields()``."""
+        serializer_class = self.get_serializer_class()
+        meta = queryset.model._meta
+        fields = sparse_fields(self.request, serializer_class)
+        required, joined = [], []
+        # cursor pagination reads the ordering fields of the last row
+        for name in queryset.query.order_by:
+            if isinstance(name, str) and "__" not in name:
+                try:
+                    required.append(meta.get_field(name.lstrip("-")).name)
+                except FieldDoesNotExist:
+                    pass  # "pk" or an annotation
+        for include in get_included_resources(self.request, serializer_class):
+            if "." in include or self.get_select_related(include) is None:
+                continue
+            # a relation can't be both deferred and followed by select_related
+            required.append(include)
+            related = sparse_fields(
+                self.request, serializer_class.included_serializers[include]
+            )
+            if related is not None:
+                related_pk = meta.get_field(include).related_model._meta.pk.name
+                joined += [f"{include}__{name}" for name in [related_pk, *related]]
+        if fields is None:
+            if not joined:
+                return queryset
+            fields = [field.name for field in meta.concrete_fields]
+        return queryset.only("pk", *fields, *required, *joined)
@@ -0,0 +1,92 @@
+"""
+Background deletion of wallets.
+
+Deleting a wallet through the ORM makes Django's deletion collector load the
+primary key of every transaction, transfer and rollup of the wallet and
+delete them in one long database transaction. ``DELETE /wallets/{id}/``
+instead only marks the wallet deleted and records a ``WalletDeletion``;
+``manage.py purge_wallets`` processes then delete its rows
+``chunk_size`` at a time, each chunk in a short transaction of its own, and
+delete the wallet row once nothing references it any more.
+
+Deletions are claimed with ``SELECT ... FOR UPDATE SKIP LOCKED``, so any
+number of workers can run.
+"""
+
+from django.db import transaction
+from django.db.models import Q
+from django.utils import timezone
+
+from wallet_app.caching import wallet_cache
+from wallet_app.idempotency import recent_transactions
+from wallet_app.models import (
+    ArchivedTotal,
+    DailyRollup,
+    Transaction,
+    Transfer,
+    Wallet,
+    WalletDeletion,
+)
+
+
+def schedule(wallet):
+    """Hide ``wallet`` and queue the deletion of its rows."""
+    with transaction.atomic():
+        # postings check deleted_at under this lock, so none is applied after it
+        wallet = Wallet.objects.select_for_update().get(id=wallet.id)
+        wallet.deleted_at = timezone.now()
+        wallet.save(update_fields=["deleted_at", "updated_at"])
+        deletion, _ = WalletDeletion.objects.get_or_create(
+            wallet_id=wallet.id,
+            defaults={"transactions": wallet.transaction_count},
+        )
+    return deletion
+
+
+def dependents(wallet_id):
+    """Querysets of the rows referencing the wallet, transactions first."""
+    return [
+        Transaction.objects.filter(wallet_id=wallet_id),
+        Transfer.objects.filter(Q(source_id=wallet_id) | Q(destination_id=wallet_id)),
+        DailyRollup.objects.filter(wallet_id=wallet_id),
+        ArchivedTotal.objects.filter(wallet_id=wallet_id),
+    ]
+
+
+def process(chunk_size=5000):
+    """
+    Delete one chunk of rows of the oldest pending deletion, or its wallet
+    once nothing else is left. Returns the deletion worked on, ``None`` when
+    there is nothing to claim.
+    """
+    with transaction.atomic():
+        deletion = (
+            WalletDeletion.objects.select_for_update(skip_locked=True)
+            .filter(status=WalletDeletion.PENDING)
+            .order_by("id")
+            .first()
+        )
+        if deletion is None:
+            return None
+        for queryset in dependents(deletion.wallet_id):
+            # none of these models is referenced by another, so each chunk
+            # is a single DELETE ... WHERE id IN (SELECT ... LIMIT n); the
+            # transactions' txids are read first to forget their retries
+            chunk = queryset.values("id")[:chunk_size]
+            if queryset.model is Transaction:
+                txids = dict(queryset.values_list("id", "txid")[:chunk_size])
+                for txid in txids.values():
+                    recent_transactions.discard(txid)
+                chunk = list(txids)
+            count, _ = queryset.model.objects.filter(id__in=chunk).delete()
+            if count:
+                if queryset.model is Transaction:
+                    deletion.deleted += count
+                    deletion.save(update_fields=["deleted"])
+                return deletion
+        Wallet.objects.filter(id=deletion.wallet_id).delete()
+        wallet_cache.invalidate(deletion.wallet_id)
+        deletion.status = WalletDeletion.DONE
+        deletion.finished_at = timezone.now()
+        deletion.save(update_fields=["status", "finished_at"])
+    return deletion
@@ -0,0 +1,39 @@
+import time
+
+from rest_framework import renderers
+from rest_framework_json_api import renderers as json_api_renderers
+
+from wallet_app import metrics
+from wallet_app.fastread import FastResource, FastResults
+
+
+class JSONRenderer(json_api_renderers.JSONRenderer):
+    """
+    JSON:API renderer that builds documents for ``FastReadMixin`` responses
+    straight from their ``ResourceSchema`` and defers to the stock renderer
+    for everything else.
+    """
+
+    def render(self, data, accepted_media_type=None, renderer_context=None):
+        started = time.perf_counter()
+        try:
+            return self._render(data, accepted_media_type, renderer_context)
+        finally:
+            metrics.record_render(time.perf_counter() - started)
+
+    def _render(self, data, accepted_media_type, renderer_context):
+        if isinstance(data, FastResource):
+            document = {"data": data.schema.resource_object(data)}
+        elif isinstance(data, dict) and isinstance(data.get("results"), FastResults):
+            results = data["results"]
+            document = {}
+            if data.get("links"):
+                document["links"] = data["links"]
+            document["data"] = list(map(results.schema.resource_object, results))
+            if data.get("meta"):
+                document["meta"] = data["meta"]
+        else:
+            return super().render(data, accepted_media_type, renderer_context)
+        return renderers.JSONRenderer.render(
+            self, document, accepted_media_type, renderer_context
+        )
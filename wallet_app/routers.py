@@ -0,0 +1,40 @@
+from contextvars import ContextVar
+
+from django.conf import settings
+from django.db import DEFAULT_DB_ALIAS, connections
+
+REPLICA_DB_ALIAS = "replica"
+
+# set by middleware.replica_routing_middleware for requests whose reads may
+# be served by the replica
+replica_reads = ContextVar("replica_reads", default=False)
+
+
+def reads_from_replica():
+    """Whether reads made now are routed to the replica."""
+    return (
+        settings.WALLET_REPLICA_READS
+        and replica_reads.get()
+        # reads inside a write transaction must see its own writes
+        and not connections[DEFAULT_DB_ALIAS].in_atomic_block
+    )
+
+
+class ReplicaRouter:
+    """
+    Send the reads of safe requests to the ``replica`` alias and everything
+    else to ``default``.
+
+    Locking reads (``select_for_update``) are routed as writes by Django, so
+    they always reach the primary along with the writes themselves.
+    """
+
+    def db_for_read(self, model, **hints):
+        return REPLICA_DB_ALIAS if reads_from_replica() else DEFAULT_DB_ALIAS
+
+    def db_for_write(self, model, **hints):
+        return DEFAULT_DB_ALIAS
+
+    def allow_relation(self, obj1, obj2, **hints):
+        # both aliases hold the same data
+        return {obj1._state.db, obj2._state.db} <= {DEFAULT_DB_ALIAS, REPLICA_DB_ALIAS}
@@ -1,14 +1,67 @@
+import uuid
+
 from rest_framework import serializers
+from rest_framework.validators import UniqueValidator
+from rest_framework_json_api.relations import SerializerMethodResourceRelatedField
+from rest_framework_json_api.serializers import (
+    IncludedResourcesValidationMixin,
+    SerializerMetaclass,
+    SparseFieldsetsMixin,
+)
+from rest_framework_json_api.utils import get_included_resources
+
+from wallet_app.models import (
+    QueuedPosting,
+    Transaction,
+    Transfer,
+    Wallet,
+    WalletDeletion,
+)
+
+
+def wallet_not_found(wallet_id):
+    """The error the ``wallet`` field raises for an unknown or deleted wallet."""
+    return serializers.ValidationError(
+        {"wallet": [f'Invalid pk "{wallet_id}" - object does not exist.']},
+        code="does_not_exist",
+    )
 
-from wallet_app.models import Transaction, Wallet
 
+class WalletSerializer(
+    IncludedResourcesValidationMixin,
+    SparseFieldsetsMixin,
+    serializers.ModelSerializer,
+    metaclass=SerializerMetaclass,
+):
+    """
+    ``?include=transactions`` adds the wallet's most recent transactions,
+    as many as ``WalletViewSet.included_transactions``.
+    """
+
+    included_serializers = {
+        "transactions": "wallet_app.serializers.TransactionSerializer"
+    }
 
-class WalletSerializer(serializers.ModelSerializer):
     class Meta:
         model = Wallet
         fields = ["id", "label", "balance", "created_at", "updated_at"]
         read_only_fields = ["created_at", "updated_at"]
 
+    def get_fields(self):
+        fields = super().get_fields()
+        request = self.context.get("request")
+        # only part of the document when included: it's bounded, not the
+        # wallet's full to-many relationship
+        if request is not None and "transactions" in get_included_resources(request):
+            fields["transactions"] = SerializerMethodResourceRelatedField(
+                model=Transaction, many=True, read_only=True
+            )
+        return fields
+
+    def get_transactions(self, wallet):
+        # prefetched by WalletViewSet
+        return getattr(wallet, "recent_transactions", [])
+
     def validate(self, data):
         if "balance" in data and data["balance"] < 0:
             raise serializers.ValidationError(
@@ -17,8 +70,151 @@ class WalletSerializer(serializers.ModelSerializer):
         return data
 
 
-class TransactionSerializer(serializers.ModelSerializer):
+class TransactionSerializer(
+    IncludedResourcesValidationMixin,
+    SparseFieldsetsMixin,
+    serializers.ModelSerializer,
+    metaclass=SerializerMetaclass,
+):
+    included_serializers = {"wallet": WalletSerializer}
+
     class Meta:
         model = Transaction
         fields = ["id", "wallet", "txid", "amount", "created_at"]
         read_only_fields = ["created_at"]
+        # txid has no unique constraint on the partitioned table to derive
+        # this from, see TransactionTxid
+        extra_kwargs = {
+            "txid": {
+                "validators": [UniqueValidator(queryset=Transaction.objects.all())]
+            },
+            "wallet": {"queryset": Wallet.objects.filter(deleted_at=None)},
+        }
+
+
+class BulkTransactionSerializer(serializers.ModelSerializer):
+    """
+    Input serializer for bulk posting.
+
+    Wallet existence and txid uniqueness are checked set-wise by
+    ``ledger.post_batch`` instead of with one query per row.
+    """
+
+    wallet = serializers.IntegerField(source="wallet_id")
+
+    class Meta:
+        model = Transaction
+        fields = ["wallet", "txid", "amount"]
+        extra_kwargs = {"txid": {"validators": []}}
+
+    def validate(self, data):
+        data.setdefault("txid", str(uuid.uuid4()))
+        return data
+
+
+class TransferSerializer(serializers.ModelSerializer):
+    """
+    Wallet existence, balances and txid uniqueness are checked set-wise by
+    ``ledger.post_transfers``, as for ``BulkTransactionSerializer``.
+    """
+
+    source = serializers.IntegerField(source="source_id")
+    destination = serializers.IntegerField(source="destination_id")
+    debit = serializers.IntegerField(source="debit_id", read_only=True)
+    credit = serializers.IntegerField(source="credit_id", read_only=True)
+
+    class Meta:
+        model = Transfer
+        fields = [
+            "id",
+            "source",
+            "destination",
+            "amount",
+            "txid",
+            "debit",
+            "credit",
+            "created_at",
+        ]
+        read_only_fields = ["created_at"]
+        extra_kwargs = {"txid": {"validators": []}}
+
+    def validate_amount(self, value):
+        if value <= 0:
+            raise serializers.ValidationError("Amount must be positive")
+        return value
+
+    def validate(self, data):
+        if data["source_id"] == data["destination_id"]:
+            raise serializers.ValidationError(
+                {"destination": "Destination must differ from source"}
+            )
+        data.setdefault("txid", str(uuid.uuid4()))
+        return data
+
+
+class QueuedPostingSerializer(serializers.ModelSerializer):
+    wallet = serializers.IntegerField(source="wallet_id", read_only=True)
+    transaction = serializers.IntegerField(source="transaction_id", read_only=True)
+
+    class Meta:
+        model = QueuedPosting
+        fields = [
+            "id",
+            "wallet",
+            "txid",
+            "amount",
+            "status",
+            "detail",
+            "transaction",
+            "created_at",
+            "processed_at",
+        ]
+        read_only_fields = fields
+        resource_name = "Posting"
+
+
+class WalletDeletionSerializer(serializers.ModelSerializer):
+    wallet = serializers.IntegerField(source="wallet_id", read_only=True)
+
+    class Meta:
+        model = WalletDeletion
+        fields = [
+            "id",
+            "wallet",
+            "status",
+            "transactions",
+            "deleted",
+            "created_at",
+            "finished_at",
+        ]
+        read_only_fields = fields
+        resource_name = "WalletDeletion"
+
+
+class WalletStatsSerializer(serializers.Serializer):
+    """Totals of a wallet's postings, read from ``DailyRollup``."""
+
+    id = serializers.IntegerField()
+    inflow = serializers.DecimalField(max_digits=28, decimal_places=8)
+    outflow = serializers.DecimalField(max_digits=28, decimal_places=8)
+    net = serializers.DecimalField(max_digits=28, decimal_places=8)
+    count = serializers.IntegerField()
+    first_day = serializers.DateField(allow_null=True)
+    last_day = serializers.DateField(allow_null=True)
+
+    class Meta:
+        resource_name = "WalletStats"
+
+
+class WalletFlowSerializer(serializers.Serializer):
+    """One bucket of a wallet's time series, see ``WalletViewSet.series``."""
+
+    id = serializers.CharField()
+    start = serializers.DateField()
+    inflow = serializers.DecimalField(max_digits=28, decimal_places=8)
+    outflow = serializers.DecimalField(max_digits=28, decimal_places=8)
+    net = serializers.DecimalField(max_digits=28, decimal_places=8)
+    count = serializers.IntegerField()
+
+    class Meta:
+        resource_name = "WalletFlow"
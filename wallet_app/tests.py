@@ -1,14 +1,57 @@
+import asyncio
 import concurrent
+import itertools
+import json
+import re
+import threading
+import time
+from datetime import datetime, timedelta
+from datetime import timezone as dt_timezone
 from decimal import Decimal
+from io import StringIO
 
 import pytest
-from django.test import TransactionTestCase
+from asgiref.sync import async_to_sync, sync_to_async
+from django.core.management import CommandError, call_command
+from django.db import IntegrityError, connection, transaction
+from django.test import AsyncClient, TransactionTestCase, override_settings
+from django.test.utils import CaptureQueriesContext
 from django.urls import reverse
+from django.utils import timezone
 from faker import Faker
 from rest_framework import status
-from rest_framework.test import APIClient
+from rest_framework.request import Request
+from rest_framework.settings import api_settings
+from rest_framework.test import APIClient, APIRequestFactory
 
-from wallet_app.models import Wallet
+from wallet_app import (
+    events,
+    fields,
+    ledger,
+    metrics,
+    openapi,
+    outbox,
+    partitions,
+    purge,
+)
+from wallet_app.caching import wallet_cache
+from wallet_app.filters import TrigramSimilarityFilter
+from wallet_app.idempotency import recent_transactions
+from wallet_app.middleware import PIN_COOKIE
+from wallet_app.models import (
+    BALANCE_CONSTRAINT_NAME,
+    POSTING_MODE_ATOMIC_UPDATE,
+    POSTING_MODE_SELECT_FOR_UPDATE,
+    ArchivedTotal,
+    DailyRollup,
+    QueuedPosting,
+    Transaction,
+    TransactionTxid,
+    Wallet,
+    WalletDeletion,
+)
+from wallet_app.pagination import CountingPageNumberPagination
+from wallet_app.views import TransactionViewSet, WalletViewSet
 
 fake = Faker()
 
@@ -18,6 +61,21 @@ def api_client():
     return APIClient()
 
 
+@pytest.fixture
+def shared_wallet_cache(settings):
+    """Turn the wallet cache on; local memory is shared enough for one process."""
+    settings.CACHES = {
+        **settings.CACHES,
+        "wallets": {
+            "BACKEND": "django.core.cache.backends.locmem.LocMemCache",
+            "LOCATION": "wallets",
+        },
+    }
+    wallet_cache.cache.clear()
+    yield wallet_cache
+    wallet_cache.cache.clear()
+
+
 @pytest.fixture
 def wallets():
     return [
@@ -60,7 +118,7 @@ class TestWalletViewSet:
     def test_delete_wallet(self, api_client, wallets):
         url = reverse("wallet-detail", args=[wallets[0].id])
         response = api_client.delete(url)
-        assert response.status_code == status.HTTP_204_NO_CONTENT
+        assert response.status_code == status.HTTP_202_ACCEPTED
         resp = api_client.get(self.URL)
         assert len(resp.data["results"]) - len(wallets) == -1
 
@@ -79,6 +137,26 @@ class TestWalletViewSet:
         assert response.status_code == status.HTTP_200_OK
         assert len(response.data["results"]) == 2
 
+    def test_search_label(self, api_client, wallets):
+        response = api_client.get(self.URL, {"filter[search]": "wALLet"})
+        assert response.status_code == status.HTTP_200_OK
+        assert {wallet["label"] for wallet in response.data["results"]} == {
+            "Wallet A",
+            "Wallet B",
+        }
+
+    def test_similar_label(self, api_client, wallet_factory):
+        for label in ["Savings", "Groceries", "Savings 2024", "Travel savings"]:
+            wallet_factory(label=label)
+        response = api_client.get(
+            self.URL, {"filter[similar]": "savngs", "ordering": "label"}
+        )
+        assert response.status_code == status.HTTP_200_OK
+        labels = [wallet["label"] for wallet in response.data["results"]]
+        # best match first, regardless of ?ordering
+        assert labels[0] == "Savings"
+        assert "Groceries" not in labels
+
     def test_ordering(self, api_client, wallets):
         response = api_client.get(self.URL + "?ordering=-balance")
         assert response.status_code == status.HTTP_200_OK
@@ -117,6 +195,13 @@ class TestWalletViewSet:
 class TestTransaction:
     URL: str = reverse("transaction-list")
 
+    @pytest.fixture(
+        autouse=True,
+        params=[POSTING_MODE_SELECT_FOR_UPDATE, POSTING_MODE_ATOMIC_UPDATE],
+    )
+    def posting_mode(self, request, settings):
+        settings.WALLET_POSTING_MODE = request.param
+
     @pytest.mark.parametrize(
         "init_bal, tx_amt",
         [(0, 0), (0, 100), (100, 0), (100, 100), (100, -1), (100, -100)],
@@ -158,13 +243,1609 @@ class TestTransaction:
         assert test_wallet.balance == init_bal
 
 
+def bulk_payload(*items):
+    data = []
+    for wallet_id, amount, *txid in items:
+        attributes = {"amount": amount, "wallet": wallet_id}
+        if txid:
+            attributes["txid"] = txid[0]
+        data.append({"type": "Transaction", "attributes": attributes})
+    return {"data": data}
+
+
+@pytest.mark.django_db
+class TestTransactionIdempotency:
+    URL: str = reverse("transaction-list")
+
+    @pytest.fixture(autouse=True)
+    def clear_recent_transactions(self):
+        recent_transactions.clear()
+        yield
+        recent_transactions.clear()
+
+    def post(self, api_client, wallet, amount, txid="retried"):
+        return api_client.post(
+            self.URL,
+            {
+                "data": {
+                    "type": "Transaction",
+                    "attributes": {"amount": amount, "wallet": wallet.id, "txid": txid},
+                }
+            },
+        )
+
+    def test_retry_returns_original(
+        self, api_client, wallet_factory, django_assert_num_queries
+    ):
+        wallet = wallet_factory(balance=0)
+        first = self.post(api_client, wallet, "10.5")
+        assert first.status_code == status.HTTP_201_CREATED
+        # served from the in-process cache
+        with django_assert_num_queries(0):
+            retry = self.post(api_client, wallet, 10.5)
+        assert retry.status_code == status.HTTP_200_OK
+        assert retry.data["id"] == first.data["id"]
+        wallet.refresh_from_db()
+        assert wallet.balance == Decimal("10.5")
+
+    def test_retry_after_cache_miss(
+        self, api_client, wallet_factory, django_assert_num_queries
+    ):
+        wallet = wallet_factory(balance=0)
+        tx = Transaction.objects.create(wallet=wallet, txid="retried", amount=3)
+        with django_assert_num_queries(1):
+            retry = self.post(api_client, wallet, 3)
+        assert retry.status_code == status.HTTP_200_OK
+        assert retry.data["id"] == tx.id
+        wallet.refresh_from_db()
+        assert wallet.balance == 3
+
+    @pytest.mark.parametrize("other_wallet, amount", [(False, 4), (True, 3)])
+    def test_mismatched_retry_conflicts(
+        self, api_client, wallet_factory, other_wallet, amount
+    ):
+        wallet = wallet_factory(balance=0)
+        assert self.post(api_client, wallet, 3).status_code == status.HTTP_201_CREATED
+        if other_wallet:
+            wallet = wallet_factory(balance=0)
+        response = self.post(api_client, wallet, amount)
+        assert response.status_code == status.HTTP_409_CONFLICT
+        assert Transaction.objects.count() == 1
+
+    def test_deleted_transaction_is_forgotten(self, api_client, wallet_factory):
+        wallet = wallet_factory(balance=0)
+        first = self.post(api_client, wallet, 1)
+        api_client.delete(reverse("transaction-detail", args=[first.data["id"]]))
+        assert self.post(api_client, wallet, 1).status_code == status.HTTP_201_CREATED
+
+    def test_purged_transaction_is_forgotten(self, api_client, wallet_factory):
+        wallet = wallet_factory(balance=0)
+        self.post(api_client, wallet, 1)
+        purge.schedule(wallet)
+        while purge.process().status != WalletDeletion.DONE:
+            pass
+        response = self.post(api_client, wallet, 1)
+        assert response.status_code == status.HTTP_400_BAD_REQUEST
+
+
+@pytest.mark.django_db
+class TestTransactionBulk:
+    URL: str = reverse("transaction-list")
+
+    def test_all_accepted(self, api_client, wallet_factory):
+        w1, w2 = wallet_factory(balance=10), wallet_factory(balance=0)
+        response = api_client.post(
+            self.URL, bulk_payload((w2.id, 5), (w1.id, -10), (w2.id, -5), (w1.id, 1))
+        )
+        assert response.status_code == status.HTTP_201_CREATED
+        assert len(response.data["results"]) == 4
+        assert [r["status"] for r in response.data["meta"]["bulk"]] == ["created"] * 4
+        w1.refresh_from_db()
+        w2.refresh_from_db()
+        assert (w1.balance, w2.balance) == (1, 0)
+        assert w1.transactions.count() == 2
+
+    def test_rejects_only_overdrafts(self, api_client, wallet_factory):
+        wallet = wallet_factory(balance=10)
+        response = api_client.post(
+            self.URL,
+            bulk_payload((wallet.id, -6), (wallet.id, -6), (wallet.id, 2), (0, 1)),
+        )
+        assert response.status_code == status.HTTP_207_MULTI_STATUS
+        assert [
+            (r["status"], r.get("detail")) for r in response.data["meta"]["bulk"]
+        ] == [
+            ("created", None),
+            ("rejected", "Insufficient balance"),
+            ("created", None),
+            ("rejected", "Wallet not found"),
+        ]
+        wallet.refresh_from_db()
+        assert wallet.balance == 6
+        assert wallet.transactions.count() == 2
+
+    def test_duplicate_txid(self, api_client, wallet_factory):
+        wallet = wallet_factory(balance=0)
+        Transaction.objects.create(wallet=wallet, txid="seen", amount=1)
+        response = api_client.post(
+            self.URL,
+            bulk_payload(
+                (wallet.id, 1, "seen"),
+                (wallet.id, 1, "new"),
+                (wallet.id, 1, "new"),
+            ),
+        )
+        assert response.status_code == status.HTTP_207_MULTI_STATUS
+        assert [r["status"] for r in response.data["meta"]["bulk"]] == [
+            "rejected",
+            "created",
+            "rejected",
+        ]
+        wallet.refresh_from_db()
+        assert wallet.balance == 2
+
+    def test_query_count_independent_of_size(
+        self, api_client, wallet_factory, django_assert_max_num_queries
+    ):
+        wallet = wallet_factory(balance=0)
+        with django_assert_max_num_queries(8):
+            response = api_client.post(self.URL, bulk_payload(*[(wallet.id, 1)] * 200))
+        assert response.status_code == status.HTTP_201_CREATED
+        wallet.refresh_from_db()
+        assert wallet.balance == 200
+
+
+def transfer_payload(*items):
+    resources = [
+        {
+            "type": "Transfer",
+            "attributes": {
+                "source": source,
+                "destination": destination,
+                "amount": amount,
+                **({"txid": txid[0]} if txid else {}),
+            },
+        }
+        for source, destination, amount, *txid in items
+    ]
+    return {"data": resources if len(resources) > 1 else resources[0]}
+
+
+@pytest.mark.django_db
+class TestTransfers:
+    URL: str = reverse("transfer-list")
+
+    def balances(self, *wallets):
+        return tuple(Wallet.objects.get(id=wallet.id).balance for wallet in wallets)
+
+    def test_transfer(self, api_client, wallet_factory):
+        source, destination = wallet_factory(balance=10), wallet_factory(balance=0)
+        response = api_client.post(
+            self.URL, transfer_payload((source.id, destination.id, "7.5", "rent"))
+        )
+        assert response.status_code == status.HTTP_201_CREATED
+        assert self.balances(source, destination) == (Decimal("2.5"), Decimal("7.5"))
+        debit = Transaction.objects.get(id=response.data["debit"])
+        credit = Transaction.objects.get(id=response.data["credit"])
+        assert (debit.wallet_id, debit.amount, debit.txid) == (
+            source.id,
+            Decimal("-7.5"),
+            "rent.debit",
+        )
+        assert (credit.wallet_id, credit.amount, credit.txid) == (
+            destination.id,
+            Decimal("7.5"),
+            "rent.credit",
+        )
+        detail = api_client.get(reverse("transfer-detail", args=[response.data["id"]]))
+        assert detail.data["debit"] == debit.id
+
+        retry = api_client.post(
+            self.URL, transfer_payload((source.id, destination.id, "7.50", "rent"))
+        )
+        assert retry.status_code == status.HTTP_200_OK
+        assert retry.data["id"] == response.data["id"]
+        conflict = api_client.post(
+            self.URL, transfer_payload((source.id, destination.id, "1", "rent"))
+        )
+        assert conflict.status_code == status.HTTP_409_CONFLICT
+        assert self.balances(source, destination) == (Decimal("2.5"), Decimal("7.5"))
+
+    def test_rejections(self, api_client, wallet_factory):
+        source, destination = wallet_factory(balance=1), wallet_factory(balance=0)
+        for payload in (
+            (source.id, destination.id, "2"),
+            (source.id, source.id, "1"),
+            (source.id, destination.id, "-1"),
+            (source.id, 0, "1"),
+        ):
+            response = api_client.post(self.URL, transfer_payload(payload))
+            assert response.status_code == status.HTTP_400_BAD_REQUEST, payload
+        assert self.balances(source, destination) == (1, 0)
+        assert not Transaction.objects.exists()
+
+    def test_batch(self, api_client, wallet_factory):
+        a, b = wallet_factory(balance=10), wallet_factory(balance=0)
+        response = api_client.post(
+            self.URL,
+            transfer_payload((a.id, b.id, "6"), (b.id, a.id, "1"), (a.id, b.id, "6")),
+        )
+        assert response.status_code == status.HTTP_207_MULTI_STATUS
+        assert [
+            (r["status"], r.get("detail")) for r in response.data["meta"]["bulk"]
+        ] == [
+            ("created", None),
+            ("created", None),
+            ("rejected", "Insufficient balance"),
+        ]
+        assert self.balances(a, b) == (5, 5)
+        assert Transaction.objects.count() == 4
+
+
+@pytest.mark.django_db
+class TestTransactionPagination:
+    URL: str = reverse("transaction-list")
+
+    @pytest.fixture
+    def transactions(self, wallet_factory):
+        wallet = wallet_factory(balance=0)
+        # bulk_create gives every row the same created_at, exercising the id tiebreak
+        Transaction.objects.bulk_create(
+            Transaction(wallet=wallet, amount=1) for _ in range(12)
+        )
+        for _ in range(13):
+            Transaction.objects.create(wallet=wallet, amount=1)
+        return Transaction.objects.order_by("-created_at", "-id")
+
+    def walk(self, api_client, url, link):
+        pages = []
+        while url:
+            response = api_client.get(url)
+            assert response.status_code == status.HTTP_200_OK
+            pages.append([int(tx["id"]) for tx in response.data["results"]])
+            url = response.data["links"][link]
+        return pages
+
+    @pytest.mark.parametrize("ordering", ["-created_at", "created_at"])
+    def test_walk_forward_and_back(self, api_client, transactions, ordering):
+        expected = [tx.id for tx in transactions]
+        if ordering == "created_at":
+            expected.reverse()
+        url = f"{self.URL}?ordering={ordering}&page[size]=10"
+
+        pages = self.walk(api_client, url, "next")
+        assert [len(page) for page in pages] == [10, 10, 5]
+        assert sum(pages, []) == expected
+
+        last = api_client.get(url).data["links"]["next"]
+        last = api_client.get(last).data["links"]["next"]
+        back = self.walk(api_client, last, "prev")
+        assert back == pages[::-1]
+
+    def test_no_count_query(self, api_client, transactions, django_assert_num_queries):
+        with django_assert_num_queries(1):
+            response = api_client.get(self.URL)
+        assert "meta" not in response.data
+        assert response.data["links"]["prev"] is None
+
+    def test_page_number_fallback(self, api_client, transactions):
+        response = api_client.get(self.URL + "?page[number]=2")
+        assert response.status_code == status.HTTP_200_OK
+        assert response.data["meta"]["pagination"]["count"] == 25
+        assert [int(tx["id"]) for tx in response.data["results"]] == [
+            tx.id for tx in transactions[10:20]
+        ]
+        response = api_client.get(self.URL + "?ordering=amount")
+        assert response.data["meta"]["pagination"]["count"] == 25
+
+    def test_wallet_count_from_counter(
+        self, api_client, wallet_factory, django_assert_num_queries
+    ):
+        wallet = wallet_factory(balance=10)
+        for _ in range(3):
+            Transaction.objects.create(wallet=wallet, amount=1)
+        ledger.post_batch(
+            [{"wallet_id": wallet.id, "amount": Decimal(1), "txid": t} for t in "ab"]
+        )
+        api_client.delete(
+            reverse("transaction-detail", args=[Transaction.objects.first().id])
+        )
+        Transaction.objects.create(wallet=wallet_factory(balance=0), amount=1)
+
+        wallet.refresh_from_db()
+        assert wallet.transaction_count == 4
+        # the filter validating the wallet, the counter, then the page; no
+        # COUNT(*)
+        with django_assert_num_queries(3):
+            response = api_client.get(f"{self.URL}?wallet={wallet.id}&page[number]=1")
+        assert response.data["meta"]["pagination"]["count"] == 4
+        assert response.data["meta"]["pagination"]["exact"] is True
+        assert len(response.data["results"]) == 4
+
+    def test_estimated_count(self, api_client, transactions, monkeypatch):
+        monkeypatch.setattr(CountingPageNumberPagination, "exact_count_below", 1)
+        with connection.cursor() as cursor:
+            cursor.execute("ANALYZE wallet_app_transaction")
+        response = api_client.get(self.URL + "?page[number]=1")
+        assert response.data["meta"]["pagination"]["count"] == 25
+        assert response.data["meta"]["pagination"]["exact"] is False
+
+    def test_invalid_cursor(self, api_client, transactions):
+        response = api_client.get(self.URL + "?page[cursor]=garbage")
+        assert response.status_code == status.HTTP_404_NOT_FOUND
+
+
+@pytest.mark.django_db
+class TestTransactionExport:
+    URL: str = reverse("transaction-export")
+
+    @pytest.fixture
+    def transactions(self, wallet_factory):
+        wallet, other = wallet_factory(balance=0), wallet_factory(balance=0)
+        for amount in (1, 2, 3):
+            Transaction.objects.create(wallet=wallet, amount=amount)
+        Transaction.objects.create(wallet=other, amount=4)
+        return wallet.transactions.order_by("amount")
+
+    def content(self, response):
+        assert response.status_code == status.HTTP_200_OK
+        return b"".join(response.streaming_content).decode()
+
+    def test_ndjson_uses_list_filters(self, api_client, transactions):
+        wallet_id = transactions[0].wallet_id
+        response = api_client.get(f"{self.URL}?wallet={wallet_id}&ordering=amount")
+        assert response["Content-Type"] == "application/x-ndjson"
+        rows = [json.loads(line) for line in self.content(response).splitlines()]
+        listed = api_client.get(
+            reverse("transaction-list") + f"?wallet={wallet_id}&ordering=amount"
+        ).data["results"]
+        assert rows == [{**tx, "id": int(tx["id"])} for tx in listed]
+
+    def test_csv(self, api_client, transactions):
+        response = api_client.get(self.URL + "?output=csv&ordering=-amount")
+        assert response["Content-Type"] == "text/csv"
+        lines = self.content(response).splitlines()
+        assert lines[0] == "id,wallet,txid,amount,created_at"
+        assert [line.split(",")[3] for line in lines[1:]] == [
+            "4.00000000",
+            "3.00000000",
+            "2.00000000",
+            "1.00000000",
+        ]
+
+    def test_wallet_export(self, api_client, transactions):
+        wallet_id = transactions[0].wallet_id
+        response = api_client.get(reverse("wallet-export", args=[wallet_id]))
+        rows = [json.loads(line) for line in self.content(response).splitlines()]
+        assert {row["wallet"] for row in rows} == {wallet_id}
+        assert sorted(row["id"] for row in rows) == [tx.id for tx in transactions]
+
+    def test_asgi(self, api_client, transactions):
+        url = self.URL + "?output=csv&ordering=-amount"
+
+        async def export():
+            response = await AsyncClient().get(url)
+            # an async iterator is streamed as is, a sync one read in full
+            assert response.is_async
+            return b"".join([chunk async for chunk in response.streaming_content])
+
+        assert async_to_sync(export)().decode() == self.content(api_client.get(url))
+
+    def test_unknown_output(self, api_client, transactions):
+        response = api_client.get(self.URL + "?output=xml")
+        assert response.status_code == status.HTTP_400_BAD_REQUEST
+
+
+@pytest.mark.django_db
+class TestWalletRollups:
+    @pytest.fixture
+    def wallet(self, wallet_factory):
+        wallet = wallet_factory(balance=100)
+        days = [datetime(2024, 1, d, 12, tzinfo=dt_timezone.utc) for d in (30, 31)]
+        for created_at, amount in zip([*days, days[1]], (5, -2, 3)):
+            Transaction.objects.create(
+                wallet=wallet, amount=amount, created_at=created_at
+            )
+        ledger.post_batch(
+            [
+                {"wallet_id": wallet.id, "amount": Decimal(amount), "txid": txid}
+                for amount, txid in ((-4, "a"), (10, "b"))
+            ]
+        )
+        Transaction.objects.create(wallet=wallet_factory(balance=0), amount=1)
+        return wallet
+
+    def test_stats(self, api_client, wallet):
+        response = api_client.get(reverse("wallet-stats", args=[wallet.id]))
+        assert response.status_code == status.HTTP_200_OK
+        assert response.data["inflow"] == "18.00000000"
+        assert response.data["outflow"] == "6.00000000"
+        assert response.data["net"] == "12.00000000"
+        assert response.data["count"] == 5
+        assert response.data["first_day"] == "2024-01-30"
+
+        response = api_client.get(
+            reverse("wallet-stats", args=[wallet.id]) + "?filter[until]=2024-01-30"
+        )
+        assert (response.data["net"], response.data["count"]) == ("5.00000000", 1)
+
+    def test_series(self, api_client, wallet):
+        url = reverse("wallet-series", args=[wallet.id])
+        today = timezone.now().date().isoformat()
+        days = api_client.get(url).data
+        assert [(row["start"], row["net"], row["count"]) for row in days] == [
+            ("2024-01-30", "5.00000000", 1),
+            ("2024-01-31", "1.00000000", 2),
+            (today, "6.00000000", 2),
+        ]
+        months = api_client.get(url + "?bucket=month&filter[since]=2024-01-31").data
+        assert [(row["start"], row["count"]) for row in months][0] == ("2024-01-01", 2)
+
+        assert api_client.get(url + "?bucket=year").status_code == 400
+        assert api_client.get(url + "?filter[since]=soon").status_code == 400
+
+    def test_backfill(self, wallet):
+        expected = list(DailyRollup.objects.order_by("wallet", "day").values())
+        DailyRollup.objects.filter(wallet=wallet).delete()
+        DailyRollup.objects.exclude(wallet=wallet).update(count=42)
+
+        call_command("backfill_rollups", range_size=1, stderr=StringIO())
+
+        rebuilt = list(DailyRollup.objects.order_by("wallet", "day").values())
+        assert [{**row, "id": None} for row in rebuilt] == [
+            {**row, "id": None} for row in expected
+        ]
+
+
+@pytest.mark.django_db
+class TestFastRead:
+    @pytest.fixture
+    def objects(self, wallet_factory):
+        wallets = [
+            wallet_factory(label="zero", balance=0),
+            wallet_factory(label="Ünïcode \u2028 wallet", balance=Decimal("1.5")),
+            wallet_factory(balance=Decimal("123456789.12345678")),
+        ]
+        for wallet in wallets:
+            for amount in ("0.00000001", "-0.5", "7"):
+                Transaction.objects.create(wallet=wallet, amount=Decimal(amount) + 1)
+        return wallets
+
+    @pytest.mark.parametrize(
+        "url",
+        [
+            reverse("wallet-list"),
+            reverse("wallet-list") + "?ordering=-balance&page[size]=2&page[number]=2",
+            reverse("wallet-list") + "?label__icontains=wallet",
+            reverse("transaction-list"),
+            reverse("transaction-list")
+            + "?ordering=amount&page[size]=4&page[number]=2",
+            reverse("transaction-list") + "?ordering=created_at&page[size]=4",
+        ],
+    )
+    def test_list_matches_serializer(self, api_client, objects, settings, url):
+        fast = api_client.get(url)
+        settings.WALLET_FAST_READ = False
+        slow = api_client.get(url)
+        assert fast.status_code == slow.status_code == status.HTTP_200_OK
+        assert fast.content == slow.content
+        assert fast.data["results"] == slow.data["results"]
+
+    def test_retrieve_matches_serializer(self, api_client, objects, settings):
+        urls = [reverse("wallet-detail", args=[w.id]) for w in objects] + [
+            reverse("transaction-detail", args=[tx.id])
+            for tx in Transaction.objects.all()
+        ]
+        fast = [api_client.get(url).content for url in urls]
+        settings.WALLET_FAST_READ = False
+        assert fast == [api_client.get(url).content for url in urls]
+
+    def test_retrieve_missing(self, api_client):
+        url = reverse("wallet-detail", args=[0])
+        assert api_client.get(url).status_code == status.HTTP_404_NOT_FOUND
+
+
+@pytest.mark.django_db
+class TestCompoundDocuments:
+    @pytest.fixture
+    def wallets(self, wallet_factory):
+        wallets = [wallet_factory(balance=100) for _ in range(6)]
+        for wallet in wallets:
+            for amount in range(1, 4):
+                Transaction.objects.create(wallet=wallet, amount=amount)
+        return wallets
+
+    def get(self, api_client, url):
+        with CaptureQueriesContext(connection) as queries:
+            response = api_client.get(url)
+        assert response.status_code == status.HTTP_200_OK
+        return json.loads(response.content), queries.captured_queries
+
+    @pytest.mark.parametrize(
+        "url",
+        [
+            reverse("transaction-list")
+            + "?include=wallet&fields[Transaction]=amount,created_at,wallet"
+            "&fields[Wallet]=balance&page[size]={}",
+            reverse("wallet-list")
+            + "?include=transactions&fields[Transaction]=amount,created_at"
+            "&page[size]={}",
+        ],
+    )
+    def test_queries_independent_of_page_size(self, api_client, wallets, url):
+        small, small_queries = self.get(api_client, url.format(2))
+        large, large_queries = self.get(api_client, url.format(6))
+        assert (len(small["data"]), len(large["data"])) == (2, 6)
+        assert len(large["included"]) > len(small["included"])
+        assert len(small_queries) == len(large_queries)
+
+    def test_sparse_fieldset_columns(self, api_client, wallets):
+        url = reverse("transaction-list") + "?fields[Transaction]=amount,created_at"
+        document, queries = self.get(api_client, url)
+        assert {
+            name for resource in document["data"] for name in resource["attributes"]
+        } == {"amount", "created_at"}
+        (select,) = [
+            query["sql"]
+            for query in queries
+            if query["sql"].startswith("SELECT")
+            and f'FROM "{partitions.TABLE}"' in query["sql"]
+        ]
+        assert '"amount"' in select and '"txid"' not in select
+
+    def test_included_transactions_bounded(self, api_client, wallets, monkeypatch):
+        monkeypatch.setattr(WalletViewSet, "included_transactions", 2)
+        wallet = wallets[0]
+        url = reverse("wallet-detail", args=[wallet.id]) + "?include=transactions"
+        document, _ = self.get(api_client, url)
+        latest = wallet.transactions.order_by("-created_at", "-id")[:2]
+        expected = [{"type": "Transaction", "id": str(tx.id)} for tx in latest]
+        assert document["data"]["relationships"]["transactions"]["data"] == expected
+        # the renderer sorts included resources by type and id
+        assert {
+            (resource["type"], resource["id"]) for resource in document["included"]
+        } == {(identifier["type"], identifier["id"]) for identifier in expected}
+
+    def test_unsupported_include(self, api_client, wallets):
+        url = reverse("transaction-list") + "?include=transfers"
+        assert api_client.get(url).status_code == status.HTTP_400_BAD_REQUEST
+
+
+@pytest.mark.django_db
+class TestWalletConditionalGet:
+    @pytest.fixture(autouse=True)
+    def clear_wallet_cache(self, shared_wallet_cache):
+        wallet_cache.hits = wallet_cache.misses = 0
+
+    def post_transaction(self, api_client, wallet, amount):
+        response = api_client.post(
+            reverse("transaction-list"),
+            {
+                "data": {
+                    "type": "Transaction",
+                    "attributes": {"amount": amount, "wallet": wallet.id},
+                }
+            },
+        )
+        assert response.status_code == status.HTTP_201_CREATED
+
+    def test_detail_not_modified_from_cache(
+        self, api_client, wallets, django_assert_num_queries
+    ):
+        url = reverse("wallet-detail", args=[wallets[0].id])
+        first = api_client.get(url)
+        assert first.status_code == status.HTTP_200_OK
+        assert first["ETag"] and first["Last-Modified"]
+
+        with django_assert_num_queries(0):
+            cached = api_client.get(url)
+            revalidated = api_client.get(url, HTTP_IF_NONE_MATCH=first["ETag"])
+        assert cached.content == first.content
+        assert revalidated.status_code == status.HTTP_304_NOT_MODIFIED
+        assert revalidated["ETag"] == first["ETag"]
+        assert wallet_cache.stats() == {"hits": 2, "misses": 1}
+
+    @pytest.mark.parametrize(
+        "posting_mode", [POSTING_MODE_SELECT_FOR_UPDATE, POSTING_MODE_ATOMIC_UPDATE]
+    )
+    def test_posting_invalidates(
+        self,
+        api_client,
+        wallets,
+        settings,
+        posting_mode,
+        django_capture_on_commit_callbacks,
+    ):
+        settings.WALLET_POSTING_MODE = posting_mode
+        url = reverse("wallet-detail", args=[wallets[0].id])
+        first = api_client.get(url)
+        with django_capture_on_commit_callbacks(execute=True):
+            self.post_transaction(api_client, wallets[0], 5)
+
+        response = api_client.get(url, HTTP_IF_NONE_MATCH=first["ETag"])
+        assert response.status_code == status.HTTP_200_OK
+        assert response["ETag"] != first["ETag"]
+        assert Decimal(response.data["balance"]) == Decimal("105")
+
+    def test_wallet_update_invalidates(self, api_client, wallets):
+        url = reverse("wallet-detail", args=[wallets[0].id])
+        api_client.get(url)
+        response = api_client.patch(
+            url,
+            {
+                "data": {
+                    "type": "Wallet",
+                    "id": wallets[0].id,
+                    "attributes": {"label": "renamed"},
+                }
+            },
+        )
+        assert response.status_code == status.HTTP_200_OK
+        assert api_client.get(url).data["label"] == "renamed"
+
+    def test_list_counts_once(self, api_client, wallets, django_assert_num_queries):
+        url = reverse("wallet-list") + "?balance__gt=150"
+        # the validators' aggregate, whose count the page reuses, then the page
+        with django_assert_num_queries(2):
+            response = api_client.get(url)
+        assert response.data["meta"]["pagination"]["count"] == 2
+        assert len(response.data["results"]) == 2
+
+    def test_list_not_modified(self, api_client, wallets):
+        url = reverse("wallet-list") + "?balance__gt=150"
+        first = api_client.get(url)
+        response = api_client.get(url, HTTP_IF_NONE_MATCH=first["ETag"])
+        assert response.status_code == status.HTTP_304_NOT_MODIFIED
+
+        self.post_transaction(api_client, wallets[1], 1)
+        response = api_client.get(url, HTTP_IF_NONE_MATCH=first["ETag"])
+        assert response.status_code == status.HTTP_200_OK
+        assert len(response.data["results"]) == 2
+
+
+@pytest.mark.django_db
+class TestAsyncViews:
+    URL: str = reverse("async-transaction-create")
+
+    @pytest.fixture(autouse=True)
+    def clear_caches(self, shared_wallet_cache):
+        recent_transactions.clear()
+        yield
+        recent_transactions.clear()
+
+    def post(self, api_client, wallet_id, amount, txid=None):
+        attributes = {"amount": amount}
+        if txid is not None:
+            attributes["txid"] = txid
+        document = {
+            "data": {
+                "type": "Transaction",
+                "attributes": attributes,
+                "relationships": {
+                    "wallet": {"data": {"type": "Wallet", "id": str(wallet_id)}}
+                },
+            }
+        }
+        return api_client.post(
+            self.URL, json.dumps(document), content_type="application/vnd.api+json"
+        )
+
+    def test_wallet_detail_matches_sync_view(self, api_client, wallets):
+        sync = api_client.get(reverse("wallet-detail", args=[wallets[0].id]))
+        wallet_cache.cache.clear()
+        url = reverse("async-wallet-detail", args=[wallets[0].id])
+        response = api_client.get(url)
+        assert response.status_code == status.HTTP_200_OK
+        assert response.content == sync.content
+        assert response["ETag"] == sync["ETag"]
+
+        revalidated = api_client.get(url, HTTP_IF_NONE_MATCH=response["ETag"])
+        assert revalidated.status_code == status.HTTP_304_NOT_MODIFIED
+
+    def test_wallet_detail_not_found(self, api_client):
+        response = api_client.get(reverse("async-wallet-detail", args=[0]))
+        assert response.status_code == status.HTTP_404_NOT_FOUND
+        assert response.json()["errors"][0]["status"] == "404"
+
+    def test_create_transaction(self, api_client, wallet_factory):
+        wallet = wallet_factory(balance=10)
+        response = self.post(api_client, wallet.id, "-2.5")
+        assert response.status_code == status.HTTP_201_CREATED
+        tx_id = response.json()["data"]["id"]
+        sync = api_client.get(reverse("transaction-detail", args=[tx_id]))
+        assert response.content == sync.content
+        wallet.refresh_from_db()
+        assert wallet.balance == Decimal("7.5")
+
+    def test_retry_and_conflict(self, api_client, wallet_factory):
+        wallet = wallet_factory(balance=0)
+        first = self.post(api_client, wallet.id, "4", txid="async-retried")
+        assert first.status_code == status.HTTP_201_CREATED
+        retry = self.post(api_client, wallet.id, "4.0", txid="async-retried")
+        assert retry.status_code == status.HTTP_200_OK
+        assert retry.content == first.content
+        conflict = self.post(api_client, wallet.id, "5", txid="async-retried")
+        assert conflict.status_code == status.HTTP_409_CONFLICT
+        wallet.refresh_from_db()
+        assert wallet.balance == 4
+
+    @pytest.mark.parametrize(
+        "wallet_id, amount, pointer",
+        [
+            (None, "-1", "/data"),
+            (0, "1", "/data/relationships/wallet"),
+            (None, "abc", "/data/attributes/amount"),
+        ],
+    )
+    def test_rejected(self, api_client, wallet_factory, wallet_id, amount, pointer):
+        wallet = wallet_factory(balance=0)
+        response = self.post(
+            api_client, wallet.id if wallet_id is None else wallet_id, amount
+        )
+        assert response.status_code == status.HTTP_400_BAD_REQUEST
+        assert response.json()["errors"][0]["source"]["pointer"] == pointer
+        assert not Transaction.objects.exists()
+
+
+@pytest.mark.django_db(transaction=True)
+class TestWalletEvents:
+    """Notifications are only delivered on commit, hence transaction=True."""
+
+    @pytest.fixture(autouse=True)
+    def feed(self, settings):
+        settings.WALLET_EVENTS = True
+
+    def read(self, wallet, count, post=None, **headers):
+        """
+        Read ``count`` events off the wallet's stream, running ``post`` once
+        subscribed; returns ``(event id, data)`` pairs.
+        """
+
+        async def read():
+            response = await AsyncClient().get(
+                reverse("wallet-events", args=[wallet.id]), headers=headers
+            )
+            assert response["Content-Type"] == "text/event-stream"
+            stream = aiter(response.streaming_content)
+            frames = []
+            try:
+                if post is not None:
+                    await sync_to_async(post)()
+                while len(frames) < count:
+                    frames.append(await asyncio.wait_for(anext(stream), 10))
+            finally:
+                await events.hub.stop()
+            return frames
+
+        parsed = []
+        for frame in async_to_sync(read)():
+            lines = dict(
+                line.split(": ", 1) for line in frame.decode().strip().splitlines()
+            )
+            assert lines["event"] == "transaction"
+            parsed.append((int(lines["id"]), json.loads(lines["data"])))
+        return parsed
+
+    def test_replay_then_live(self, wallet_factory):
+        wallet = wallet_factory(balance=10)
+        seen = Transaction.objects.create(wallet=wallet, amount=1)
+        missed = Transaction.objects.create(wallet=wallet, amount=2, txid="missed")
+
+        [replayed, live] = self.read(
+            wallet,
+            2,
+            post=lambda: Transaction.objects.create(
+                wallet=wallet, amount=Decimal("-4.5"), txid="live"
+            ),
+            **{"Last-Event-ID": str(seen.id)},
+        )
+        assert replayed == (
+            missed.id,
+            {
+                "id": missed.id,
+                "wallet": wallet.id,
+                "txid": "missed",
+                "amount": "2.00000000",
+                "balance": "13.00000000",
+            },
+        )
+        assert live[0] == Transaction.objects.get(txid="live").id
+        assert (live[1]["amount"], live[1]["balance"]) == ("-4.50000000", "8.50000000")
+
+    def test_bulk_postings(self, wallet_factory):
+        wallet = wallet_factory(balance=0)
+        frames = self.read(
+            wallet,
+            2,
+            post=lambda: ledger.post_batch(
+                [
+                    {"wallet_id": wallet.id, "amount": Decimal(3), "txid": "a"},
+                    {"wallet_id": wallet.id, "amount": Decimal(-1), "txid": "b"},
+                ]
+            ),
+        )
+        assert [(data["txid"], data["balance"]) for _, data in frames] == [
+            ("a", "3.00000000"),
+            ("b", "2.00000000"),
+        ]
+
+    def test_rejected(self, api_client, wallet_factory):
+        wallet = wallet_factory(balance=0)
+        url = reverse("wallet-events", args=[wallet.id])
+        # a WSGI worker can't hold the stream open
+        assert api_client.get(url).status_code == 501
+
+        async def get(url, **headers):
+            return (await AsyncClient().get(url, headers=headers)).status_code
+
+        assert async_to_sync(get)(url, **{"Last-Event-ID": "x"}) == 400
+        assert async_to_sync(get)(reverse("wallet-events", args=[0])) == 404
+
+
+@pytest.mark.django_db
+class TestWalletDeletion:
+    def test_chunked_deletion(self, api_client, wallet_factory):
+        wallet, other = wallet_factory(balance=100), wallet_factory(balance=0)
+        for amount in range(1, 6):
+            Transaction.objects.create(wallet=wallet, amount=amount)
+        api_client.post(
+            reverse("transfer-list"), transfer_payload((wallet.id, other.id, 1))
+        )
+        txids = list(wallet.transactions.values_list("txid", flat=True))
+
+        response = api_client.delete(reverse("wallet-detail", args=[wallet.id]))
+        assert response.status_code == status.HTTP_202_ACCEPTED
+        assert response.json()["data"]["type"] == "WalletDeletion"
+        assert (response.data["status"], response.data["transactions"]) == (
+            "pending",
+            6,
+        )
+        # hidden at once, long before its rows are gone
+        assert (
+            api_client.get(reverse("wallet-detail", args=[wallet.id])).status_code
+            == 404
+        )
+        assert [
+            w["id"] for w in api_client.get(reverse("wallet-list")).data["results"]
+        ] == [other.id]
+        assert (
+            api_client.delete(reverse("wallet-detail", args=[wallet.id])).status_code
+            == 404
+        )
+        assert ledger.post_batch(
+            [{"wallet_id": wallet.id, "amount": 1, "txid": "late"}]
+        ) == [(None, ledger.WALLET_NOT_FOUND)]
+
+        purge.process(chunk_size=4)
+        progress = api_client.get(response["Location"]).data
+        assert (progress["status"], progress["deleted"]) == ("pending", 4)
+
+        call_command("purge_wallets", once=True, chunk_size=4, stderr=StringIO())
+        progress = api_client.get(response["Location"]).data
+        assert (progress["status"], progress["deleted"]) == ("done", 6)
+        assert progress["finished_at"] is not None
+        assert not Wallet.objects.filter(id=wallet.id).exists()
+        assert not DailyRollup.objects.filter(wallet_id=wallet.id).exists()
+        assert not TransactionTxid.objects.filter(txid__in=txids).exists()
+        # the other side of the transfer keeps its credit
+        other.refresh_from_db()
+        assert (other.balance, other.transactions.count()) == (1, 1)
+
+    @pytest.mark.parametrize("purged", [False, True])
+    @pytest.mark.parametrize(
+        "posting_mode", [POSTING_MODE_SELECT_FOR_UPDATE, POSTING_MODE_ATOMIC_UPDATE]
+    )
+    def test_deleted_after_validation(
+        self, api_client, wallet_factory, settings, monkeypatch, posting_mode, purged
+    ):
+        settings.WALLET_POSTING_MODE = posting_mode
+        wallet = wallet_factory(balance=10)
+        perform_create = TransactionViewSet.perform_create
+
+        def deleted_before_save(view, serializer):
+            purge.schedule(wallet)
+            while purged and purge.process().status != WalletDeletion.DONE:
+                pass
+            perform_create(view, serializer)
+
+        monkeypatch.setattr(TransactionViewSet, "perform_create", deleted_before_save)
+        response = api_client.post(
+            reverse("transaction-list"),
+            {
+                "data": {
+                    "type": "Transaction",
+                    "attributes": {"amount": 1, "wallet": wallet.id},
+                }
+            },
+        )
+        assert response.status_code == status.HTTP_400_BAD_REQUEST
+        assert response.json()["errors"][0]["source"] == {
+            "pointer": "/data/relationships/wallet"
+        }
+        assert not Transaction.objects.exists()
+        if not purged:
+            wallet.refresh_from_db()
+            assert (wallet.balance, wallet.transaction_count) == (10, 0)
+            assert WalletDeletion.objects.get(wallet_id=wallet.id).transactions == 0
+
+    def test_nothing_to_purge(self):
+        assert purge.process() is None
+
+
+@pytest.mark.django_db
+class TestPostingQueue:
+    URL: str = reverse("transaction-list")
+
+    @pytest.fixture(autouse=True)
+    def queue(self, settings):
+        settings.WALLET_POSTING_QUEUE = True
+        recent_transactions.clear()
+        yield
+        recent_transactions.clear()
+
+    def post(self, api_client, wallet, amount, txid=None):
+        attributes = {"amount": amount, "wallet": wallet.id}
+        if txid is not None:
+            attributes["txid"] = txid
+        return api_client.post(
+            self.URL, {"data": {"type": "Transaction", "attributes": attributes}}
+        )
+
+    def work(self):
+        call_command("run_posting_worker", once=True, stderr=StringIO())
+
+    def test_queued_posting(self, api_client, wallet_factory):
+        wallet = wallet_factory(balance=10)
+        response = self.post(api_client, wallet, "-6", txid="queued")
+        assert response.status_code == status.HTTP_202_ACCEPTED
+        assert response.json()["data"]["type"] == "Posting"
+        assert response.data["status"] == QueuedPosting.PENDING
+        overdraft = self.post(api_client, wallet, "-6")
+        wallet.refresh_from_db()
+        assert wallet.balance == 10
+        assert not Transaction.objects.exists()
+
+        self.work()
+
+        posting = api_client.get(response["Location"]).data
+        assert posting["status"] == QueuedPosting.ACCEPTED
+        assert Transaction.objects.get(id=posting["transaction"]).txid == "queued"
+        rejected = api_client.get(overdraft["Location"]).data
+        assert (rejected["status"], rejected["detail"]) == (
+            QueuedPosting.REJECTED,
+            "Insufficient balance",
+        )
+        wallet.refresh_from_db()
+        assert wallet.balance == 4
+        # once applied, retries are answered with the transaction itself
+        assert self.post(api_client, wallet, "-6", txid="queued").status_code == 200
+
+    def test_retry_while_queued(self, api_client, wallet_factory):
+        wallet = wallet_factory(balance=10)
+        first = self.post(api_client, wallet, "1", txid="retried")
+        retry = self.post(api_client, wallet, "1", txid="retried")
+        assert retry.status_code == status.HTTP_202_ACCEPTED
+        assert retry.data["id"] == first.data["id"]
+        conflict = self.post(api_client, wallet, "2", txid="retried")
+        assert conflict.status_code == status.HTTP_409_CONFLICT
+        assert QueuedPosting.objects.count() == 1
+
+    def test_async_endpoint(self, api_client, wallet_factory):
+        wallet = wallet_factory(balance=0)
+        response = TestAsyncViews().post(api_client, wallet.id, "5", txid="async")
+        assert response.status_code == status.HTTP_202_ACCEPTED
+        assert response.json()["data"]["attributes"]["status"] == "pending"
+        self.work()
+        wallet.refresh_from_db()
+        assert wallet.balance == 5
+
+
+@pytest.mark.django_db(transaction=True)
+class TestPostingWorkers:
+    """Workers in threads of their own, each with its own connection."""
+
+    def test_concurrent_workers(self, wallet_factory):
+        wallets = [wallet_factory(balance=0) for _ in range(4)]
+        for wallet in wallets:
+            outbox.enqueue(
+                {"wallet_id": wallet.id, "amount": Decimal(1), "txid": str(wallet.id)}
+            )
+        claimed, release = threading.Event(), threading.Event()
+
+        def hold():
+            """A worker stuck between its claim and its commit."""
+            try:
+                with transaction.atomic():
+                    postings = outbox.claim(2)
+                    claimed.set()
+                    release.wait(10)
+                return {posting.wallet_id for posting in postings}
+            finally:
+                connection.close()
+
+        with concurrent.futures.ThreadPoolExecutor(max_workers=1) as executor:
+            held = executor.submit(hold)
+            assert claimed.wait(10)
+            try:
+                # the oldest postings are taken, the next ones are not
+                assert outbox.process(2) == 2
+            finally:
+                release.set()
+            assert held.result() == {wallets[0].id, wallets[1].id}
+        # the postings of the first worker were released with its transaction
+        assert outbox.process(2) == 2
+        assert not QueuedPosting.objects.filter(status=QueuedPosting.PENDING).exists()
+        assert {wallet.balance for wallet in Wallet.objects.all()} == {1}
+
+
+@pytest.mark.django_db(transaction=True, databases=["default", "replica"])
+class TestReplicaRouting:
+    """
+    The test replica is a separate database that never receives writes.
+    Reads inside an atomic block stay on the primary, hence transaction=True.
+    """
+
+    @pytest.fixture(autouse=True)
+    def replica_reads(self, settings, shared_wallet_cache):
+        settings.WALLET_REPLICA_READS = True
+
+    def test_safe_reads_use_replica(self, api_client, wallets):
+        response = api_client.get(reverse("wallet-list"))
+        assert response.status_code == status.HTTP_200_OK
+        assert response.data["results"] == []
+        detail = api_client.get(reverse("wallet-detail", args=[wallets[0].id]))
+        assert detail.status_code == status.HTTP_404_NOT_FOUND
+
+    def test_writer_reads_own_writes(self, api_client, wallets):
+        response = api_client.post(
+            reverse("transaction-list"),
+            {
+                "data": {
+                    "type": "Transaction",
+                    "attributes": {"amount": 5, "wallet": wallets[0].id},
+                }
+            },
+        )
+        assert response.status_code == status.HTTP_201_CREATED
+        assert PIN_COOKIE in response.cookies
+
+        detail = api_client.get(reverse("wallet-detail", args=[wallets[0].id]))
+        assert Decimal(detail.data["balance"]) == Decimal("105")
+        # other clients keep reading the replica
+        other = APIClient().get(reverse("transaction-list"))
+        assert other.data["results"] == []
+
+    def test_replica_reads_are_not_cached(self, api_client, wallets):
+        Wallet.objects.using("replica").create(
+            id=wallets[0].id, label="stale", balance=0
+        )
+        url = reverse("wallet-detail", args=[wallets[0].id])
+        assert api_client.get(url).data["label"] == "stale"
+        api_client.cookies[PIN_COOKIE] = "1"
+        assert api_client.get(url).data["label"] == wallets[0].label
+
+
+@pytest.mark.django_db
+class TestMetrics:
+    @pytest.fixture(autouse=True)
+    def enable_metrics(self, settings):
+        settings.WALLET_METRICS = True
+        metrics.reset()
+        yield
+        metrics.reset()
+
+    def scrape(self, api_client):
+        response = api_client.get(reverse("metrics"))
+        assert response.status_code == status.HTTP_200_OK
+        assert response["Content-Type"].startswith("text/plain; version=0.0.4")
+        return dict(
+            line.rsplit(" ", 1)
+            for line in response.content.decode().splitlines()
+            if not line.startswith("#")
+        )
+
+    def test_records_per_route(self, api_client, wallets):
+        url = reverse("transaction-list")
+        for amount in (50, -1000):
+            api_client.post(
+                url,
+                {
+                    "data": {
+                        "type": "Transaction",
+                        "attributes": {"amount": amount, "wallet": wallets[0].id},
+                    }
+                },
+            )
+        api_client.get(reverse("wallet-list"))
+
+        samples = self.scrape(api_client)
+        route = 'route="transaction-list"'
+        assert (
+            samples[
+                "wallet_http_request_duration_seconds_count"
+                f'{{{route},method="POST",status="201"}}'
+            ]
+            == "1"
+        )
+        assert samples[f"wallet_lock_wait_seconds_count{{{route}}}"] == "2"
+        assert samples[f"wallet_insufficient_balance_total{{{route}}}"] == "1"
+        assert int(samples[f"wallet_db_queries_per_request_sum{{{route}}}"]) > 0
+        assert 'wallet_http_render_duration_seconds_count{route="wallet-list"}' in (
+            samples
+        )
+
+    def test_disabled(self, api_client, settings):
+        settings.WALLET_METRICS = False
+        api_client.get(reverse("wallet-list"))
+        assert api_client.get(reverse("metrics")).status_code == 404
+        assert metrics.render().count("_count") == 0
+
+
+SEQ_SCAN = re.compile(r"Seq Scan on (\w+)")
+
+
+def list_query(viewset_class, params, page_size=10):
+    """The page query a list request with ``params`` would run."""
+    request = Request(APIRequestFactory().get("/", params))
+    view = viewset_class(request=request, format_kwarg=None, action="list", kwargs={})
+    return view.filter_queryset(view.get_queryset())[:page_size]
+
+
+def filter_params(viewset_class):
+    fields = viewset_class.filterset_fields
+    if isinstance(fields, (list, tuple)):
+        fields = {field: ["exact"] for field in fields}
+    for field, lookups in fields.items():
+        for lookup in lookups:
+            yield field if lookup == "exact" else f"{field}__{lookup}"
+    if getattr(viewset_class, "search_fields", None):
+        yield api_settings.SEARCH_PARAM
+    if getattr(viewset_class, "similarity_field", None):
+        yield TrigramSimilarityFilter.similarity_param
+
+
+@pytest.mark.django_db
+class TestQueryPlans:
+    WALLETS = 100_000
+    TRANSACTIONS = 200_000
+
+    @pytest.fixture
+    def sample_values(self):
+        with connection.cursor() as cursor:
+            cursor.execute(
+                "INSERT INTO wallet_app_wallet (label, balance, created_at, updated_at) "
+                "SELECT 'wallet-' || i, (i %% 1000) * 10.5, "
+                "now() - i * interval '1 second', now() "
+                "FROM generate_series(1, %s) i",
+                [self.WALLETS],
+            )
+            cursor.execute(
+                "INSERT INTO wallet_app_transaction (wallet_id, txid, amount, created_at) "
+                "SELECT w.first + i %% %s, 'tx-' || i, i %% 200 - 100, "
+                "now() - i * interval '1 second' "
+                "FROM generate_series(1, %s) i, "
+                "(SELECT min(id) AS first FROM wallet_app_wallet) w",
+                [self.WALLETS, self.TRANSACTIONS],
+            )
+            cursor.execute("ANALYZE wallet_app_wallet")
+            cursor.execute("ANALYZE wallet_app_transaction")
+        wallet_id = Wallet.objects.order_by("id").values_list("id", flat=True)[42]
+        return {
+            "id": wallet_id,
+            "label": "wallet-42",
+            "label__icontains": "t-424",
+            api_settings.SEARCH_PARAM: "t-424",
+            TrigramSimilarityFilter.similarity_param: "4242",
+            "balance": "105",
+            "balance__gt": "9000",
+            "balance__lt": "100",
+            "wallet": wallet_id,
+            "txid": "tx-42",
+        }
+
+    @pytest.mark.parametrize("viewset_class", [WalletViewSet, TransactionViewSet])
+    def test_list_queries_use_indexes(self, viewset_class, sample_values, empty):
+        filters = [None, *filter_params(viewset_class)]
+        orderings = [
+            None,
+            *viewset_class.ordering_fields,
+            *(f"-{field}" for field in viewset_class.ordering_fields),
+        ]
+        seq_scans = []
+        for param, ordering in itertools.product(filters, orderings):
+            params = {param: sample_values[param]} if param else {}
+            if ordering:
+                params["ordering"] = ordering
+            plan = list_query(viewset_class, params).explain()
+            if any(name not in empty for name in SEQ_SCAN.findall(plan)):
+                seq_scans.append(f"{params}:\n{plan}")
+        assert not seq_scans, "\n\n".join(seq_scans)
+
+    @pytest.fixture
+    def empty(self, sample_values):
+        """Relations the planner knows to be empty, e.g. future partitions."""
+        with connection.cursor() as cursor:
+            cursor.execute(
+                "SELECT relname FROM pg_class WHERE relname LIKE %s AND reltuples <= 0",
+                [f"{partitions.TABLE}_%"],
+            )
+            return {name for (name,) in cursor.fetchall()}
+
+
+@pytest.mark.django_db
+class TestReconcileBalances:
+    def reconcile(self, **options):
+        out, err = StringIO(), StringIO()
+        call_command("reconcile_balances", workers=1, stdout=out, stderr=err, **options)
+        assert "rows/s" in err.getvalue()
+        return [json.loads(line) for line in out.getvalue().splitlines()]
+
+    def test_reports_and_fixes_mismatches(self, wallet_factory):
+        consistent = wallet_factory(balance=0)
+        Transaction.objects.create(wallet=consistent, amount=5)
+        drifted = wallet_factory(balance=0)
+        Transaction.objects.create(wallet=drifted, amount=7)
+        Wallet.objects.filter(id=drifted.id).update(balance=10)
+        overdrawn = wallet_factory(balance=1)
+        Transaction.objects.bulk_create([Transaction(wallet=overdrawn, amount=-1)])
+
+        mismatches = self.reconcile(range_size=1)
+        assert [(m["wallet"], Decimal(m["difference"])) for m in mismatches] == [
+            (drifted.id, 3),
+            (overdrawn.id, 2),
+        ]
+        assert Decimal(mismatches[0]["ledger"]) == 7
+
+        fixed = self.reconcile(fix=True)
+        assert [(m["wallet"], m["fixed"]) for m in fixed] == [
+            (drifted.id, True),
+            (overdrawn.id, False),
+        ]
+        drifted.refresh_from_db()
+        assert drifted.balance == 7
+        assert [m["wallet"] for m in self.reconcile()] == [overdrawn.id]
+
+    def test_skips_wallets_being_deleted(self, wallet_factory):
+        wallet = wallet_factory(balance=0)
+        for amount in (1, 2, 3):
+            Transaction.objects.create(wallet=wallet, amount=amount)
+        purge.schedule(wallet)
+        purge.process(chunk_size=2)
+
+        assert self.reconcile(fix=True) == []
+        wallet.refresh_from_db()
+        assert (wallet.balance, wallet.transaction_count) == (6, 3)
+
+
+@pytest.mark.django_db
+class TestOpenAPISchema:
+    URL: str = reverse("openapi-schema")
+
+    @pytest.fixture(autouse=True)
+    def clear_document(self):
+        openapi.document.cache_clear()
+        yield
+        openapi.document.cache_clear()
+
+    def test_served_with_etag(self, api_client):
+        response = api_client.get(self.URL)
+        assert response.status_code == status.HTTP_200_OK
+        assert "/wallets/" in json.loads(response.content)["paths"]
+        again = api_client.get(self.URL, HTTP_IF_NONE_MATCH=response["ETag"])
+        assert again.status_code == status.HTTP_304_NOT_MODIFIED
+        assert again["ETag"] == response["ETag"]
+
+    def test_served_from_file(self, api_client, settings, tmp_path):
+        path = tmp_path / "openapi.json"
+        call_command("generate_openapi", output=str(path), stderr=StringIO())
+        assert path.read_bytes() == openapi.generate()
+
+        path.write_bytes(b'{"openapi": "3.0.2"}')
+        settings.WALLET_OPENAPI_SCHEMA = str(path)
+        assert api_client.get(self.URL).content == b'{"openapi": "3.0.2"}'
+
+
+@pytest.mark.django_db
+class TestImportTransactions:
+    def run(self, tmp_path, name, content, **options):
+        path = tmp_path / name
+        path.write_text(content)
+        out, err = StringIO(), StringIO()
+        call_command(
+            "import_transactions", str(path), stdout=out, stderr=err, **options
+        )
+        assert "rows/s" in err.getvalue()
+        return [json.loads(line) for line in out.getvalue().splitlines()]
+
+    def test_csv(self, tmp_path, wallet_factory):
+        wallet, overdrawn = wallet_factory(balance=10), wallet_factory(balance=1)
+        Transaction.objects.create(wallet=wallet, txid="taken", amount=1)
+        rows = [
+            f"{wallet.id},a,5,2024-01-02T03:04:05Z",
+            f"{wallet.id},,-2.5,",
+            f"{wallet.id},a,1,",
+            f"{wallet.id},taken,1,",
+            f"{overdrawn.id},b,-2,",
+            f"{overdrawn.id},c,0.5,",
+            "999999,d,1,",
+            f"{wallet.id},e,0.000000001,",
+        ]
+        content = "wallet,txid,amount,created_at\n" + "\n".join(rows) + "\n"
+
+        rejected = self.run(tmp_path, "ledger.csv", content, chunk_size=1)
+        assert [(r["row"], r["error"]) for r in rejected] == [
+            (3, "Duplicate txid in file"),
+            (4, "txid already exists"),
+            (5, "Insufficient balance"),
+            (6, "Insufficient balance"),
+            (7, "Wallet not found"),
+            (8, "amount must have at most 10 integer digits and 8 decimal places"),
+        ]
+        wallet.refresh_from_db()
+        overdrawn.refresh_from_db()
+        assert (wallet.balance, wallet.transaction_count) == (Decimal("13.5"), 3)
+        assert (overdrawn.balance, overdrawn.transaction_count) == (1, 0)
+        imported = Transaction.objects.get(txid="a")
+        assert imported.created_at == datetime(
+            2024, 1, 2, 3, 4, 5, tzinfo=dt_timezone.utc
+        )
+        assert TransactionTxid.objects.filter(txid="a").exists()
+        assert DailyRollup.objects.get(wallet=wallet, day="2024-01-02").inflow == 5
+
+    def test_ndjson(self, tmp_path, wallet_factory):
+        wallet = wallet_factory(balance=0)
+        lines = [
+            {"wallet": wallet.id, "txid": "x", "amount": 2.25},
+            {"wallet": wallet.id, "amount": "-1"},
+        ]
+        content = "\n".join(json.dumps(line) for line in lines)
+        assert self.run(tmp_path, "ledger.ndjson", content) == []
+        wallet.refresh_from_db()
+        assert wallet.balance == Decimal("1.25")
+        assert wallet.transactions.count() == 2
+
+    def test_dry_run(self, tmp_path, wallet_factory):
+        wallet = wallet_factory(balance=0)
+        content = f"wallet,amount\n{wallet.id},3\n"
+        assert self.run(tmp_path, "ledger.csv", content, dry_run=True) == []
+        wallet.refresh_from_db()
+        assert wallet.balance == 0
+        assert not wallet.transactions.exists()
+
+    def test_unknown_column(self, tmp_path):
+        with pytest.raises(CommandError, match="Unknown CSV columns: memo"):
+            self.run(tmp_path, "ledger.csv", "wallet,amount,memo\n1,1,x\n")
+
+
+@pytest.mark.django_db
+class TestFixedPointStorage:
+    @pytest.fixture(
+        autouse=True,
+        params=[POSTING_MODE_SELECT_FOR_UPDATE, POSTING_MODE_ATOMIC_UPDATE],
+    )
+    def fixed_point(self, request, settings):
+        settings.WALLET_POSTING_MODE = request.param
+        settings.WALLET_FIXED_POINT = True
+        self.convert()
+
+    def convert(self):
+        out = StringIO()
+        call_command("convert_amount_storage", stdout=out, stderr=StringIO())
+        return out.getvalue().split()
+
+    def post(self, api_client, wallet, amount):
+        return api_client.post(
+            reverse("transaction-list"),
+            {
+                "data": {
+                    "type": "Transaction",
+                    "attributes": {"amount": amount, "wallet": wallet.id},
+                }
+            },
+        )
+
+    def test_stores_units(self, api_client, wallet_factory):
+        assert set(fields.column_types(connection).values()) == {"bigint"}
+        wallet = wallet_factory(balance=10)
+        response = self.post(api_client, wallet, "1.25")
+        assert response.status_code == 201
+        assert Decimal(response.data["amount"]) == Decimal("1.25")
+
+        with connection.cursor() as cursor:
+            cursor.execute(
+                "SELECT balance FROM wallet_app_wallet WHERE id = %s", [wallet.id]
+            )
+            assert cursor.fetchone() == (1125000000,)
+        wallet.refresh_from_db()
+        assert wallet.balance == Decimal("11.25")
+        detail = api_client.get(reverse("wallet-detail", args=[wallet.id]))
+        assert Decimal(detail.data["balance"]) == Decimal("11.25")
+        assert Transaction.objects.filter(amount__gt=Decimal("1.2")).count() == 1
+
+    def test_non_negative_balance(self, api_client, wallet_factory):
+        wallet = wallet_factory(balance=1)
+        assert self.post(api_client, wallet, "-1.00000001").status_code == 400
+        assert self.post(api_client, wallet, "-1").status_code == 201
+        with pytest.raises(IntegrityError, match=BALANCE_CONSTRAINT_NAME):
+            Wallet.objects.filter(id=wallet.id).update(balance=Decimal("-0.00000001"))
+
+    def test_aggregates(self, api_client, wallet_factory):
+        wallet = wallet_factory(balance=0)
+        for amount in ["2.5", "-0.75", "0.00000001"]:
+            assert self.post(api_client, wallet, amount).status_code == 201
+        rollup = DailyRollup.objects.get(wallet=wallet)
+        assert (rollup.inflow, rollup.outflow) == (
+            Decimal("2.50000001"),
+            Decimal("0.75"),
+        )
+
+        call_command("backfill_rollups", stderr=StringIO())
+        # the backfill replaces the rollup rows
+        rollup = DailyRollup.objects.get(wallet=wallet)
+        assert (rollup.inflow, rollup.outflow) == (
+            Decimal("2.50000001"),
+            Decimal("0.75"),
+        )
+        out = StringIO()
+        call_command("reconcile_balances", workers=1, stdout=out, stderr=StringIO())
+        assert out.getvalue() == ""
+
+    def test_convert_back(self, settings, wallet_factory):
+        wallet = wallet_factory(balance=Decimal("12.34567891"))
+        settings.WALLET_FIXED_POINT = False
+        assert fields.check_storage(databases=["default"]) != []
+
+        assert sorted(self.convert()) == [
+            "wallet_app_queuedposting.amount",
+            "wallet_app_transaction.amount",
+            "wallet_app_transfer.amount",
+            "wallet_app_wallet.balance",
+        ]
+        assert set(fields.column_types(connection).values()) == {"numeric"}
+        assert fields.check_storage(databases=["default"]) == []
+        wallet.refresh_from_db()
+        assert wallet.balance == Decimal("12.34567891")
+
+
+@pytest.mark.django_db
+class TestTransactionPartitions:
+    def partitions(self):
+        with connection.cursor() as cursor:
+            return partitions.list_partitions(cursor)
+
+    def partition_of(self, tx):
+        with connection.cursor() as cursor:
+            cursor.execute(
+                f"SELECT tableoid::regclass::text FROM {partitions.TABLE} WHERE id = %s",
+                [tx.id],
+            )
+            return cursor.fetchone()[0]
+
+    def test_partition_names(self):
+        month = datetime(2024, 11, 1, tzinfo=dt_timezone.utc)
+        name = partitions.partition_name(month)
+        assert name == "wallet_app_transaction_y2024m11"
+        assert partitions.partition_month(name) == month
+        assert partitions.partition_month(partitions.DEFAULT_PARTITION) is None
+        assert [
+            m.month for m in partitions.months(month, month + timedelta(days=70))
+        ] == [
+            11,
+            12,
+            1,
+        ]
+        assert partitions.add_months(month, -11) == datetime(
+            2023, 12, 1, tzinfo=dt_timezone.utc
+        )
+
+    def test_creates_partitions_ahead(self, wallet_factory):
+        current = partitions.month_start(timezone.now())
+        far = partitions.add_months(current, 6)
+        # no partition covers it yet, so the row lands in the default partition
+        tx = Transaction.objects.create(
+            wallet=wallet_factory(balance=0), amount=1, created_at=far
+        )
+        assert self.partition_of(tx) == partitions.DEFAULT_PARTITION
+
+        call_command("transaction_partitions", ahead=6, stdout=StringIO())
+
+        found = set(self.partitions().values())
+        assert set(partitions.months(current, far)) <= found
+        assert self.partition_of(tx) == partitions.partition_name(far)
+
+    def test_txid_unique_across_partitions(self, wallet_factory):
+        wallet = wallet_factory(balance=10)
+        Transaction.objects.create(wallet=wallet, amount=1, txid="once")
+        last_year = timezone.now() - timedelta(days=365)
+        with pytest.raises(IntegrityError):
+            Transaction.objects.bulk_create(
+                [
+                    Transaction(
+                        wallet=wallet, amount=1, txid="once", created_at=last_year
+                    )
+                ]
+            )
+
+    def test_archives_old_partitions(self, api_client, wallet_factory):
+        month = partitions.add_months(partitions.month_start(timezone.now()), -4)
+        with connection.cursor() as cursor:
+            cursor.execute(partitions.create_partition_sql(month))
+        wallet = wallet_factory(balance=0)
+        for amount in (5, 7):
+            Transaction.objects.create(
+                wallet=wallet, amount=amount, created_at=month + timedelta(days=1)
+            )
+        old = Transaction.objects.create(
+            wallet=wallet, amount=1, txid="archived", created_at=month
+        )
+        Transaction.objects.create(wallet=wallet, amount=2)
+        # the test transaction holds the deferred foreign key checks of these
+        # rows, and Postgres won't drop a table with pending trigger events
+        with connection.cursor() as cursor:
+            cursor.execute("SET CONSTRAINTS ALL IMMEDIATE")
+
+        call_command(
+            "transaction_partitions", retain_months=2, drop=True, stdout=StringIO()
+        )
+
+        assert partitions.partition_name(month) not in self.partitions()
+        assert list(Transaction.objects.values_list("amount", flat=True)) == [2]
+        total = ArchivedTotal.objects.get(wallet=wallet)
+        assert (total.amount, total.count) == (13, 3)
+        assert TransactionTxid.objects.filter(txid=old.txid).exists()
+
+        out = StringIO()
+        call_command("reconcile_balances", workers=1, stdout=out, stderr=StringIO())
+        assert out.getvalue() == ""
+
+        response = api_client.post(
+            TestTransaction.URL,
+            {
+                "data": {
+                    "type": "Transaction",
+                    "attributes": {
+                        "amount": 1,
+                        "wallet": wallet.id,
+                        "txid": "archived",
+                    },
+                }
+            },
+        )
+        assert response.status_code == status.HTTP_409_CONFLICT
+
+    def test_archives_a_month_again(self, wallet_factory):
+        month = partitions.add_months(partitions.month_start(timezone.now()), -4)
+        wallet = wallet_factory(balance=0)
+        for amounts in [(5, 7), (3,)]:
+            # the month's partition, recreated for rows that arrived late
+            with connection.cursor() as cursor:
+                cursor.execute(partitions.create_partition_sql(month))
+            for amount in amounts:
+                Transaction.objects.create(
+                    wallet=wallet, amount=amount, created_at=month
+                )
+            with connection.cursor() as cursor:
+                cursor.execute("SET CONSTRAINTS ALL IMMEDIATE")
+            call_command(
+                "transaction_partitions", retain_months=2, drop=True, stdout=StringIO()
+            )
+
+        total = ArchivedTotal.objects.get(wallet=wallet)
+        assert (total.amount, total.count) == (15, 3)
+        wallet.refresh_from_db()
+        assert (wallet.balance, wallet.transaction_count) == (15, 0)
+        out = StringIO()
+        call_command("reconcile_balances", workers=1, stdout=out, stderr=StringIO())
+        assert out.getvalue() == ""
+
+
 class TestTransactionConcurrency(TransactionTestCase):
     URL = TestTransaction.URL
 
     def setUp(self):
         self.client = APIClient()
 
-    def test_concurrent_transactions(self):
+    def _post_concurrently(self, label):
         init_bal = 1000
         txs_amts = [+105, -55, +99, -101] * 100
         expected_bal = init_bal + sum(txs_amts)
@@ -183,8 +1864,15 @@ class TestTransactionConcurrency(TransactionTestCase):
             )
             return resp
 
+        started = time.perf_counter()
         with concurrent.futures.ThreadPoolExecutor(max_workers=10) as executor:
             futures = [executor.submit(send_tx, amt) for amt in txs_amts]
+        elapsed = time.perf_counter() - started
+        # not an assertion: compare the modes in `make test` output
+        print(
+            f"\n{label}: {len(txs_amts)} postings in {elapsed:.2f}s "
+            f"({len(txs_amts) / elapsed:.0f} tx/s)"
+        )
 
         for future in concurrent.futures.as_completed(futures):
             response = future.result()
@@ -194,3 +1882,28 @@ class TestTransactionConcurrency(TransactionTestCase):
 
         wallet.refresh_from_db()
         assert wallet.balance == expected_bal
+
+    def test_concurrent_transactions(self):
+        self._post_concurrently(POSTING_MODE_SELECT_FOR_UPDATE)
+
+    @override_settings(WALLET_POSTING_MODE=POSTING_MODE_ATOMIC_UPDATE)
+    def test_concurrent_transactions_atomic_update(self):
+        self._post_concurrently(POSTING_MODE_ATOMIC_UPDATE)
+
+    def test_opposing_transfers(self):
+        a, b = create_wallet(balance=1000), create_wallet(balance=1000)
+
+        def transfer(source, destination):
+            return self.client.post(
+                reverse("transfer-list"),
+                transfer_payload((source.id, destination.id, "1")),
+            )
+
+        with concurrent.futures.ThreadPoolExecutor(max_workers=10) as executor:
+            futures = [
+                executor.submit(transfer, *pair) for pair in [(a, b), (b, a)] * 100
+            ]
+        assert {future.result().status_code for future in futures} == {201}
+        a.refresh_from_db()
+        b.refresh_from_db()
+        assert (a.balance, b.balance) == (1000, 1000)
@@ -1,41 +1,552 @@
+import uuid
+from functools import partial
+
+from django.conf import settings
+from django.core.handlers.asgi import ASGIRequest
 from django.db import IntegrityError
-from django_filters.rest_framework import DjangoFilterBackend
-from rest_framework import viewsets
+from django.db.models import Count, DateField, F, Max, Min, Prefetch, Sum
+from django.db.models.functions import Trunc
+from rest_framework import mixins, serializers, status, viewsets
+from rest_framework.decorators import action
 from rest_framework.exceptions import ValidationError
-from rest_framework.filters import OrderingFilter
+from rest_framework.filters import OrderingFilter, SearchFilter
+from rest_framework.response import Response
+from rest_framework.reverse import reverse
+from rest_framework_json_api.exceptions import Conflict
+
+from wallet_app import ledger, metrics, outbox, purge
+from wallet_app.caching import make_etag, not_modified, set_validators, wallet_cache
+from wallet_app.export import (
+    TRANSACTION_EXPORT_COLUMNS,
+    TRANSACTION_EXPORT_FIELDS,
+    export_response,
+)
+from wallet_app.fastread import FastReadMixin, FastResource
+from wallet_app.filters import DjangoFilterBackend, TrigramSimilarityFilter
+from wallet_app.idempotency import recent_transactions
+from wallet_app.models import (
+    BALANCE_CONSTRAINT_NAME,
+    TXID_REGISTRY_CONSTRAINT_NAME,
+    DailyRollup,
+    QueuedPosting,
+    Transaction,
+    Transfer,
+    Wallet,
+    WalletDeletion,
+    WalletNotFoundError,
+)
+from wallet_app.pagination import CountedPaginator, JsonApiCursorPagination
+from wallet_app.parsers import BulkJSONParser
+from wallet_app.preload import PreloadMixin, only_requested
+from wallet_app.routers import reads_from_replica
+from wallet_app.serializers import (
+    BulkTransactionSerializer,
+    QueuedPostingSerializer,
+    TransactionSerializer,
+    TransferSerializer,
+    WalletDeletionSerializer,
+    WalletFlowSerializer,
+    WalletSerializer,
+    WalletStatsSerializer,
+    wallet_not_found,
+)
 
-from wallet_app.models import BALANCE_CONSTRAINT_NAME, Transaction, Wallet
-from wallet_app.serializers import TransactionSerializer, WalletSerializer
+ROLLUP_BUCKETS = ("day", "week", "month")
 
 
-class WalletViewSet(viewsets.ModelViewSet):
-    queryset = Wallet.objects.all()
+class WalletViewSet(PreloadMixin, FastReadMixin, viewsets.ModelViewSet):
+    # wallets waiting for wallet_app.purge are gone as far as the API goes
+    queryset = Wallet.objects.filter(deleted_at=None)
     serializer_class = WalletSerializer
-    filter_backends = [DjangoFilterBackend, OrderingFilter]
+    filter_backends = [
+        DjangoFilterBackend,
+        SearchFilter,
+        OrderingFilter,
+        TrigramSimilarityFilter,
+    ]
     filterset_fields = {
         "label": ["exact", "icontains"],
         "balance": ["gt", "lt", "exact"],
         "id": ["exact"],
     }
+    # label__icontains, filter[search] and filter[similar] all go through the
+    # trigram index on UPPER(label)
+    search_fields = ["label"]
+    similarity_field = "label"
     ordering_fields = ["id", "label", "balance", "created_at"]
     ordering = ["-created_at"]
+    # most recent transactions per wallet in ?include=transactions
+    included_transactions = 10
+
+    def get_prefetch_related(self, include):
+        if include != "transactions":
+            return super().get_prefetch_related(include)
+        # a sliced prefetch is one query with a per-wallet ROW_NUMBER() limit
+        transactions = only_requested(
+            Transaction.objects.order_by("-created_at", "-id"),
+            self.request,
+            TransactionSerializer,
+            "wallet",
+        )
+        return [
+            Prefetch(
+                "transactions",
+                queryset=transactions[: self.included_transactions],
+                to_attr="recent_transactions",
+            )
+        ]
 
     def create(self, request, *args, **kwargs):  # for debugging
         return super().create(request, *args, **kwargs)
 
+    def list(self, request, *args, **kwargs):
+        state = (
+            self.filter_queryset(self.get_queryset())
+            .order_by()
+            .aggregate(count=Count("id"), updated_at=Max("updated_at"))
+        )
+        updated_at = state["updated_at"]
+        etag = make_etag(state["count"], updated_at and updated_at.isoformat())
+        response = not_modified(request, etag, updated_at)
+        if response is None:
+            if self.paginator is not None:
+                # the page reuses this count instead of running its own
+                self.paginator.django_paginator_class = partial(
+                    CountedPaginator, count=state["count"]
+                )
+            response = super().list(request, *args, **kwargs)
+        return set_validators(response, etag, updated_at)
+
+    def retrieve(self, request, *args, **kwargs):
+        # the cache holds fast-path payloads of the plain detail URL only
+        lookup = self.kwargs[self.lookup_url_kwarg or self.lookup_field]
+        if request.query_params or not lookup.isdigit() or not self.use_fast_read():
+            return super().retrieve(request, *args, **kwargs)
+        wallet_id = int(lookup)
+        schema = self.get_resource_schema()
+        entry = wallet_cache.get(wallet_id)
+        if entry is None:
+            row = self.get_row(schema)
+            entry = {
+                "data": next(schema.represent([row])),
+                "updated_at": row["updated_at"],
+            }
+            # a lagging replica must not put an old row back in the cache
+            if not reads_from_replica():
+                wallet_cache.set(wallet_id, entry)
+        etag = make_etag(wallet_id, entry["updated_at"].isoformat())
+        response = not_modified(request, etag, entry["updated_at"])
+        if response is None:
+            response = Response(FastResource(schema, entry["data"]))
+        return set_validators(response, etag, entry["updated_at"])
+
+    def destroy(self, request, *args, **kwargs):
+        """
+        Hide the wallet and answer ``202`` with the status of its deletion;
+        the rows are deleted in the background, see ``wallet_app.purge``.
+        """
+        deletion = purge.schedule(self.get_object())
+        # the document describes the deletion, not the wallet
+        self.resource_name = WalletDeletionSerializer.Meta.resource_name
+        return Response(
+            WalletDeletionSerializer(deletion).data,
+            status=status.HTTP_202_ACCEPTED,
+            headers={
+                "Location": reverse(
+                    "walletdeletion-detail", args=[deletion.id], request=request
+                )
+            },
+        )
+
+    @action(detail=True, methods=["get"])
+    def export(self, request, pk=None):
+        """Stream the wallet's transactions, see ``TransactionViewSet.export``."""
+        wallet = self.get_object()
+        transactions = TransactionViewSet(
+            request=request, format_kwarg=None, action="export", kwargs={}
+        )
+        return transactions.export_queryset(
+            transactions.filter_queryset(wallet.transactions.all()),
+            filename=f"wallet-{wallet.id}-transactions",
+        )
+
+    @action(detail=True, methods=["get"], serializer_class=WalletStatsSerializer)
+    def stats(self, request, pk=None):
+        """
+        Inflow, outflow, net flow and number of postings of the wallet,
+        optionally limited to the UTC days ``filter[since]`` to
+        ``filter[until]`` (inclusive). Served from the daily rollups.
+        """
+        wallet = self.get_object()
+        totals = self.get_rollups(wallet).aggregate(
+            inflow=Sum("inflow", default=0),
+            outflow=Sum("outflow", default=0),
+            count=Sum("count", default=0),
+            first_day=Min("day"),
+            last_day=Max("day"),
+        )
+        totals["net"] = totals["inflow"] - totals["outflow"]
+        return Response(self.get_serializer({"id": wallet.id, **totals}).data)
+
+    @action(detail=True, methods=["get"], serializer_class=WalletFlowSerializer)
+    def series(self, request, pk=None):
+        """
+        The wallet's flows per ``?bucket=day`` (default), ``week`` or
+        ``month``, oldest first; buckets without postings are left out.
+        Takes the same ``filter[since]`` and ``filter[until]`` as ``stats``.
+        """
+        wallet = self.get_object()
+        bucket = request.query_params.get("bucket", "day")
+        if bucket not in ROLLUP_BUCKETS:
+            raise ValidationError(
+                {"bucket": f"Must be one of: {', '.join(ROLLUP_BUCKETS)}"}
+            )
+        start = (
+            F("day")
+            if bucket == "day"
+            else Trunc("day", bucket, output_field=DateField())
+        )
+        rows = (
+            self.get_rollups(wallet)
+            .annotate(start=start)
+            .values("start")
+            .annotate(inflow=Sum("inflow"), outflow=Sum("outflow"), count=Sum("count"))
+            .order_by("start")
+        )
+        flows = [
+            {
+                "id": f"{wallet.id}:{row['start']}",
+                "net": row["inflow"] - row["outflow"],
+                **row,
+            }
+            for row in rows
+        ]
+        return Response(self.get_serializer(flows, many=True).data)
+
+    def get_rollups(self, wallet):
+        rollups = DailyRollup.objects.filter(wallet=wallet)
+        for param, lookup in (
+            ("filter[since]", "day__gte"),
+            ("filter[until]", "day__lte"),
+        ):
+            value = self.request.query_params.get(param)
+            if value is not None:
+                try:
+                    day = serializers.DateField().to_internal_value(value)
+                except ValidationError as e:
+                    raise ValidationError({param: e.detail})
+                rollups = rollups.filter(**{lookup: day})
+        return rollups
+
+
+def raise_if_archived(error, txid):
+    """
+    Turn a txid registry violation into a 409: the txid belongs to a
+    transaction in an archived partition, which can't be replayed.
+    """
+    if TXID_REGISTRY_CONSTRAINT_NAME in str(error):
+        raise Conflict(f"Transaction {txid} was already posted and has been archived")
+
 
-class TransactionViewSet(viewsets.ModelViewSet):
+class TransactionViewSet(PreloadMixin, FastReadMixin, viewsets.ModelViewSet):
     queryset = Transaction.objects.all()
     serializer_class = TransactionSerializer
+    select_for_includes = {"wallet": ["wallet"]}
     filter_backends = [DjangoFilterBackend, OrderingFilter]
     filterset_fields = ["wallet", "txid"]
     ordering_fields = ["created_at", "amount"]
     ordering = ["-created_at"]
+    pagination_class = JsonApiCursorPagination
+    parser_classes = [BulkJSONParser]
+    bulk_max_items = 10000
+
+    def create(self, request, *args, **kwargs):
+        if isinstance(request.data, list):
+            return self.bulk_create(request)
+
+        txid = request.data.get("txid")
+        original = self.find_original(txid)
+        if original is not None:
+            return self.replay(original, request.data)
+
+        serializer = self.get_serializer(data=request.data)
+        # uniqueness was just checked by find_original(); the unique index
+        # catches the remaining race below
+        serializer.fields["txid"].validators = []
+        serializer.is_valid(raise_exception=True)
+        if settings.WALLET_POSTING_QUEUE:
+            return self.enqueue(serializer.validated_data)
+        try:
+            self.perform_create(serializer)
+        except IntegrityError as e:
+            original = self.find_original(txid, use_cache=False)
+            if original is None:
+                raise_if_archived(e, txid)
+                raise
+            return self.replay(original, request.data)
+        headers = self.get_success_headers(serializer.data)
+        return Response(
+            serializer.data, status=status.HTTP_201_CREATED, headers=headers
+        )
+
+    @action(detail=False, methods=["get"])
+    def export(self, request):
+        """
+        Stream every matching transaction as NDJSON (``?output=ndjson``, the
+        default) or CSV (``?output=csv``). Filters and ordering work as on
+        the list endpoint; pagination does not apply.
+        """
+        return self.export_queryset(
+            self.filter_queryset(self.get_queryset()), filename="transactions"
+        )
+
+    def export_queryset(self, queryset, filename):
+        return export_response(
+            queryset,
+            TRANSACTION_EXPORT_FIELDS,
+            TRANSACTION_EXPORT_COLUMNS,
+            self.request.query_params.get("output", "ndjson"),
+            filename,
+            asynchronous=isinstance(self.request._request, ASGIRequest),
+        )
+
+    def enqueue(self, validated_data):
+        """Queue the posting in the outbox and answer with its status."""
+        posting, created = outbox.enqueue(
+            {
+                "wallet_id": validated_data["wallet"].id,
+                "amount": validated_data["amount"],
+                "txid": validated_data.get("txid") or str(uuid.uuid4()),
+            }
+        )
+        if not created and (posting.wallet_id, posting.amount) != (
+            validated_data["wallet"].id,
+            validated_data["amount"],
+        ):
+            raise Conflict(
+                f"Transaction {posting.txid} was already queued "
+                "with a different wallet or amount"
+            )
+        # the document describes the queued posting, not a transaction
+        self.resource_name = QueuedPostingSerializer.Meta.resource_name
+        return Response(
+            QueuedPostingSerializer(posting).data,
+            status=status.HTTP_202_ACCEPTED,
+            headers={
+                "Location": reverse(
+                    "posting-detail", args=[posting.id], request=self.request
+                )
+            },
+        )
+
+    def find_original(self, txid, use_cache=True):
+        """Return the already posted transaction with ``txid``, if any."""
+        if txid is None:
+            return None
+        txid = str(txid)
+        original = recent_transactions.get(txid) if use_cache else None
+        if original is None:
+            original = Transaction.objects.filter(txid=txid).first()
+            if original is not None:
+                recent_transactions.add(original)
+        return original
+
+    def replay(self, original, data):
+        """
+        Answer a resubmitted txid with the original transaction, as long as
+        the retry describes the same posting; the wallet is not touched.
+        """
+        amount = (
+            self.get_serializer().fields["amount"].to_internal_value(data.get("amount"))
+        )
+        wallet = data.get("wallet")
+        if isinstance(wallet, dict):  # JSON:API relationship
+            wallet = wallet.get("id")
+        if amount != original.amount or str(wallet) != str(original.wallet_id):
+            raise Conflict(
+                f"Transaction {original.txid} was already posted "
+                "with a different wallet or amount"
+            )
+        return Response(self.get_serializer(original).data, status=status.HTTP_200_OK)
+
+    def bulk_create(self, request):
+        if not 0 < len(request.data) <= self.bulk_max_items:
+            raise ValidationError(
+                f"Bulk payload must contain 1 to {self.bulk_max_items} items"
+            )
+        serializer = BulkTransactionSerializer(data=request.data, many=True)
+        serializer.is_valid(raise_exception=True)
+        try:
+            results = ledger.post_batch(serializer.validated_data)
+        except IntegrityError as e:
+            # a concurrent request inserted one of our txids after the pre-check
+            raise ValidationError(ledger.DUPLICATE_TXID) from e
+
+        created = [tx for tx, error in results if tx is not None]
+        meta = [
+            (
+                {"index": index, "status": "created", "id": tx.id}
+                if tx is not None
+                else {"index": index, "status": "rejected", "detail": error}
+            )
+            for index, (tx, error) in enumerate(results)
+        ]
+        return Response(
+            {
+                "results": self.get_serializer(created, many=True).data,
+                "meta": {"bulk": meta},
+            },
+            status=(
+                status.HTTP_201_CREATED
+                if len(created) == len(results)
+                else status.HTTP_207_MULTI_STATUS
+            ),
+        )
 
     def perform_create(self, serializer):
         try:
             serializer.save()
+        except WalletNotFoundError as e:
+            raise wallet_not_found(e.wallet_id)
         except IntegrityError as e:
             if BALANCE_CONSTRAINT_NAME in str(e):
+                metrics.count_insufficient_balance()
                 raise ValidationError("Insufficient balance")
             raise
+        recent_transactions.add(serializer.instance)
+
+    def perform_update(self, serializer):
+        recent_transactions.discard(serializer.instance.txid)
+        try:
+            super().perform_update(serializer)
+        except WalletNotFoundError as e:
+            raise wallet_not_found(e.wallet_id)
+        except IntegrityError as e:
+            raise_if_archived(e, serializer.validated_data.get("txid"))
+            raise
+
+    def perform_destroy(self, instance):
+        recent_transactions.discard(instance.txid)
+        super().perform_destroy(instance)
+
+
+class TransferViewSet(
+    FastReadMixin,
+    mixins.CreateModelMixin,
+    mixins.RetrieveModelMixin,
+    mixins.ListModelMixin,
+    viewsets.GenericViewSet,
+):
+    """
+    Wallet-to-wallet transfers. ``POST`` takes one ``Transfer`` resource or
+    a list of up to ``bulk_max_items``; see ``ledger.post_transfers``.
+    """
+
+    queryset = Transfer.objects.all()
+    serializer_class = TransferSerializer
+    filter_backends = [DjangoFilterBackend, OrderingFilter]
+    filterset_fields = ["source", "destination", "txid"]
+    ordering_fields = ["created_at", "amount"]
+    ordering = ["-id"]
+    parser_classes = [BulkJSONParser]
+    bulk_max_items = 1000
+
+    def create(self, request, *args, **kwargs):
+        if isinstance(request.data, list):
+            return self.bulk_create(request)
+
+        serializer = self.get_serializer(data=request.data)
+        serializer.is_valid(raise_exception=True)
+        data = serializer.validated_data
+        original = Transfer.objects.filter(txid=data["txid"]).first()
+        if original is not None:
+            return self.replay(original, data)
+        try:
+            [(transfer, error)] = ledger.post_transfers([data])
+        except IntegrityError:
+            # a concurrent request posted the same txid after the pre-check
+            transfer, error = None, ledger.DUPLICATE_TXID
+        if error == ledger.DUPLICATE_TXID:
+            original = Transfer.objects.filter(txid=data["txid"]).first()
+            if original is None:
+                raise Conflict(f"Transfer txid {data['txid']} is already in use")
+            return self.replay(original, data)
+        if error is not None:
+            raise ValidationError(error)
+        return Response(
+            self.get_serializer(transfer).data, status=status.HTTP_201_CREATED
+        )
+
+    def replay(self, original, data):
+        """Answer a resubmitted txid with the original transfer, if it matches."""
+        if (original.source_id, original.destination_id, original.amount) != (
+            data["source_id"],
+            data["destination_id"],
+            data["amount"],
+        ):
+            raise Conflict(
+                f"Transfer {original.txid} was already posted "
+                "with different wallets or amount"
+            )
+        return Response(self.get_serializer(original).data, status=status.HTTP_200_OK)
+
+    def bulk_create(self, request):
+        if not 0 < len(request.data) <= self.bulk_max_items:
+            raise ValidationError(
+                f"Bulk payload must contain 1 to {self.bulk_max_items} items"
+            )
+        serializer = self.get_serializer(data=request.data, many=True)
+        serializer.is_valid(raise_exception=True)
+        try:
+            results = ledger.post_transfers(serializer.validated_data)
+        except IntegrityError as e:
+            raise ValidationError(ledger.DUPLICATE_TXID) from e
+
+        created = [transfer for transfer, error in results if transfer is not None]
+        meta = [
+            (
+                {"index": index, "status": "created", "id": transfer.id}
+                if transfer is not None
+                else {"index": index, "status": "rejected", "detail": error}
+            )
+            for index, (transfer, error) in enumerate(results)
+        ]
+        return Response(
+            {
+                "results": self.get_serializer(created, many=True).data,
+                "meta": {"bulk": meta},
+            },
+            status=(
+                status.HTTP_201_CREATED
+                if len(created) == len(results)
+                else status.HTTP_207_MULTI_STATUS
+            ),
+        )
+
+
+class QueuedPostingViewSet(
+    FastReadMixin,
+    mixins.RetrieveModelMixin,
+    mixins.ListModelMixin,
+    viewsets.GenericViewSet,
+):
+    """Status of postings queued with ``WALLET_POSTING_QUEUE`` on."""
+
+    queryset = QueuedPosting.objects.order_by("-id")
+    serializer_class = QueuedPostingSerializer
+    filter_backends = [DjangoFilterBackend]
+    filterset_fields = ["txid", "status"]
+
+
+class WalletDeletionViewSet(
+    FastReadMixin,
+    mixins.RetrieveModelMixin,
+    mixins.ListModelMixin,
+    viewsets.GenericViewSet,
+):
+    """Progress of wallet deletions, see ``WalletViewSet.destroy``."""
+
+    queryset = WalletDeletion.objects.order_by("-id")
+    serializer_class = WalletDeletionSerializer
+    filter_backends = [DjangoFilterBackend]
+    filterset_fields = ["wallet_id", "status"]
@@ -14,3 +14,12 @@ from django.core.asgi import get_asgi_application
 os.environ.setdefault("DJANGO_SETTINGS_MODULE", "wallet_app_drf.settings")
 
 application = get_asgi_application()
+
+# import the URLconf, hence the views and serializers, and build the OpenAPI
+# schema now rather than on the first requests
+from django.urls import get_resolver  # noqa: E402
+
+from wallet_app import openapi  # noqa: E402
+
+get_resolver().url_patterns
+openapi.document()
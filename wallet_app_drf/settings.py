@@ -10,6 +10,7 @@ For the full list of settings and their values, see
 https://docs.djangoproject.com/en/5.1/ref/settings/
 """
 
+import copy
 import os
 from pathlib import Path
 
@@ -38,6 +39,7 @@ INSTALLED_APPS = [
     "django.contrib.sessions",
     "django.contrib.messages",
     "django.contrib.staticfiles",
+    "django.contrib.postgres",
     "rest_framework",
     "wallet_app",
     "rest_framework_json_api",
@@ -46,6 +48,7 @@ INSTALLED_APPS = [
 
 
 MIDDLEWARE = [
+    "wallet_app.middleware.metrics_middleware",
     "django.middleware.security.SecurityMiddleware",
     "django.contrib.sessions.middleware.SessionMiddleware",
     "django.middleware.common.CommonMiddleware",
@@ -53,6 +56,7 @@ MIDDLEWARE = [
     "django.contrib.auth.middleware.AuthenticationMiddleware",
     "django.contrib.messages.middleware.MessageMiddleware",
     "django.middleware.clickjacking.XFrameOptionsMiddleware",
+    "wallet_app.middleware.replica_routing_middleware",
 ]
 
 ROOT_URLCONF = "wallet_app_drf.urls"
@@ -90,6 +94,109 @@ DATABASES = {
     }
 }
 
+# Connection reuse. With WALLET_DB_POOL=1 (psycopg 3 only) each process keeps
+# a psycopg_pool.ConnectionPool and requests borrow from it; otherwise each
+# thread keeps its connection for CONN_MAX_AGE seconds. Either way a stale
+# connection is checked before it is handed out.
+if os.getenv("WALLET_DB_POOL", "0") == "1":
+    from psycopg_pool import ConnectionPool
+
+    DATABASES["default"]["OPTIONS"] = {
+        "pool": {
+            "min_size": int(os.getenv("WALLET_DB_POOL_MIN_SIZE", "4")),
+            "max_size": int(os.getenv("WALLET_DB_POOL_MAX_SIZE", "20")),
+            # seconds an idle connection above min_size is kept open
+            "max_idle": float(os.getenv("WALLET_DB_POOL_MAX_IDLE", "300")),
+            # seconds a request waits for a free connection
+            "timeout": float(os.getenv("WALLET_DB_POOL_TIMEOUT", "10")),
+            "check": ConnectionPool.check_connection,
+        }
+    }
+else:
+    DATABASES["default"]["CONN_MAX_AGE"] = int(os.getenv("CONN_MAX_AGE", "0"))
+    DATABASES["default"]["CONN_HEALTH_CHECKS"] = True
+
+# Optional replica for the reads of safe requests, see wallet_app.routers.
+# It defaults to the primary's coordinates; the test run creates it as a
+# separate database that receives no writes.
+DATABASES["replica"] = {
+    **copy.deepcopy(DATABASES["default"]),
+    "HOST": os.getenv("POSTGRES_REPLICA_HOST") or DATABASES["default"]["HOST"],
+    "PORT": os.getenv("POSTGRES_REPLICA_PORT") or DATABASES["default"]["PORT"],
+    "TEST": {"NAME": f"test_{DATABASES['default']['NAME']}_replica"},
+}
+DATABASE_ROUTERS = ["wallet_app.routers.ReplicaRouter"]
+WALLET_REPLICA_READS = (
+    os.getenv(
+        "WALLET_REPLICA_READS", "1" if os.getenv("POSTGRES_REPLICA_HOST") else "0"
+    )
+    == "1"
+)
+# Seconds a client's reads stay on the primary after it wrote anything.
+WALLET_REPLICA_PIN_SECONDS = int(os.getenv("WALLET_REPLICA_PIN_SECONDS", "5"))
+
+# How Transaction.save applies postings to the wallet balance:
+# "select_for_update" (lock, modify in Python, save) or "atomic_update"
+# (one conditional UPDATE ... RETURNING).
+WALLET_POSTING_MODE = os.getenv("WALLET_POSTING_MODE", "select_for_update")
+
+# With WALLET_POSTING_QUEUE=1 single postings are queued in the outbox and
+# answered with 202; `manage.py run_posting_worker` applies them, see
+# wallet_app.outbox.
+WALLET_POSTING_QUEUE = os.getenv("WALLET_POSTING_QUEUE", "0") == "1"
+
+# With WALLET_FIXED_POINT=1 amounts and balances are stored as BIGINT units
+# of 1e-8 instead of NUMERIC(18, 8), see wallet_app.fields. Run
+# `manage.py convert_amount_storage` after changing it on a migrated database.
+WALLET_FIXED_POINT = os.getenv("WALLET_FIXED_POINT", "0") == "1"
+
+# With WALLET_EVENTS=1 every posting sends a NOTIFY that
+# GET /wallets/{id}/events/ streams to subscribers, see wallet_app.events.
+WALLET_EVENTS = os.getenv("WALLET_EVENTS", "0") == "1"
+
+# Number of recently posted txids each process remembers to answer client
+# retries without a database lookup; 0 disables the cache.
+WALLET_TXID_CACHE_SIZE = int(os.getenv("WALLET_TXID_CACHE_SIZE", "10000"))
+
+# Serve list/retrieve from QuerySet.values() rows instead of the serializers,
+# see wallet_app.fastread.
+WALLET_FAST_READ = os.getenv("WALLET_FAST_READ", "1") == "1"
+
+
+# JSON file that GET /openapi serves, written by `manage.py generate_openapi`;
+# while it does not exist each process generates the schema once, see
+# wallet_app.openapi.
+WALLET_OPENAPI_SCHEMA = os.getenv("WALLET_OPENAPI_SCHEMA", "")
+
+# Per-route latency, SQL, lock wait and rejection metrics served in the
+# Prometheus text format at /metrics, see wallet_app.metrics.
+WALLET_METRICS = os.getenv("WALLET_METRICS", "0") == "1"
+
+
+# Caches
+# https://docs.djangoproject.com/en/5.1/topics/cache/
+
+CACHES = {
+    "default": {
+        "BACKEND": "django.core.cache.backends.locmem.LocMemCache",
+    },
+    # Wallet detail payloads. Writes invalidate entries in this backend, so it
+    # must be shared by every worker process, e.g.
+    # django.core.cache.backends.redis.RedisCache (needs the redis package)
+    # at redis://host:6379/1; the default DummyCache disables the cache.
+    "wallets": {
+        "BACKEND": os.getenv(
+            "WALLET_CACHE_BACKEND", "django.core.cache.backends.dummy.DummyCache"
+        ),
+        "LOCATION": os.getenv("WALLET_CACHE_LOCATION", ""),
+    },
+}
+
+# Cache alias for wallet detail payloads and how long (seconds) an entry may
+# live if an invalidation is missed, see wallet_app.caching.
+WALLET_CACHE_ALIAS = "wallets"
+WALLET_CACHE_TIMEOUT = int(os.getenv("WALLET_CACHE_TIMEOUT", "60"))
+
 
 # Password validation
 # https://docs.djangoproject.com/en/5.1/ref/settings/#auth-password-validators
@@ -139,7 +246,7 @@ REST_FRAMEWORK = {
     "DEFAULT_PAGINATION_CLASS": "rest_framework_json_api.pagination.JsonApiPageNumberPagination",
     "DEFAULT_PARSER_CLASSES": ("rest_framework_json_api.parsers.JSONParser",),
     "DEFAULT_RENDERER_CLASSES": (
-        "rest_framework_json_api.renderers.JSONRenderer",
+        "wallet_app.renderers.JSONRenderer",
         "rest_framework_json_api.renderers.BrowsableAPIRenderer",
     ),
     "DEFAULT_METADATA_CLASS": "rest_framework_json_api.metadata.JSONAPIMetadata",
@@ -150,8 +257,6 @@ REST_FRAMEWORK = {
         "rest_framework.filters.SearchFilter",
     ),
     "SEARCH_PARAM": "filter[search]",
-    "TEST_REQUEST_RENDERER_CLASSES": (
-        "rest_framework_json_api.renderers.JSONRenderer",
-    ),
+    "TEST_REQUEST_RENDERER_CLASSES": ("wallet_app.renderers.JSONRenderer",),
     "TEST_REQUEST_DEFAULT_FORMAT": "vnd.api+json",
 }
@@ -0,0 +1,71 @@
+"""
+Lean settings for API workers::
+
+    DJANGO_SETTINGS_MODULE=wallet_app_drf.settings_production
+
+The API only speaks JSON:API to anonymous clients, so this profile leaves out
+what ``settings`` loads for development and the admin: the admin, auth,
+sessions, messages and static files apps with their middleware and context
+processors, DRF's session and basic authentication, and the browsable API
+renderer. Workers import less at startup and run fewer middleware per
+request. ``benchmarks/startup.py`` compares the two profiles.
+"""
+
+import os
+
+from wallet_app_drf.settings import *  # noqa: F401,F403
+from wallet_app_drf.settings import (
+    INSTALLED_APPS,
+    MIDDLEWARE,
+    REST_FRAMEWORK,
+    SECRET_KEY,
+    TEMPLATES,
+)
+
+DEBUG = os.getenv("DJANGO_DEBUG", "0") == "1"
+SECRET_KEY = os.getenv("DJANGO_SECRET_KEY", SECRET_KEY)
+ALLOWED_HOSTS = os.getenv("DJANGO_ALLOWED_HOSTS", "localhost").split(",")
+
+UNUSED_APPS = {
+    "django.contrib.admin",
+    "django.contrib.auth",
+    "django.contrib.contenttypes",
+    "django.contrib.sessions",
+    "django.contrib.messages",
+    "django.contrib.staticfiles",
+}
+INSTALLED_APPS = [app for app in INSTALLED_APPS if app not in UNUSED_APPS]
+
+MIDDLEWARE = [
+    middleware
+    for middleware in MIDDLEWARE
+    if not middleware.startswith(
+        (
+            "django.contrib.sessions.",
+            "django.contrib.auth.",
+            "django.contrib.messages.",
+        )
+    )
+]
+
+TEMPLATES = [
+    {
+        **TEMPLATES[0],
+        "OPTIONS": {
+            "context_processors": [
+                processor
+                for processor in TEMPLATES[0]["OPTIONS"]["context_processors"]
+                if not processor.startswith("django.contrib.")
+            ],
+        },
+    }
+]
+
+REST_FRAMEWORK = {
+    **REST_FRAMEWORK,
+    "DEFAULT_RENDERER_CLASSES": ("wallet_app.renderers.JSONRenderer",),
+    "DEFAULT_AUTHENTICATION_CLASSES": (),
+    "DEFAULT_PERMISSION_CLASSES": ("rest_framework.permissions.AllowAny",),
+    # request.user is None; AnonymousUser would need django.contrib.auth
+    "UNAUTHENTICATED_USER": None,
+}
@@ -15,32 +15,47 @@ Including another URLconf
     2. Add a URL to urlpatterns:  path('blog/', include('blog.urls'))
 """
 
-from django.contrib import admin
+from django.apps import apps
 from django.urls import include, path
 from django.views.generic import TemplateView
 from rest_framework.routers import DefaultRouter
-from rest_framework.schemas import get_schema_view
-from rest_framework.schemas.openapi import SchemaGenerator
 
-from wallet_app.views import TransactionViewSet, WalletViewSet
+from wallet_app import async_views, openapi
+from wallet_app.metrics import metrics_view
+from wallet_app.views import (
+    QueuedPostingViewSet,
+    TransactionViewSet,
+    TransferViewSet,
+    WalletDeletionViewSet,
+    WalletViewSet,
+)
 
 router = DefaultRouter()
 router.register(r"wallets", WalletViewSet)
 router.register(r"transactions", TransactionViewSet)
+router.register(r"transfers", TransferViewSet)
+router.register(r"postings", QueuedPostingViewSet, basename="posting")
+router.register(r"wallet-deletions", WalletDeletionViewSet)
 
 urlpatterns = [
-    path("admin/", admin.site.urls),
+    path(
+        "wallets/<int:pk>/events/",
+        async_views.wallet_events,
+        name="wallet-events",
+    ),
     path("", include(router.urls)),
     path(
-        "openapi",
-        get_schema_view(
-            title="Example API",
-            description="API for all things …",
-            version="1.0.0",
-            generator_class=SchemaGenerator,
-        ),
-        name="openapi-schema",
+        "async/wallets/<int:pk>/",
+        async_views.wallet_detail,
+        name="async-wallet-detail",
     ),
+    path(
+        "async/transactions/",
+        async_views.transaction_create,
+        name="async-transaction-create",
+    ),
+    path("metrics", metrics_view, name="metrics"),
+    path("openapi", openapi.schema_view, name="openapi-schema"),
     path(
         "swagger-ui/",
         TemplateView.as_view(
@@ -50,3 +65,9 @@ urlpatterns = [
         name="swagger-ui",
     ),
 ]
+
+# not installed by settings_production
+if apps.is_installed("django.contrib.admin"):
+    from django.contrib import admin
+
+    urlpatterns.insert(0, path("admin/", admin.site.urls))
@@ -14,3 +14,12 @@ from django.core.wsgi import get_wsgi_application
 os.environ.setdefault("DJANGO_SETTINGS_MODULE", "wallet_app_drf.settings")
 
 application = get_wsgi_application()
+
+# import the URLconf, hence the views and serializers, and build the OpenAPI
+# schema now rather than on the first requests
+from django.urls import get_resolver  # noqa: E402
+
+from wallet_app import openapi  # noqa: E402
+
+get_resolver().url_patterns
+openapi.document()